@@ -0,0 +1,91 @@
+from typing import Optional
+
+from sqlalchemy import case, func, select, update, delete, insert, literal
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from database import engine
+from models import Book, Author
+from models.achievment_model import UserReadCounter, ALL_GENRES
+from models.book_model import UserBook
+from models.genre_model import BookGenreAssociation
+from search import rebuild_search_indexes
+
+def _average(rating_sum, rating_count):
+    return case((rating_count > 0, func.round(rating_sum * 1.0 / rating_count, 2)), else_=0.0)
+
+async def change_book_counters(session: AsyncSession, book_id: str, readers: int = 0,
+                               rating_sum: int = 0, rating_count: int = 0) -> Optional[str]:
+    new_sum = Book.rating_sum + rating_sum
+    new_count = Book.rating_count + rating_count
+    author_id = (await session.execute(
+        update(Book)
+        .where(Book.id == book_id)
+        .values(readers_count=Book.readers_count + readers,
+                rating_sum=new_sum,
+                rating_count=new_count,
+                average_rating=_average(new_sum, new_count))
+        .returning(Book.author_id)
+        .execution_options(synchronize_session=False)
+    )).scalar()
+    await change_author_counters(session, author_id, readers=readers, rating_sum=rating_sum,
+                                 rating_count=rating_count)
+    return author_id
+
+async def change_author_counters(session: AsyncSession, author_id, books: int = 0, readers: int = 0,
+                                 rating_sum: int = 0, rating_count: int = 0):
+    new_sum = Author.rating_sum + rating_sum
+    new_count = Author.rating_count + rating_count
+    await session.execute(
+        update(Author)
+        .where(Author.id == author_id)
+        .values(books_count=Author.books_count + books,
+                readers_count=Author.readers_count + readers,
+                rating_sum=new_sum,
+                rating_count=new_count,
+                average_rating=_average(new_sum, new_count))
+        .execution_options(synchronize_session=False)
+    )
+
+async def move_book_counters(session: AsyncSession, book: Book, sign: int):
+    await change_author_counters(session, book.author_id, books=sign, readers=sign * book.readers_count,
+                                 rating_sum=sign * book.rating_sum, rating_count=sign * book.rating_count)
+
+def rebuild_book_counters(connection):
+    rated = (UserBook.book_id == Book.id) & (UserBook.rating > 0)
+    connection.execute(update(Book).values(
+        readers_count=select(func.count()).where(UserBook.book_id == Book.id).scalar_subquery(),
+        rating_sum=select(func.coalesce(func.sum(UserBook.rating), 0)).where(rated).scalar_subquery(),
+        rating_count=select(func.count()).where(rated).scalar_subquery(),
+    ))
+    connection.execute(update(Book).values(average_rating=_average(Book.rating_sum, Book.rating_count)))
+
+def rebuild_author_counters(connection):
+    own_books = Book.author_id == Author.id
+    connection.execute(update(Author).values(
+        books_count=select(func.count()).where(own_books).scalar_subquery(),
+        readers_count=select(func.coalesce(func.sum(Book.readers_count), 0)).where(own_books).scalar_subquery(),
+        rating_sum=select(func.coalesce(func.sum(Book.rating_sum), 0)).where(own_books).scalar_subquery(),
+        rating_count=select(func.coalesce(func.sum(Book.rating_count), 0)).where(own_books).scalar_subquery(),
+    ))
+    connection.execute(update(Author).values(average_rating=_average(Author.rating_sum, Author.rating_count)))
+
+def rebuild_read_counters(connection):
+    columns = [UserReadCounter.user_id, UserReadCounter.genre_id, UserReadCounter.read_count]
+    connection.execute(delete(UserReadCounter))
+    connection.execute(insert(UserReadCounter).from_select(columns, select(
+        UserBook.user_id, literal(ALL_GENRES), func.count()).group_by(UserBook.user_id)))
+    connection.execute(insert(UserReadCounter).from_select(columns, select(
+        UserBook.user_id, BookGenreAssociation.genre_id, func.count()).join(
+        BookGenreAssociation, BookGenreAssociation.book_id == UserBook.book_id).group_by(
+        UserBook.user_id, BookGenreAssociation.genre_id)))
+
+def reconcile(bind=engine):
+    with bind.begin() as connection:
+        rebuild_book_counters(connection)
+        rebuild_author_counters(connection)
+        rebuild_read_counters(connection)
+        rebuild_search_indexes(connection)
+
+if __name__ == "__main__":
+    reconcile()
+    print("Счётчики книг, авторов и прочитанного пересчитаны по user_books, поисковые индексы перестроены")
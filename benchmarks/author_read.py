@@ -0,0 +1,62 @@
+import argparse
+import asyncio
+import time
+
+import httpx
+from fastapi import APIRouter, Depends
+from sqlalchemy import func, select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from aggregates import reconcile
+from benchmarks.common import use_temp_database
+from benchmarks.concurrency import percentile, run_level
+from database import get_session
+from models import Author, Book
+from my_app import app
+
+legacy_router = APIRouter()
+
+@legacy_router.get("/legacy/authors/{author_id}")
+async def legacy_get_author(author_id: str, session: AsyncSession = Depends(get_session)):
+    author = await session.get(Author, author_id)
+    average_rating = await session.scalar(select(func.avg(Book.average_rating)).where(Book.author_id == author.id))
+    author.average_rating = float(f"{average_rating or 0:.2f}")
+    await session.commit()
+    return {"average_rating": author.average_rating}
+
+def seed(SessionLocal, books: int) -> str:
+    session = SessionLocal()
+    author = Author(name="Фёдор", surname="Достоевский", country="RU", profile_picture="p")
+    session.add(author)
+    session.flush()
+    for number in range(books):
+        session.add(Book(title=f"Книга {number}", year=1850 + number % 50, pages=300, profile_picture="p",
+                         country="RU", author_id=author.id, rating_sum=number % 10 + 1, rating_count=1,
+                         readers_count=1, average_rating=number % 10 + 1))
+    session.commit()
+    reconcile(session.get_bind())
+    author_id = author.id
+    session.close()
+    return author_id
+
+async def main(books: int, clients: int, requests_per_client: int):
+    app.include_router(legacy_router)
+    author_id = seed(use_temp_database(), books)
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        print(f"{'route':>10} {'rps':>10} {'p50 ms':>10} {'p99 ms':>10}")
+        for name, path in [("before", f"/legacy/authors/{author_id}"), ("after", f"/authors/{author_id}")]:
+            await run_level(client, path, 1, 5)
+            start = time.perf_counter()
+            latencies = await run_level(client, path, clients, requests_per_client)
+            elapsed = time.perf_counter() - start
+            print(f"{name:>10} {len(latencies) / elapsed:>10.1f} "
+                  f"{percentile(latencies, 50) * 1000:>10.2f} {percentile(latencies, 99) * 1000:>10.2f}")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Чтение /authors/{author_id}: пересчёт при чтении против готовых агрегатов")
+    parser.add_argument("--books", type=int, default=2000)
+    parser.add_argument("--clients", type=int, default=16)
+    parser.add_argument("--requests", type=int, default=50)
+    args = parser.parse_args()
+    asyncio.run(main(args.books, args.clients, args.requests))
@@ -0,0 +1,40 @@
+import tempfile
+from typing import Optional
+
+from sqlalchemy.ext.asyncio import async_sessionmaker
+from sqlalchemy.orm import sessionmaker
+
+from database import (Base, get_session, get_read_session, make_engine, make_async_engine, make_read_engine,
+                      read_only_url)
+from my_app import app
+from write_queue import write_queue
+
+def use_temp_database(pragmas: Optional[dict] = None, read_pragmas: Optional[dict] = None) -> sessionmaker:
+    url = f"sqlite:///{tempfile.mkdtemp()}/bench.db"
+    sync_engine = make_engine(url, pragmas)
+    Base.metadata.create_all(bind=sync_engine)
+    BenchSessionLocal = async_sessionmaker(bind=make_async_engine(url, pragmas), expire_on_commit=False)
+    BenchReadSessionLocal = async_sessionmaker(bind=make_read_engine(read_only_url(url), read_pragmas),
+                                               expire_on_commit=False)
+
+    async def override_get_session():
+        session = BenchSessionLocal()
+        try:
+            yield session
+        except Exception:
+            await session.rollback()
+            raise
+        finally:
+            await session.close()
+
+    async def override_get_read_session():
+        session = BenchReadSessionLocal()
+        try:
+            yield session
+        finally:
+            await session.close()
+
+    app.dependency_overrides[get_session] = override_get_session
+    app.dependency_overrides[get_read_session] = override_get_read_session
+    write_queue.session_factory = BenchSessionLocal
+    return sessionmaker(bind=sync_engine)
@@ -0,0 +1,45 @@
+import argparse
+import asyncio
+import time
+
+import httpx
+
+from my_app import app
+
+async def run_level(client: httpx.AsyncClient, path: str, clients: int, requests_per_client: int) -> list[float]:
+    latencies = []
+
+    async def worker():
+        for _ in range(requests_per_client):
+            start = time.perf_counter()
+            response = await client.get(path)
+            latencies.append(time.perf_counter() - start)
+            response.raise_for_status()
+
+    await asyncio.gather(*(worker() for _ in range(clients)))
+    return latencies
+
+def percentile(values: list[float], pct: float) -> float:
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))
+    return ordered[index]
+
+async def main(path: str, levels: list[int], requests_per_client: int):
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        await run_level(client, path, 1, 5)
+        print(f"{'clients':>8} {'rps':>10} {'p50 ms':>10} {'p99 ms':>10}")
+        for clients in levels:
+            start = time.perf_counter()
+            latencies = await run_level(client, path, clients, requests_per_client)
+            elapsed = time.perf_counter() - start
+            print(f"{clients:>8} {len(latencies) / elapsed:>10.1f} "
+                  f"{percentile(latencies, 50) * 1000:>10.2f} {percentile(latencies, 99) * 1000:>10.2f}")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Задержка эндпоинта при росте числа одновременных клиентов")
+    parser.add_argument("--path", default="/genres")
+    parser.add_argument("--levels", default="1,8,32,64")
+    parser.add_argument("--requests", type=int, default=50)
+    args = parser.parse_args()
+    asyncio.run(main(args.path, [int(level) for level in args.levels.split(",")], args.requests))
@@ -0,0 +1,78 @@
+import argparse
+import asyncio
+import random
+import time
+
+import httpx
+
+from benchmarks.common import use_temp_database
+from benchmarks.concurrency import percentile
+from database import SQLITE_PRAGMAS, SQLITE_READ_PRAGMAS
+from jwt_token import create_access_token
+from models import Author, Book, User
+from my_app import app
+
+PROFILES = {"default": ({}, {}), "tuned": (SQLITE_PRAGMAS, SQLITE_READ_PRAGMAS)}
+
+def seed(SessionLocal, books: int, clients: int) -> tuple[list[str], list[dict]]:
+    session = SessionLocal()
+    author = Author(name="Фёдор", surname="Достоевский", country="RU", profile_picture="p")
+    session.add(author)
+    session.flush()
+    book_rows = [Book(title=f"Книга {number}", year=1850 + number % 50, pages=300, profile_picture="p",
+                      country="RU", author_id=author.id) for number in range(books)]
+    session.add_all(book_rows)
+    logins = [f"reader{number}" for number in range(clients)]
+    session.add_all([User(login=login, password="x", email=f"{login}@example.com") for login in logins])
+    session.commit()
+    book_ids = [book.id for book in book_rows]
+    session.close()
+    return book_ids, [{"Authorization": f"Bearer {create_access_token(data={'sub': login})}"} for login in logins]
+
+async def run_mix(client: httpx.AsyncClient, book_ids: list[str], users: list[dict], requests_per_client: int,
+                  write_ratio: float) -> tuple[list[float], int]:
+    latencies = []
+    failures = 0
+
+    async def worker(headers: dict):
+        nonlocal failures
+        shelf = random.sample(book_ids, requests_per_client)
+        shelved = []
+        for book_id in shelf:
+            start = time.perf_counter()
+            if random.random() >= write_ratio:
+                response = await client.get(f"/books/{random.choice(book_ids)}")
+            elif shelved and random.random() < 0.5:
+                response = await client.put(f"/books/{random.choice(shelved)}/rate",
+                                            json=random.randint(1, 10), headers=headers)
+            else:
+                response = await client.post(f"/books/{book_id}", headers=headers)
+                shelved.append(book_id)
+            latencies.append(time.perf_counter() - start)
+            if response.status_code != 200:
+                failures += 1
+
+    await asyncio.gather(*(worker(headers) for headers in users))
+    return latencies, failures
+
+async def main(books: int, clients: int, requests_per_client: int, write_ratio: float):
+    print(f"{'profile':>10} {'rps':>10} {'p50 ms':>10} {'p99 ms':>10} {'errors':>8}")
+    for name, (pragmas, read_pragmas) in PROFILES.items():
+        book_ids, users = seed(use_temp_database(pragmas, read_pragmas), books, clients)
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+            start = time.perf_counter()
+            latencies, failures = await run_mix(client, book_ids, users, requests_per_client, write_ratio)
+            elapsed = time.perf_counter() - start
+        print(f"{name:>10} {len(latencies) / elapsed:>10.1f} {percentile(latencies, 50) * 1000:>10.2f} "
+              f"{percentile(latencies, 99) * 1000:>10.2f} {failures:>8}")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Смешанная нагрузка чтения и записи: настройки SQLite по умолчанию "
+                                                 "против WAL и прагм из окружения")
+    parser.add_argument("--books", type=int, default=2000)
+    parser.add_argument("--clients", type=int, default=16)
+    parser.add_argument("--requests", type=int, default=50)
+    parser.add_argument("--write-ratio", type=float, default=0.3)
+    args = parser.parse_args()
+    asyncio.run(main(args.books, args.clients, args.requests, args.write_ratio))
@@ -0,0 +1,205 @@
+import argparse
+import asyncio
+import json
+import platform
+import random
+import sqlite3
+import sys
+import time
+from collections import defaultdict
+from dataclasses import dataclass
+from typing import Awaitable, Callable
+
+import httpx
+from sqlalchemy import select
+
+from benchmarks.common import use_temp_database
+from benchmarks.concurrency import percentile
+from jwt_token import create_access_token
+from models import Achievment, Author, Book, Genre, User
+from models.book_model import UserBook
+from my_app import app
+from seed import seed_database
+
+@dataclass
+class Catalog:
+    book_ids: list
+    author_ids: list
+    genre_ids: list
+    achievment_ids: list
+    user_ids: list
+    shelves: dict
+    tokens: dict
+    search_words: list
+    SessionLocal: Callable
+
+    def headers(self, user_id: str) -> dict:
+        return {"Authorization": f"Bearer {self.tokens[user_id]}"}
+
+    def new_reader(self, name: str) -> str:
+        session = self.SessionLocal()
+        user = User(login=name, password="x", email=f"{name}@example.com")
+        session.add(user)
+        session.commit()
+        user_id = user.id
+        session.close()
+        self.tokens[user_id] = create_access_token(data={"sub": name})
+        return user_id
+
+Request = Callable[[httpx.AsyncClient, int], Awaitable[httpx.Response]]
+
+@dataclass
+class Scenario:
+    name: str
+    router: str
+    # Готовит одного клиента: возвращает функцию, выполняющую его i-й запрос
+    prepare: Callable[[Catalog, str, int], Request]
+
+def reader(path: Callable[[Catalog], str]) -> Callable[[Catalog, str, int], Request]:
+    def prepare(catalog: Catalog, name: str, requests: int) -> Request:
+        return lambda client, number: client.get(path(catalog))
+    return prepare
+
+def add_book_to_user(catalog: Catalog, name: str, requests: int) -> Request:
+    user_id = catalog.new_reader(name)
+    books = random.sample(catalog.book_ids, requests)
+    return lambda client, number: client.post(f"/books/{books[number]}", headers=catalog.headers(user_id))
+
+def rate_book(catalog: Catalog, name: str, requests: int) -> Request:
+    user_id = random.choice([user_id for user_id, books in catalog.shelves.items() if books])
+    return lambda client, number: client.put(f"/books/{random.choice(catalog.shelves[user_id])}/rate",
+                                             json=random.randint(1, 10), headers=catalog.headers(user_id))
+
+def get_user(catalog: Catalog, name: str, requests: int) -> Request:
+    user_id = random.choice(catalog.user_ids)
+    return lambda client, number: client.get(f"/users/{random.choice(catalog.user_ids)}",
+                                             headers=catalog.headers(user_id))
+
+def add_comment(catalog: Catalog, name: str, requests: int) -> Request:
+    user_id = random.choice(catalog.user_ids)
+    return lambda client, number: client.post("/add_comment", json={
+        "book_id": random.choice(catalog.book_ids), "content": f"Отзыв {name} {number}"},
+                                              headers=catalog.headers(user_id))
+
+SCENARIOS = [
+    Scenario("get_book", "book", reader(lambda catalog: f"/books/{random.choice(catalog.book_ids)}")),
+    Scenario("get_all_books", "book", reader(lambda catalog: "/books/rating")),
+    Scenario("add_book_to_user", "book", add_book_to_user),
+    Scenario("rate_book", "book", rate_book),
+    Scenario("get_user", "user", get_user),
+    Scenario("get_all_users", "user", reader(lambda catalog: "/users")),
+    Scenario("get_author", "author", reader(lambda catalog: f"/authors/{random.choice(catalog.author_ids)}")),
+    Scenario("get_all_authors", "author", reader(lambda catalog: "/authors")),
+    Scenario("get_all_genres", "genre", reader(lambda catalog: "/genres")),
+    Scenario("get_genre_books", "genre", reader(
+        lambda catalog: f"/genres/{random.choice(catalog.genre_ids)}/books?sort=rating")),
+    Scenario("add_comment", "comment", add_comment),
+    Scenario("get_achievment", "achievment", reader(
+        lambda catalog: f"/achievments/{random.choice(catalog.achievment_ids)}")),
+    Scenario("get_all_achievments", "achievment", reader(lambda catalog: "/achievments")),
+    Scenario("search", "search", reader(lambda catalog: f"/search?q={random.choice(catalog.search_words)}")),
+]
+
+def load_catalog(SessionLocal, users: int, books: int, shelf_entries: int, seed: int) -> Catalog:
+    seed_database(SessionLocal.kw["bind"], users=users, authors=max(1, books // 20), books=books, genres=20,
+                  shelf_entries=shelf_entries, comments=books // 2, seed=seed)
+    session = SessionLocal()
+    shelves = defaultdict(list)
+    for user_id, book_id in session.execute(select(UserBook.user_id, UserBook.book_id)):
+        shelves[user_id].append(book_id)
+    logins = dict(session.execute(select(User.id, User.login)).all())
+    catalog = Catalog(book_ids=list(session.scalars(select(Book.id))),
+                      author_ids=list(session.scalars(select(Author.id))),
+                      genre_ids=list(session.scalars(select(Genre.id))),
+                      achievment_ids=list(session.scalars(select(Achievment.id))),
+                      user_ids=list(logins), shelves=dict(shelves),
+                      tokens={user_id: create_access_token(data={"sub": login}) for user_id, login in logins.items()},
+                      search_words=sorted({title.split()[0][:3] for title in session.scalars(
+                          select(Book.title).limit(200))}),
+                      SessionLocal=SessionLocal)
+    session.close()
+    return catalog
+
+async def run_scenario(client: httpx.AsyncClient, catalog: Catalog, scenario: Scenario, clients: int,
+                       requests_per_client: int) -> dict:
+    latencies = []
+    errors = 0
+    prefix = f"{scenario.name}_{clients}_{time.monotonic_ns()}"
+    workers = [scenario.prepare(catalog, f"{prefix}_{number}", requests_per_client) for number in range(clients)]
+
+    async def worker(request: Request):
+        nonlocal errors
+        for number in range(requests_per_client):
+            start = time.perf_counter()
+            response = await request(client, number)
+            latencies.append(time.perf_counter() - start)
+            if response.status_code != 200:
+                errors += 1
+
+    start = time.perf_counter()
+    await asyncio.gather(*(worker(request) for request in workers))
+    elapsed = time.perf_counter() - start
+    return {"requests": len(latencies), "errors": errors, "rps": round(len(latencies) / elapsed, 1),
+            **{f"p{pct}_ms": round(percentile(latencies, pct) * 1000, 3) for pct in (50, 95, 99)}}
+
+def find_regressions(results: dict, baseline: dict, threshold: float) -> list[str]:
+    regressions = []
+    for name, levels in results["scenarios"].items():
+        for level, current in levels.items():
+            previous = baseline.get("scenarios", {}).get(name, {}).get(level)
+            if previous is None:
+                continue
+            if current["p95_ms"] > previous["p95_ms"] * (1 + threshold):
+                regressions.append(f"{name} x{level}: p95 {previous['p95_ms']} -> {current['p95_ms']} мс")
+            if current["rps"] < previous["rps"] * (1 - threshold):
+                regressions.append(f"{name} x{level}: rps {previous['rps']} -> {current['rps']}")
+            if current["errors"] > previous["errors"]:
+                regressions.append(f"{name} x{level}: ошибок {previous['errors']} -> {current['errors']}")
+    return regressions
+
+async def main(args) -> int:
+    random.seed(args.seed)
+    catalog = load_catalog(use_temp_database(), args.users, args.books, args.shelf_entries, args.seed)
+    selected = [scenario for scenario in SCENARIOS if not args.only or scenario.name in args.only]
+    results = {"meta": {"users": args.users, "books": args.books, "shelf_entries": args.shelf_entries,
+                        "levels": args.levels, "requests": args.requests, "seed": args.seed,
+                        "python": platform.python_version(), "sqlite": sqlite3.sqlite_version,
+                        "started_at": time.strftime("%Y-%m-%dT%H:%M:%S")},
+               "scenarios": {}}
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        print(f"{'scenario':>20} {'router':>11} {'clients':>8} {'rps':>9} {'p50 ms':>9} {'p95 ms':>9} "
+              f"{'p99 ms':>9} {'errors':>7}")
+        for scenario in selected:
+            await run_scenario(client, catalog, scenario, 1, 3)
+            for clients in args.levels:
+                stats = await run_scenario(client, catalog, scenario, clients, args.requests)
+                results["scenarios"].setdefault(scenario.name, {})[str(clients)] = stats
+                print(f"{scenario.name:>20} {scenario.router:>11} {clients:>8} {stats['rps']:>9.1f} "
+                      f"{stats['p50_ms']:>9.2f} {stats['p95_ms']:>9.2f} {stats['p99_ms']:>9.2f} "
+                      f"{stats['errors']:>7}")
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as file:
+            json.dump(results, file, ensure_ascii=False, indent=2)
+    if args.baseline:
+        with open(args.baseline, encoding="utf-8") as file:
+            regressions = find_regressions(results, json.load(file), args.threshold)
+        for regression in regressions:
+            print(f"Регрессия: {regression}")
+        return 1 if regressions else 0
+    return 0
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Задержки и пропускная способность всех роутеров приложения на "
+                                                 "сгенерированной базе, со сравнением с сохранённым базовым прогоном")
+    parser.add_argument("--users", type=int, default=2000)
+    parser.add_argument("--books", type=int, default=10000)
+    parser.add_argument("--shelf-entries", type=int, default=100000)
+    parser.add_argument("--levels", type=lambda value: [int(level) for level in value.split(",")], default="1,8,32")
+    parser.add_argument("--requests", type=int, default=30)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--only", type=lambda value: value.split(","), default=None)
+    parser.add_argument("--output", default=None)
+    parser.add_argument("--baseline", default=None)
+    parser.add_argument("--threshold", type=float, default=0.25)
+    sys.exit(asyncio.run(main(parser.parse_args())))
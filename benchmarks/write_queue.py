@@ -0,0 +1,34 @@
+import argparse
+import asyncio
+import time
+
+import httpx
+
+from benchmarks.common import use_temp_database
+from benchmarks.concurrency import percentile
+from benchmarks.sqlite_profile import run_mix, seed
+from my_app import app
+from write_queue import write_queue
+
+async def main(books: int, clients: int, requests_per_client: int):
+    print(f"{'mode':>10} {'rps':>10} {'p50 ms':>10} {'p99 ms':>10} {'errors':>8} {'batches':>8}")
+    for name, enabled in [("direct", False), ("queued", True)]:
+        write_queue.enabled = enabled
+        book_ids, users = seed(use_temp_database(), books, clients)
+        batches = write_queue.batches
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+            start = time.perf_counter()
+            latencies, failures = await run_mix(client, book_ids, users, requests_per_client, 1.0)
+            elapsed = time.perf_counter() - start
+        print(f"{name:>10} {len(latencies) / elapsed:>10.1f} {percentile(latencies, 50) * 1000:>10.2f} "
+              f"{percentile(latencies, 99) * 1000:>10.2f} {failures:>8} {write_queue.batches - batches:>8}")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Всплеск оценок и добавлений на полку: запись из каждого "
+                                                 "обработчика против очереди с групповым коммитом")
+    parser.add_argument("--books", type=int, default=2000)
+    parser.add_argument("--clients", type=int, default=64)
+    parser.add_argument("--requests", type=int, default=20)
+    args = parser.parse_args()
+    asyncio.run(main(args.books, args.clients, args.requests))
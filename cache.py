@@ -0,0 +1,219 @@
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from typing import Any, Hashable, Optional
+
+from dotenv import load_dotenv
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse, Response
+
+load_dotenv()
+
+RESPONSE_CACHE = os.getenv("RESPONSE_CACHE", "memory")
+RESPONSE_CACHE_PATH = os.getenv("RESPONSE_CACHE_PATH", "response_cache.db")
+RESPONSE_CACHE_SIZE = int(os.getenv("RESPONSE_CACHE_SIZE", "2048"))
+RESPONSE_CACHE_TTL = float(os.getenv("RESPONSE_CACHE_TTL", "300"))
+
+class TTLCache:
+    def __init__(self, maxsize: int, ttl: float):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._data: OrderedDict = OrderedDict()
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        entry = self._data.get(key)
+        if entry is None or entry[0] <= time.monotonic():
+            if entry is not None:
+                del self._data[key]
+            self.misses += 1
+            return default
+        self._data.move_to_end(key)
+        self.hits += 1
+        return entry[1]
+
+    def set(self, key: Hashable, value: Any, expires_at: Optional[float] = None):
+        if expires_at is None:
+            expires_at = time.monotonic() + self.ttl
+        self._data[key] = (expires_at, value)
+        self._data.move_to_end(key)
+        while len(self._data) > self.maxsize:
+            self._data.popitem(last=False)
+            self.evictions += 1
+
+    def pop(self, key: Hashable):
+        self._data.pop(key, None)
+
+    def clear(self):
+        self._data.clear()
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+class MemoryBackend:
+    def __init__(self, maxsize: int, ttl: float):
+        self.entries = TTLCache(maxsize=maxsize, ttl=ttl)
+        self.tag_versions: dict = {}
+        self.epoch = uuid.uuid4().hex
+
+    @property
+    def evictions(self) -> int:
+        return self.entries.evictions
+
+    def get(self, key: str) -> Optional[tuple]:
+        return self.entries.get(key)
+
+    def set(self, key: str, versions: list, body: bytes):
+        self.entries.set(key, (versions, body))
+
+    def versions(self, tags: list) -> list:
+        return [self.tag_versions.get(tag, 0) for tag in tags]
+
+    def bump(self, tags):
+        for tag in tags:
+            self.tag_versions[tag] = self.tag_versions.get(tag, 0) + 1
+
+    def clear(self):
+        self.entries.clear()
+        self.tag_versions.clear()
+        self.epoch = uuid.uuid4().hex
+
+class SqliteBackend:
+    # Локальная замена общего кэша (Redis и т.п.): один файл на все процессы-воркеры
+    def __init__(self, path: str, maxsize: int, ttl: float):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.evictions = 0
+        self._lock = threading.Lock()
+        self._connection = sqlite3.connect(path, isolation_level=None, check_same_thread=False, timeout=5)
+        self._connection.execute("PRAGMA journal_mode=WAL")
+        self._connection.execute("PRAGMA synchronous=OFF")
+        self._connection.execute("CREATE TABLE IF NOT EXISTS response_cache (key TEXT PRIMARY KEY, versions TEXT, "
+                                 "body BLOB, expires_at REAL, used_at REAL)")
+        self._connection.execute("CREATE INDEX IF NOT EXISTS ix_response_cache_used_at ON response_cache (used_at)")
+        self._connection.execute("CREATE TABLE IF NOT EXISTS cache_tags (tag TEXT PRIMARY KEY, version INTEGER)")
+        self._connection.execute("CREATE TABLE IF NOT EXISTS cache_epoch (epoch TEXT)")
+        self.epoch = self._load_epoch()
+
+    def _load_epoch(self) -> str:
+        self._connection.execute("INSERT INTO cache_epoch SELECT ? WHERE NOT EXISTS (SELECT 1 FROM cache_epoch)",
+                                 (uuid.uuid4().hex,))
+        return self._connection.execute("SELECT epoch FROM cache_epoch").fetchone()[0]
+
+    def get(self, key: str) -> Optional[tuple]:
+        now = time.time()
+        with self._lock:
+            row = self._connection.execute("SELECT versions, body FROM response_cache WHERE key = ? AND expires_at > ?",
+                                           (key, now)).fetchone()
+            if row is None:
+                return None
+            self._connection.execute("UPDATE response_cache SET used_at = ? WHERE key = ?", (now, key))
+        return json.loads(row[0]), row[1]
+
+    def set(self, key: str, versions: list, body: bytes):
+        now = time.time()
+        with self._lock:
+            self._connection.execute("INSERT OR REPLACE INTO response_cache VALUES (?, ?, ?, ?, ?)",
+                                     (key, json.dumps(versions), body, now + self.ttl, now))
+            overflow = self._connection.execute("SELECT count(*) FROM response_cache").fetchone()[0] - self.maxsize
+            if overflow > 0:
+                self._connection.execute("DELETE FROM response_cache WHERE key IN (SELECT key FROM response_cache "
+                                         "ORDER BY used_at LIMIT ?)", (overflow,))
+                self.evictions += overflow
+
+    def versions(self, tags: list) -> list:
+        with self._lock:
+            known = dict(self._connection.execute(
+                f"SELECT tag, version FROM cache_tags WHERE tag IN ({', '.join('?' * len(tags))})", tags).fetchall())
+        return [known.get(tag, 0) for tag in tags]
+
+    def bump(self, tags):
+        with self._lock:
+            self._connection.executemany("INSERT INTO cache_tags VALUES (?, 1) ON CONFLICT (tag) "
+                                         "DO UPDATE SET version = version + 1", [(tag,) for tag in tags])
+
+    def clear(self):
+        with self._lock:
+            self._connection.execute("DELETE FROM response_cache")
+            self._connection.execute("DELETE FROM cache_tags")
+            self._connection.execute("DELETE FROM cache_epoch")
+            self.epoch = self._load_epoch()
+
+def etag_matches(etag: str, if_none_match: Optional[str], exists: bool = False) -> bool:
+    if not if_none_match:
+        return False
+    candidates = [candidate.strip().removeprefix("W/") for candidate in if_none_match.split(",")]
+    # «*» означает «любое текущее представление», поэтому годится только когда известно, что оно есть
+    return (exists and "*" in candidates) or etag in candidates
+
+class CacheLookup:
+    def __init__(self, cache: "ResponseCache", key: str, tags: list, versions: list, etag: str):
+        self.cache = cache
+        self.key = key
+        self.tags = tags
+        self.versions = versions
+        self.etag = etag
+        self.response: Optional[Response] = None
+
+    def store(self, value: Any) -> Response:
+        body = JSONResponse(jsonable_encoder(value)).body
+        self.cache.backend.set(self.key, self.versions, body)
+        return Response(content=body, media_type="application/json", headers={"ETag": self.etag})
+
+class ResponseCache:
+    def __init__(self, backend):
+        self.backend = backend
+        self.hits = 0
+        self.misses = 0
+        self.stale = 0
+        self.not_modified = 0
+
+    def lookup(self, name: str, tags: set, *params, if_none_match: Optional[str] = None) -> CacheLookup:
+        key = json.dumps([name, *params], separators=(",", ":"), ensure_ascii=False)
+        tags = sorted(tags)
+        versions = self.backend.versions(tags)
+        digest = hashlib.sha1(json.dumps([self.backend.epoch, key, versions]).encode("utf-8")).hexdigest()
+        lookup = CacheLookup(self, key, tags, versions, f'"{digest[:20]}"')
+        if etag_matches(lookup.etag, if_none_match):
+            self.not_modified += 1
+            lookup.response = Response(status_code=304, headers={"ETag": lookup.etag})
+            return lookup
+        entry = self.backend.get(key)
+        if entry is None:
+            self.misses += 1
+        elif entry[0] != versions:
+            self.stale += 1
+            self.misses += 1
+        elif etag_matches(lookup.etag, if_none_match, exists=True):
+            self.not_modified += 1
+            lookup.response = Response(status_code=304, headers={"ETag": lookup.etag})
+        else:
+            self.hits += 1
+            lookup.response = Response(content=entry[1], media_type="application/json", headers={"ETag": lookup.etag})
+        return lookup
+
+    def invalidate(self, *tags: str):
+        self.backend.bump(tags)
+
+    def stats(self) -> dict:
+        requests = self.hits + self.misses
+        return {"backend": type(self.backend).__name__, "hits": self.hits, "misses": self.misses,
+                "stale": self.stale, "not_modified": self.not_modified, "evictions": self.backend.evictions,
+                "hit_ratio": round(self.hits / requests, 4) if requests else 0.0}
+
+    def clear(self):
+        self.backend.clear()
+
+def make_backend(kind: str):
+    if kind == "sqlite":
+        return SqliteBackend(RESPONSE_CACHE_PATH, RESPONSE_CACHE_SIZE, RESPONSE_CACHE_TTL)
+    return MemoryBackend(RESPONSE_CACHE_SIZE, RESPONSE_CACHE_TTL)
+
+response_cache = ResponseCache(make_backend(RESPONSE_CACHE))
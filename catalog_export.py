@@ -0,0 +1,57 @@
+import json
+import os
+import zlib
+from typing import AsyncIterator, Optional
+
+from dotenv import load_dotenv
+from sqlalchemy import select, tuple_
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from models import Author, Book, Genre
+from models.book_model import UserBook
+from models.genre_model import BookGenreAssociation
+
+load_dotenv()
+
+EXPORT_CHUNK_SIZE = int(os.getenv("EXPORT_CHUNK_SIZE", "1000"))
+
+def ndjson(records: list) -> bytes:
+    return "".join(json.dumps(record, ensure_ascii=False, separators=(",", ":")) + "\n"
+                   for record in records).encode("utf-8")
+
+async def export_books(session: AsyncSession, after: Optional[str] = None,
+                       chunk_size: int = EXPORT_CHUNK_SIZE) -> AsyncIterator[bytes]:
+    query = select(Book.id, Book.title, Book.year, Book.pages, Book.profile_picture, Book.country,
+                   Book.average_rating, Book.readers_count, Book.author_id, Author.name, Author.surname,
+                   Author.patronymic).outerjoin(Author, Author.id == Book.author_id).order_by(Book.id)
+    if after is not None:
+        query = query.where(Book.id > after)
+    result = await session.stream(query.execution_options(yield_per=chunk_size))
+    async for rows in result.partitions():
+        genres: dict = {}
+        for book_id, genre_name in await session.execute(
+                select(BookGenreAssociation.book_id, Genre.genre_name)
+                .join(Genre, Genre.id == BookGenreAssociation.genre_id)
+                .where(BookGenreAssociation.book_id.in_([row.id for row in rows]))):
+            genres.setdefault(book_id, []).append(genre_name)
+        yield ndjson([{"id": row.id, "title": row.title, "year": row.year, "pages": row.pages,
+                       "profile_picture": row.profile_picture, "country": row.country,
+                       "average_rating": row.average_rating, "readers_count": row.readers_count,
+                       "author_id": row.author_id, "author_name": row.name, "author_surname": row.surname,
+                       "author_patronymic": row.patronymic, "genres": sorted(genres.get(row.id, []))}
+                      for row in rows])
+
+async def export_user_books(session: AsyncSession, after: Optional[tuple] = None,
+                            chunk_size: int = EXPORT_CHUNK_SIZE) -> AsyncIterator[bytes]:
+    query = select(UserBook.user_id, UserBook.book_id, UserBook.rating).order_by(UserBook.user_id, UserBook.book_id)
+    if after is not None:
+        query = query.where(tuple_(UserBook.user_id, UserBook.book_id) > tuple_(*after))
+    result = await session.stream(query.execution_options(yield_per=chunk_size))
+    async for rows in result.partitions():
+        yield ndjson([{"user_id": row.user_id, "book_id": row.book_id, "rating": row.rating} for row in rows])
+
+async def gzip_stream(chunks: AsyncIterator[bytes]) -> AsyncIterator[bytes]:
+    compressor = zlib.compressobj(6, zlib.DEFLATED, 31)
+    async for chunk in chunks:
+        yield compressor.compress(chunk) + compressor.flush(zlib.Z_SYNC_FLUSH)
+    yield compressor.flush()
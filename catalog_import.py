@@ -0,0 +1,261 @@
+import argparse
+import asyncio
+import csv
+import json
+import os
+import uuid
+from typing import AsyncIterator, Optional, Union
+
+from dotenv import load_dotenv
+from pydantic import BaseModel, ValidationError, field_validator
+from sqlalchemy import bindparam, insert, select, update
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from cache import response_cache
+from database import AsyncSessionLocal, init_db
+from models import Author, Book, Genre
+from models.genre_model import BookGenreAssociation
+
+load_dotenv()
+
+IMPORT_BATCH_SIZE = int(os.getenv("IMPORT_BATCH_SIZE", "5000"))
+MAX_REPORTED_ERRORS = 1000
+
+class ImportGenre(BaseModel):
+    genre_name: str
+
+class ImportAuthor(BaseModel):
+    name: str
+    surname: str
+    patronymic: Optional[str] = None
+    country: Optional[str] = None
+    profile_picture: str = ""
+
+class ImportBook(BaseModel):
+    title: str
+    year: int
+    pages: int
+    profile_picture: str
+    author_name: str
+    author_surname: str
+    author_patronymic: Optional[str] = None
+    country: Optional[str] = None
+    genres: list[str] = []
+
+    @field_validator("genres", mode="before")
+    @classmethod
+    def split_genres(cls, value: Union[str, list, None]) -> list:
+        if value is None:
+            return []
+        if isinstance(value, str):
+            return [name.strip() for name in value.split("|") if name.strip()]
+        return value
+
+ROW_KINDS = {"genre": ImportGenre, "author": ImportAuthor, "book": ImportBook}
+
+def author_key(name: str, surname: str, patronymic: Optional[str]) -> tuple:
+    return name, surname, patronymic or ""
+
+class CatalogImporter:
+    def __init__(self, session: AsyncSession, batch_size: int = IMPORT_BATCH_SIZE):
+        self.session = session
+        self.batch_size = batch_size
+        self.authors: dict = {}
+        self.genres: dict = {}
+        self.books: set = set()
+        self.imported = {"genres": 0, "authors": 0, "books": 0}
+        self.errors: list = []
+        self.error_count = 0
+        self.touched_authors: set = set()
+        self._reset_batch()
+
+    def _reset_batch(self):
+        self.new_genres = []
+        self.new_authors = []
+        self.new_books = []
+        self.new_associations = []
+        self.book_deltas: dict = {}
+        self.batch_lines = []
+
+    async def load(self):
+        for row in await self.session.execute(select(Author.id, Author.name, Author.surname, Author.patronymic,
+                                                     Author.country)):
+            self.authors[author_key(row.name, row.surname, row.patronymic)] = (row.id, row.country)
+        self.genres = dict((await self.session.execute(select(Genre.genre_name, Genre.id))).all())
+        self.books = set((await self.session.execute(select(Book.author_id, Book.title))).all())
+
+    def error(self, line: int, detail: str):
+        self.error_count += 1
+        if len(self.errors) < MAX_REPORTED_ERRORS:
+            self.errors.append({"line": line, "detail": detail})
+
+    def add_genre(self, genre_name: str) -> str:
+        genre_id = self.genres.get(genre_name)
+        if genre_id is None:
+            genre_id = str(uuid.uuid4())
+            self.genres[genre_name] = genre_id
+            self.new_genres.append({"id": genre_id, "genre_name": genre_name})
+        return genre_id
+
+    def add_author(self, data: ImportAuthor) -> tuple:
+        key = author_key(data.name, data.surname, data.patronymic)
+        known = self.authors.get(key)
+        if known is None:
+            known = (str(uuid.uuid4()), data.country)
+            self.authors[key] = known
+            self.new_authors.append({"id": known[0], "name": data.name, "surname": data.surname,
+                                     "patronymic": data.patronymic, "country": data.country,
+                                     "profile_picture": data.profile_picture})
+        return known
+
+    def add_row(self, line: int, row: dict) -> bool:
+        kind = row.pop("kind", None) or "book"
+        model = ROW_KINDS.get(kind)
+        if model is None:
+            self.error(line, f"Неизвестный тип строки: {kind}")
+            return False
+        try:
+            data = model.model_validate(row)
+        except ValidationError as e:
+            self.error(line, "; ".join(f"{'.'.join(map(str, item['loc']))}: {item['msg']}" for item in e.errors()))
+            return False
+        if kind == "genre":
+            self.add_genre(data.genre_name)
+        elif kind == "author":
+            self.add_author(data)
+        else:
+            known = self.authors.get(author_key(data.author_name, data.author_surname, data.author_patronymic))
+            country = data.country or (known[1] if known else None)
+            if not country:
+                self.error(line, "Не указана страна книги и её автора")
+                return False
+            author_id, _ = self.add_author(ImportAuthor(name=data.author_name, surname=data.author_surname,
+                                                        patronymic=data.author_patronymic, country=country))
+            if (author_id, data.title) in self.books:
+                self.error(line, "Такая книга уже есть!")
+                return False
+            self.books.add((author_id, data.title))
+            book_id = str(uuid.uuid4())
+            self.new_books.append({"id": book_id, "title": data.title, "year": data.year, "pages": data.pages,
+                                   "profile_picture": data.profile_picture, "country": country,
+                                   "author_id": author_id})
+            for genre_id in {self.add_genre(genre_name) for genre_name in data.genres}:
+                self.new_associations.append({"book_id": book_id, "genre_id": genre_id})
+            self.book_deltas[author_id] = self.book_deltas.get(author_id, 0) + 1
+        self.batch_lines.append(line)
+        return len(self.batch_lines) >= self.batch_size
+
+    async def flush(self):
+        if not self.batch_lines:
+            return
+        try:
+            connection = await self.session.connection()
+            for table, rows in [(Genre.__table__, self.new_genres), (Author.__table__, self.new_authors),
+                                (Book.__table__, self.new_books),
+                                (BookGenreAssociation.__table__, self.new_associations)]:
+                if rows:
+                    await connection.execute(insert(table), rows)
+            if self.book_deltas:
+                await connection.execute(
+                    update(Author.__table__).where(Author.id == bindparam("author_id"))
+                    .values(books_count=Author.books_count + bindparam("delta")),
+                    [{"author_id": author_id, "delta": delta} for author_id, delta in self.book_deltas.items()])
+            await self.session.commit()
+        except Exception as e:
+            await self.session.rollback()
+            print(f"Ошибка: {e}")
+            for line in self.batch_lines:
+                self.error(line, "Пакет не записан: ошибка базы данных")
+            # Откатанные сущности нельзя оставлять в картах, иначе следующие пакеты сошлются на них
+            for genre in self.new_genres:
+                self.genres.pop(genre["genre_name"], None)
+            for author in self.new_authors:
+                self.authors.pop(author_key(author["name"], author["surname"], author["patronymic"]), None)
+            for book in self.new_books:
+                self.books.discard((book["author_id"], book["title"]))
+        else:
+            self.imported["genres"] += len(self.new_genres)
+            self.imported["authors"] += len(self.new_authors)
+            self.imported["books"] += len(self.new_books)
+            self.touched_authors.update(self.book_deltas)
+        self._reset_batch()
+
+    def report(self) -> dict:
+        return {"imported": self.imported, "error_count": self.error_count, "errors": self.errors}
+
+async def iter_lines(chunks: AsyncIterator[bytes]) -> AsyncIterator[str]:
+    buffer = b""
+    async for chunk in chunks:
+        buffer += chunk
+        *lines, buffer = buffer.split(b"\n")
+        for line in lines:
+            yield line.decode("utf-8-sig").rstrip("\r")
+    if buffer:
+        yield buffer.decode("utf-8-sig").rstrip("\r")
+
+async def iter_file_lines(path: str) -> AsyncIterator[str]:
+    with open(path, encoding="utf-8-sig") as file:
+        for line in file:
+            yield line.rstrip("\r\n")
+
+async def iter_rows(lines: AsyncIterator[str], file_format: str) -> AsyncIterator[tuple[int, Union[dict, str]]]:
+    header = None
+    number = 0
+    pending = []
+    async for line in lines:
+        number += 1
+        if not pending and not line.strip():
+            continue
+        if file_format == "csv":
+            # Поле в кавычках может содержать перевод строки: строки копятся, пока кавычки не закроются
+            pending.append(line)
+            if sum(part.count('"') for part in pending) % 2:
+                continue
+            first, record = number - len(pending) + 1, "\n".join(pending)
+            pending = []
+            values = next(csv.reader([record]))
+            if header is None:
+                header = values
+                continue
+            if len(values) != len(header):
+                yield first, "Число колонок не совпадает с заголовком"
+                continue
+            yield first, {key: value for key, value in zip(header, values) if value != ""}
+        else:
+            try:
+                row = json.loads(line)
+            except ValueError:
+                yield number, "Некорректный JSON"
+                continue
+            yield number, row if isinstance(row, dict) else "Строка должна быть JSON-объектом"
+    if pending:
+        yield number - len(pending) + 1, "Незакрытые кавычки"
+
+async def import_catalog(session: AsyncSession, lines: AsyncIterator[str], file_format: str,
+                         batch_size: int = IMPORT_BATCH_SIZE) -> CatalogImporter:
+    importer = CatalogImporter(session, batch_size)
+    await importer.load()
+    async for line, row in iter_rows(lines, file_format):
+        if isinstance(row, str):
+            importer.error(line, row)
+        elif importer.add_row(line, row):
+            await importer.flush()
+    await importer.flush()
+    response_cache.invalidate("books", "authors", "genres", *(f"author:{author_id}" for author_id in
+                                                            importer.touched_authors))
+    return importer
+
+async def main(path: str, file_format: str, batch_size: int):
+    init_db()
+    async with AsyncSessionLocal() as session:
+        importer = await import_catalog(session, iter_file_lines(path), file_format, batch_size)
+    print(json.dumps(importer.report(), ensure_ascii=False, indent=2))
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Пакетный импорт книг, авторов и жанров из NDJSON или CSV")
+    parser.add_argument("path")
+    parser.add_argument("--format", choices=["ndjson", "csv"], default=None)
+    parser.add_argument("--batch-size", type=int, default=IMPORT_BATCH_SIZE)
+    args = parser.parse_args()
+    file_format = args.format or ("csv" if args.path.endswith(".csv") else "ndjson")
+    asyncio.run(main(args.path, file_format, args.batch_size))
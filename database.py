@@ -1,9 +1,132 @@
-from sqlalchemy import create_engine
+import os
+from typing import Optional
+
+from dotenv import load_dotenv
+from sqlalchemy import create_engine, event, inspect, text
+from sqlalchemy.engine import make_url
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker
 from sqlalchemy.orm import declarative_base, sessionmaker
+from sqlalchemy.schema import CreateColumn
+
+from metrics import instrument_engine
+
+load_dotenv()
+
+DATABASE_URL = os.getenv("DATABASE_URL", "sqlite:///test.db")
+READ_DATABASE_URL = os.getenv("READ_DATABASE_URL")
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "5"))
+DB_MAX_OVERFLOW = int(os.getenv("DB_MAX_OVERFLOW", "10"))
+DB_READ_POOL_SIZE = int(os.getenv("DB_READ_POOL_SIZE", str(DB_POOL_SIZE)))
+SQLITE_PRAGMAS = {
+    "journal_mode": os.getenv("SQLITE_JOURNAL_MODE", "WAL"),
+    "synchronous": os.getenv("SQLITE_SYNCHRONOUS", "NORMAL"),
+    "busy_timeout": int(os.getenv("SQLITE_BUSY_TIMEOUT", "5000")),
+    "mmap_size": int(os.getenv("SQLITE_MMAP_SIZE", str(256 * 1024 * 1024))),
+    "cache_size": int(os.getenv("SQLITE_CACHE_SIZE", "-65536")),
+}
+# Режим журнала и synchronous задаёт пишущее соединение, читателю они не нужны
+SQLITE_READ_PRAGMAS = {name: value for name, value in SQLITE_PRAGMAS.items()
+                       if name not in ("journal_mode", "synchronous")} | {"query_only": "ON"}
+
+def database_url(url: str, driver: str) -> str:
+    parsed = make_url(url)
+    if parsed.get_backend_name() == "sqlite" and parsed.get_driver_name() in ("", "pysqlite", "aiosqlite"):
+        parsed = parsed.set(drivername=f"sqlite+{driver}")
+    return parsed.render_as_string(hide_password=False)
+
+def read_only_url(url: str) -> str:
+    parsed = make_url(url)
+    if parsed.get_backend_name() != "sqlite" or parsed.database in (None, "", ":memory:"):
+        return url
+    database = parsed.database if parsed.database.startswith("file:") else f"file:{parsed.database}"
+    parsed = parsed.set(database=database, query={**parsed.query, "mode": "ro", "uri": "true"})
+    return parsed.render_as_string(hide_password=False)
+
+def apply_pragmas(sync_engine, pragmas: dict):
+    if sync_engine.dialect.name != "sqlite" or not pragmas:
+        return
+
+    @event.listens_for(sync_engine, "connect")
+    def set_pragmas(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        for name, value in pragmas.items():
+            cursor.execute(f"PRAGMA {name}={value}")
+        cursor.close()
 
-engine = create_engine("sqlite+pysqlite:///test.db")
+def engine_options(kwargs: dict) -> dict:
+    if "poolclass" not in kwargs:
+        kwargs.setdefault("pool_size", DB_POOL_SIZE)
+        kwargs.setdefault("max_overflow", DB_MAX_OVERFLOW)
+    return kwargs
+
+def make_engine(url: str = DATABASE_URL, pragmas: Optional[dict] = None, **kwargs):
+    new_engine = create_engine(database_url(url, "pysqlite"), **engine_options(kwargs))
+    apply_pragmas(new_engine, SQLITE_PRAGMAS if pragmas is None else pragmas)
+    instrument_engine(new_engine)
+    return new_engine
+
+def make_async_engine(url: str = DATABASE_URL, pragmas: Optional[dict] = None, **kwargs):
+    new_engine = create_async_engine(database_url(url, "aiosqlite"), **engine_options(kwargs))
+    apply_pragmas(new_engine.sync_engine, SQLITE_PRAGMAS if pragmas is None else pragmas)
+    instrument_engine(new_engine.sync_engine)
+    return new_engine
+
+def make_read_engine(url: Optional[str] = None, pragmas: Optional[dict] = None, **kwargs):
+    if url is None:
+        url = READ_DATABASE_URL or read_only_url(DATABASE_URL)
+    if "poolclass" not in kwargs:
+        kwargs.setdefault("pool_size", DB_READ_POOL_SIZE)
+    return make_async_engine(url, SQLITE_READ_PRAGMAS if pragmas is None else pragmas, **kwargs)
+
+engine = make_engine()
+async_engine = make_async_engine()
+read_engine = make_read_engine()
 Base = declarative_base()
 SessionLocal = sessionmaker(bind=engine)
+AsyncSessionLocal = async_sessionmaker(bind=async_engine, expire_on_commit=False)
+AsyncReadSessionLocal = async_sessionmaker(bind=read_engine, expire_on_commit=False)
+
+def init_db() -> list[str]:
+    existing = set(inspect(engine).get_table_names())
+    Base.metadata.create_all(bind=engine)
+    created = [table.name for table in Base.metadata.sorted_tables if table.name not in existing]
+    return created + upgrade_db(engine)
+
+def upgrade_db(bind) -> list[str]:
+    inspector = inspect(bind)
+    added = []
+    with bind.begin() as connection:
+        for table in Base.metadata.sorted_tables:
+            existing = {column["name"]: column for column in inspector.get_columns(table.name)}
+            for column in table.columns:
+                if column.name not in existing:
+                    column_ddl = CreateColumn(column).compile(dialect=connection.dialect)
+                    connection.execute(text(f"ALTER TABLE {table.name} ADD COLUMN {column_ddl}"))
+                    added.append(f"{table.name}.{column.name}")
+                elif existing[column.name]["nullable"] and not column.nullable and column.server_default is not None:
+                    # SQLite не умеет сделать старую колонку NOT NULL, но NULL в ней заменяются значением по умолчанию
+                    connection.execute(text(f"UPDATE {table.name} SET {column.name} = {column.server_default.arg} "
+                                            f"WHERE {column.name} IS NULL"))
+            indexes = {index["name"] for index in inspector.get_indexes(table.name)}
+            for index in table.indexes:
+                if index.name not in indexes:
+                    index.create(connection)
+                    added.append(index.name)
+    return added
+
+async def get_session():
+    session = AsyncSessionLocal()
+    try:
+        yield session
+    except Exception:
+        await session.rollback()
+        raise
+    finally:
+        await session.close()
 
-def init_db():
-    Base.metadata.create_all(bind=engine)
\ No newline at end of file
+async def get_read_session():
+    session = AsyncReadSessionLocal()
+    try:
+        yield session
+    finally:
+        await session.close()
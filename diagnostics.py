@@ -0,0 +1,62 @@
+import os
+import re
+from collections import Counter
+from typing import Optional
+
+from dotenv import load_dotenv
+
+load_dotenv()
+
+SLOW_QUERY_MS = float(os.getenv("SLOW_QUERY_MS", "0"))
+REPEATED_QUERY_LIMIT = int(os.getenv("REPEATED_QUERY_LIMIT", "0"))
+REPEATED_QUERY_RAISE = os.getenv("REPEATED_QUERY_RAISE", "0") == "1"
+MAX_PARAMETERS_LENGTH = 500
+
+# Раскрытые IN-списки разной длины считаются одной формой запроса
+EXPANDED_IN = re.compile(r"\((?:\?|%\(\w+\)s|:\w+)(?:, (?:\?|%\(\w+\)s|:\w+))*\)")
+
+class RepeatedQueryError(Exception):
+    pass
+
+def statement_shape(statement: str) -> str:
+    return EXPANDED_IN.sub("(?)", " ".join(statement.split()))
+
+class QueryDiagnostics:
+    def __init__(self, slow_ms: float, repeat_limit: int, raise_on_repeat: bool):
+        self.slow_ms = slow_ms
+        self.repeat_limit = repeat_limit
+        self.raise_on_repeat = raise_on_repeat
+
+    def observe(self, stats, statement: str, parameters, elapsed: float):
+        route = stats.route() if stats is not None else "вне запроса"
+        if self.slow_ms and elapsed * 1000 >= self.slow_ms:
+            shown = repr(parameters)
+            if len(shown) > MAX_PARAMETERS_LENGTH:
+                shown = shown[:MAX_PARAMETERS_LENGTH] + "..."
+            print(f"Медленный запрос {elapsed * 1000:.1f} мс [{route}]: {' '.join(statement.split())} {shown}")
+        if stats is None or not self.repeat_limit:
+            return
+        shape = statement_shape(statement)
+        stats.shapes[shape] += 1
+        if stats.shapes[shape] == self.repeat_limit + 1:
+            message = f"Запрос выполнен больше {self.repeat_limit} раз за запрос [{route}]: {shape}"
+            stats.repeated.append(message)
+            print(message)
+
+    def finish(self, stats):
+        if self.raise_on_repeat and stats.repeated:
+            raise RepeatedQueryError("\n".join(stats.repeated))
+
+query_diagnostics = QueryDiagnostics(SLOW_QUERY_MS, REPEATED_QUERY_LIMIT, REPEATED_QUERY_RAISE)
+
+class QueryLog:
+    def __init__(self, scope: Optional[dict] = None):
+        self.scope = scope
+        self.shapes: Counter = Counter()
+        self.repeated: list = []
+
+    def route(self) -> str:
+        if self.scope is None:
+            return "вне запроса"
+        route = getattr(self.scope.get("route"), "path", None)
+        return f"{self.scope['method']} {route or self.scope['path']}"
@@ -1,21 +1,34 @@
 from datetime import timedelta, datetime
 from dotenv import load_dotenv
+import hashlib
 import os
+import time
 
 import jwt
 from fastapi import HTTPException, Depends, status
 from fastapi.security import OAuth2PasswordBearer
+from pydantic import BaseModel
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from cache import TTLCache
+from database import get_read_session
+from models import User
 
 load_dotenv()
 
 SECRET_KEY = os.getenv("KEY")
 ALGORITHM = "HS256"
 ACCESS_TOKEN_EXPIRE_MINUTES = 600
+PRINCIPAL_CACHE_SIZE = int(os.getenv("PRINCIPAL_CACHE_SIZE", "10000"))
+PRINCIPAL_CACHE_TTL = float(os.getenv("PRINCIPAL_CACHE_TTL", "60"))
+TOKEN_CACHE_SIZE = int(os.getenv("TOKEN_CACHE_SIZE", "10000"))
 
 def create_access_token(data: dict):
     to_encode = data.copy()
     expire = datetime.utcnow() + timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES)
-    to_encode.update({"exp": expire})
+    # iat с дробной частью: токен, выданный сразу после отзыва, не должен попасть под него
+    to_encode.update({"exp": expire, "iat": time.time()})
     encoded_jwt = jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
     return encoded_jwt
 
@@ -28,17 +41,62 @@ def create_refresh_token(data: dict):
 
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="token")
 
+# Ключ - sha256 от токена, значение - payload; запись живёт ровно до exp токена
+token_cache = TTLCache(maxsize=TOKEN_CACHE_SIZE, ttl=ACCESS_TOKEN_EXPIRE_MINUTES * 60)
+# Логин -> время отзыва: токены, выданные раньше, отклоняются, даже если они уже лежат в token_cache
+tokens_revoked_at: dict[str, float] = {}
+
 def get_current_user(token: str = Depends(oauth2_scheme)):
     credentials_exception = HTTPException(
         status_code=status.HTTP_401_UNAUTHORIZED,
         detail="Что-то там не удалось(",
         headers={"WWW-Authenticate": "Bearer"},
     )
-    try:
-        payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
-        login: str = payload.get("sub")
-        if login is None:
+    digest = hashlib.sha256(token.encode("utf-8")).digest()
+    payload = token_cache.get(digest)
+    if payload is None:
+        try:
+            payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
+        except jwt.PyJWTError:
+            raise credentials_exception
+        if payload.get("sub") is None or "exp" not in payload:
+            raise credentials_exception
+        token_cache.set(digest, payload, expires_at=time.monotonic() + payload["exp"] - time.time())
+    revoked_at = tokens_revoked_at.get(payload["sub"])
+    if revoked_at is not None:
+        if revoked_at < time.time() - ACCESS_TOKEN_EXPIRE_MINUTES * 60:
+            # Все токены, выданные до отзыва, уже истекли сами
+            tokens_revoked_at.pop(payload["sub"], None)
+        elif payload.get("iat", 0) < revoked_at:
             raise credentials_exception
-    except jwt.PyJWTError:
-        raise credentials_exception
-    return login
+    return payload["sub"]
+
+def forget_tokens(login: str):
+    tokens_revoked_at[login] = time.time()
+
+class Principal(BaseModel):
+    id: str
+    login: str
+    is_admin: bool = False
+    is_author: bool = False
+
+principal_cache = TTLCache(maxsize=PRINCIPAL_CACHE_SIZE, ttl=PRINCIPAL_CACHE_TTL)
+
+async def get_current_principal(login: str = Depends(get_current_user),
+                                session: AsyncSession = Depends(get_read_session)) -> Principal:
+    principal = principal_cache.get(login)
+    if principal is None:
+        user = await session.scalar(select(User).where(User.login == login))
+        if user is None:
+            raise HTTPException(
+                status_code=status.HTTP_401_UNAUTHORIZED,
+                detail="Пользователь не найден",
+                headers={"WWW-Authenticate": "Bearer"},
+            )
+        principal = Principal(id=user.id, login=user.login, is_admin=bool(user.is_admin),
+                              is_author=bool(user.is_author))
+        principal_cache.set(login, principal)
+    return principal
+
+def forget_principal(login: str):
+    principal_cache.pop(login)
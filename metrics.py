@@ -0,0 +1,199 @@
+import time
+from contextvars import ContextVar
+from typing import Optional
+
+from sqlalchemy import event
+
+from diagnostics import QueryLog, query_diagnostics
+
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+QUERY_COUNT_BUCKETS = (0, 1, 2, 3, 5, 10, 20, 50, 100, 250, 1000)
+
+def label_text(names: tuple, values: tuple) -> str:
+    if not names:
+        return ""
+    pairs = []
+    for name, value in zip(names, values):
+        value = str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+        pairs.append(f'{name}="{value}"')
+    return "{" + ",".join(pairs) + "}"
+
+def number_text(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+class Counter:
+    kind = "counter"
+
+    def __init__(self, name: str, documentation: str, labels: tuple = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labels = labels
+        self.values: dict = {}
+
+    def inc(self, *labels, amount: float = 1):
+        self.values[labels] = self.values.get(labels, 0) + amount
+
+    def samples(self) -> list[str]:
+        return [f"{self.name}{label_text(self.labels, labels)} {number_text(value)}"
+                for labels, value in sorted(self.values.items())]
+
+class Gauge(Counter):
+    kind = "gauge"
+
+    def dec(self, *labels, amount: float = 1):
+        self.inc(*labels, amount=-amount)
+
+    def samples(self) -> list[str]:
+        if not self.labels and not self.values:
+            return [f"{self.name} 0"]
+        return super().samples()
+
+class Histogram:
+    kind = "histogram"
+
+    def __init__(self, name: str, documentation: str, labels: tuple = (), buckets: tuple = LATENCY_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.labels = labels
+        self.buckets = buckets
+        self.series: dict = {}
+
+    def observe(self, value: float, *labels):
+        series = self.series.get(labels)
+        if series is None:
+            series = self.series[labels] = [[0] * len(self.buckets), 0.0, 0]
+        for index, bound in enumerate(self.buckets):
+            if value <= bound:
+                series[0][index] += 1
+                break
+        series[1] += value
+        series[2] += 1
+
+    def samples(self) -> list[str]:
+        lines = []
+        for labels, (counts, total, count) in sorted(self.series.items()):
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets + (float("inf"),), counts + [count - sum(counts)]):
+                cumulative += bucket_count
+                bucket_labels = label_text(self.labels + ("le",), labels + (number_text(bound),))
+                lines.append(f"{self.name}_bucket{bucket_labels} {cumulative}")
+            lines.append(f"{self.name}_sum{label_text(self.labels, labels)} {number_text(total)}")
+            lines.append(f"{self.name}_count{label_text(self.labels, labels)} {count}")
+        return lines
+
+class Registry:
+    def __init__(self):
+        self.metrics = []
+
+    def register(self, metric):
+        self.metrics.append(metric)
+        return metric
+
+    def render(self) -> str:
+        lines = []
+        for metric in self.metrics:
+            lines.append(f"# HELP {metric.name} {metric.documentation}")
+            lines.append(f"# TYPE {metric.name} {metric.kind}")
+            lines.extend(metric.samples())
+        return "\n".join(lines) + "\n"
+
+registry = Registry()
+http_requests = registry.register(Counter(
+    "library_http_requests_total", "Запросы по маршруту и коду ответа", ("method", "route", "status")))
+http_duration = registry.register(Histogram(
+    "library_http_request_duration_seconds", "Время обработки запроса", ("method", "route")))
+http_in_flight = registry.register(Gauge(
+    "library_http_requests_in_flight", "Запросы, обрабатываемые прямо сейчас"))
+request_queries = registry.register(Histogram(
+    "library_db_queries_per_request", "Число SQL-запросов за HTTP-запрос", ("method", "route"),
+    QUERY_COUNT_BUCKETS))
+request_db_time = registry.register(Histogram(
+    "library_db_time_per_request_seconds", "Суммарное время SQL за HTTP-запрос", ("method", "route")))
+db_statements = registry.register(Histogram(
+    "library_db_statement_duration_seconds", "Время выполнения одного SQL-запроса", ("engine",)))
+pool_checkout = registry.register(Histogram(
+    "library_db_pool_checkout_seconds", "Ожидание соединения из пула", ("engine",)))
+
+class RequestStats(QueryLog):
+    def __init__(self, scope: Optional[dict] = None):
+        super().__init__(scope)
+        self.queries = 0
+        self.db_time = 0.0
+
+current_request: ContextVar[Optional[RequestStats]] = ContextVar("current_request", default=None)
+
+def engine_label(sync_engine) -> str:
+    url = sync_engine.url
+    mode = "ro" if url.query.get("mode") == "ro" else "rw"
+    return f"{url.get_backend_name()}+{url.get_driver_name()}:{mode}"
+
+def _time_checkout(sync_engine, label: str):
+    # У пула нет события «до выдачи соединения», поэтому оборачивается сам вызов connect
+    pool = sync_engine.pool
+    connect = pool.connect
+
+    def timed_connect():
+        start = time.perf_counter()
+        try:
+            return connect()
+        finally:
+            pool_checkout.observe(time.perf_counter() - start, label)
+
+    pool.connect = timed_connect
+
+def instrument_engine(sync_engine):
+    label = engine_label(sync_engine)
+
+    @event.listens_for(sync_engine, "before_cursor_execute")
+    def before_execute(conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault("query_started", []).append(time.perf_counter())
+
+    @event.listens_for(sync_engine, "after_cursor_execute")
+    def after_execute(conn, cursor, statement, parameters, context, executemany):
+        elapsed = time.perf_counter() - conn.info["query_started"].pop()
+        db_statements.observe(elapsed, label)
+        stats = current_request.get()
+        if stats is not None:
+            stats.queries += 1
+            stats.db_time += elapsed
+        query_diagnostics.observe(stats, statement, parameters, elapsed)
+
+    # dispose() заменяет пул новым, обёртку нужно повесить и на него
+    event.listen(sync_engine, "engine_disposed", lambda disposed: _time_checkout(disposed, label))
+    _time_checkout(sync_engine, label)
+
+class MetricsMiddleware:
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        stats = RequestStats(scope)
+        token = current_request.set(stats)
+        status = 500
+        start = time.perf_counter()
+
+        async def send_with_status(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        http_in_flight.inc()
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            http_in_flight.dec()
+            current_request.reset(token)
+            # Шаблон пути вместо самого пути: иначе каждый id книги стал бы отдельной серией
+            route = getattr(scope.get("route"), "path", None) or "unmatched"
+            method = scope["method"]
+            http_requests.inc(method, route, status)
+            http_duration.observe(time.perf_counter() - start, method, route)
+            request_queries.observe(stats.queries, method, route)
+            request_db_time.observe(stats.db_time, method, route)
+        query_diagnostics.finish(stats)
@@ -5,19 +5,27 @@ from sqlalchemy.orm import relationship
 
 from database import Base
 
+ALL_GENRES = ""  # genre_id счётчика, в котором учитываются все книги пользователя
+
 class Achievment(Base):
     __tablename__ = "achievments"
     id = Column(String(), primary_key=True, default=lambda: str(uuid.uuid4()))
     a_name = Column(String(50), unique=True, nullable=False)
     target = Column(Integer(), unique=False, nullable=False)
-    genre_id = Column(String(), nullable=True)
+    genre_id = Column(String(), nullable=True, index=True)
 
     user_achiev_associations = relationship("UserAchievAssociation", back_populates="achievment")
 
 class UserAchievAssociation(Base):
     __tablename__ = 'user_achiev_association'
     user_id = Column(String(), ForeignKey('users.id'), primary_key=True)
-    achievment_id = Column(String(), ForeignKey('achievments.id'), primary_key=True)
+    achievment_id = Column(String(), ForeignKey('achievments.id'), primary_key=True, index=True)
 
     user = relationship("User", back_populates="achievments")
-    achievment = relationship("Achievment", back_populates="user_achiev_associations")
\ No newline at end of file
+    achievment = relationship("Achievment", back_populates="user_achiev_associations")
+
+class UserReadCounter(Base):
+    __tablename__ = 'user_read_counters'
+    user_id = Column(String(), ForeignKey('users.id'), primary_key=True)
+    genre_id = Column(String(), primary_key=True)
+    read_count = Column(Integer(), nullable=False, default=0)
@@ -1,18 +1,26 @@
 import uuid
 
-from sqlalchemy import Integer, Column, String, Float
+from sqlalchemy import Integer, Column, String, Float, Index
 from sqlalchemy.orm import relationship
 from database import Base
 
 class Author(Base):
     __tablename__ = "authors"
+    __table_args__ = (
+        Index("ix_authors_surname_id", "surname", "id"),
+        Index("ix_authors_name_surname", "name", "surname"),
+    )
     id = Column(String(), primary_key=True, default=lambda: str(uuid.uuid4()))
     name = Column(String(36), unique=False, nullable=False)
     surname = Column(String(36), unique=False, nullable=False)
     patronymic = Column(String(36), unique=False, nullable=True)
     country = Column(String(36), unique=False, nullable=True)
     profile_picture = Column(String(200), unique=False, nullable=False)
-    average_rating = Column(Float(), unique=False, nullable=True)
+    average_rating = Column(Float(), unique=False, nullable=True, default=0.0)
+    books_count = Column(Integer(), nullable=False, default=0, server_default="0")
+    readers_count = Column(Integer(), nullable=False, default=0, server_default="0")
+    rating_sum = Column(Integer(), nullable=False, default=0, server_default="0")
+    rating_count = Column(Integer(), nullable=False, default=0, server_default="0")
 
     books = relationship("Book", back_populates="author")
     comments = relationship("Comment", back_populates="author")
\ No newline at end of file
@@ -1,11 +1,18 @@
 import uuid
 
-from sqlalchemy import Integer, Column, String, ForeignKey, Float
+from sqlalchemy import Integer, Column, String, ForeignKey, Float, Index
 from sqlalchemy.orm import relationship
 from database import Base
 
 class Book(Base):
     __tablename__ = "books"
+    __table_args__ = (
+        Index("ix_books_author_id_title", "author_id", "title"),
+        Index("ix_books_average_rating_id", "average_rating", "id"),
+        Index("ix_books_pages_id", "pages", "id"),
+        Index("ix_books_year_id", "year", "id"),
+        Index("ix_books_country_id", "country", "id"),
+    )
     id = Column(String(), primary_key=True, default=lambda: str(uuid.uuid4()))
     title = Column(String(50), unique=False, nullable=False)
     year = Column(Integer(), nullable=False)
@@ -13,7 +20,10 @@ class Book(Base):
     profile_picture = Column(String(200), unique=False, nullable=False)
     country = Column(String(25), unique=False, nullable=False)
     author_id = Column(String(), ForeignKey("authors.id"))
-    average_rating = Column(Float(), unique=False, nullable=True)
+    average_rating = Column(Float(), unique=False, nullable=False, default=0.0, server_default="0")
+    rating_sum = Column(Integer(), nullable=False, default=0, server_default="0")
+    rating_count = Column(Integer(), nullable=False, default=0, server_default="0")
+    readers_count = Column(Integer(), nullable=False, default=0, server_default="0")
 
     author = relationship("Author", back_populates="books")
     genres = relationship("Genre", secondary='book_genre_association', back_populates="books")
@@ -23,7 +33,7 @@ class Book(Base):
 class UserBook(Base):
     __tablename__ = "user_books"
     user_id = Column(String(), ForeignKey('users.id'), primary_key=True)
-    book_id = Column(String(), ForeignKey('books.id'), primary_key=True)
+    book_id = Column(String(), ForeignKey('books.id'), primary_key=True, index=True)
     rating = Column(Integer(), nullable = True)
 
     user = relationship("User", back_populates="readed_books")
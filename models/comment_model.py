@@ -9,11 +9,11 @@ class Comment(Base):
     __tablename__ = "comments"
 
     id = Column(String(), primary_key=True, default=lambda: str(uuid.uuid4()))
-    user_id = Column(String(), ForeignKey('users.id'), nullable=False)
-    target_user_id = Column(String(), ForeignKey('users.id'), nullable=True)
-    book_id = Column(String(), ForeignKey('books.id'), nullable=True)
-    author_id = Column(String(), ForeignKey('authors.id'), nullable=True)
-    genre_id = Column(String(), ForeignKey('genres.id'), nullable=True)
+    user_id = Column(String(), ForeignKey('users.id'), nullable=False, index=True)
+    target_user_id = Column(String(), ForeignKey('users.id'), nullable=True, index=True)
+    book_id = Column(String(), ForeignKey('books.id'), nullable=True, index=True)
+    author_id = Column(String(), ForeignKey('authors.id'), nullable=True, index=True)
+    genre_id = Column(String(), ForeignKey('genres.id'), nullable=True, index=True)
     content = Column(String(), nullable=False)
 
     user = relationship("User", foreign_keys=[user_id], back_populates="comments")
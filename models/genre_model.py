@@ -1,6 +1,6 @@
 import uuid
 
-from sqlalchemy import Column, Integer, String, ForeignKey
+from sqlalchemy import Column, Integer, String, ForeignKey, Index
 from sqlalchemy.orm import relationship
 
 from database import Base
@@ -15,5 +15,6 @@ class Genre(Base):
 
 class BookGenreAssociation(Base):
     __tablename__ = 'book_genre_association'
+    __table_args__ = (Index("ix_book_genre_association_genre_id_book_id", "genre_id", "book_id"),)
     book_id = Column(String(), ForeignKey('books.id'), primary_key=True)
     genre_id = Column(String(), ForeignKey('genres.id'), primary_key=True)
\ No newline at end of file
@@ -0,0 +1,170 @@
+import asyncio
+import cProfile
+import fnmatch
+import marshal
+import os
+import random
+import sys
+import threading
+import time
+from collections import Counter
+from typing import Optional
+
+# Запросы к самому профилировщику не профилируются
+PROFILER_PATHS = ("/profiler",)
+
+def frame_name(frame) -> str:
+    code = frame.f_code
+    return f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})"
+
+class ProfiledRequest:
+    def __init__(self, anchor, task: Optional[asyncio.Task], thread_id: int):
+        self.anchor = anchor
+        self.task = task
+        self.thread_id = thread_id
+
+class ProfileSession:
+    def __init__(self, pattern: str, requests: Optional[int], sample_rate: float, mode: str, interval: float):
+        self.pattern = pattern
+        self.remaining = requests
+        self.sample_rate = sample_rate
+        self.mode = mode
+        self.interval = interval
+        self.started_at = time.time()
+        self.profiled = 0
+        self.samples = 0
+        self.stacks: Counter = Counter()
+        self.active: dict = {}
+        self.profile = cProfile.Profile() if mode == "cprofile" else None
+        self.stopped = threading.Event()
+        self._thread = None
+        if mode == "sampling":
+            self._thread = threading.Thread(target=self._sample_loop, name="profiler", daemon=True)
+            self._thread.start()
+
+    @property
+    def finished(self) -> bool:
+        return self.remaining == 0 and not self.active
+
+    def wants(self, path: str) -> bool:
+        if self.remaining == 0 or path.startswith(PROFILER_PATHS) or not fnmatch.fnmatchcase(path, self.pattern):
+            return False
+        return self.sample_rate >= 1 or random.random() < self.sample_rate
+
+    def begin(self, anchor) -> object:
+        if self.remaining is not None:
+            self.remaining -= 1
+        self.profiled += 1
+        key = object()
+        self.active[key] = ProfiledRequest(anchor, asyncio.current_task(), threading.get_ident())
+        # Один cProfile на поток цикла событий: он включён, пока идёт хотя бы один профилируемый запрос
+        if self.profile is not None and len(self.active) == 1:
+            self.profile.enable()
+        return key
+
+    def end(self, key: object):
+        self.active.pop(key, None)
+        if self.profile is not None and not self.active:
+            self.profile.disable()
+
+    def stop(self):
+        self.remaining = 0
+        self.stopped.set()
+        if self.profile is not None:
+            self.profile.disable()
+
+    def _sample_loop(self):
+        while not self.stopped.wait(self.interval):
+            if self.finished:
+                break
+            if not self.active:
+                continue
+            frames = sys._current_frames()
+            for request in list(self.active.values()):
+                stack = self._running_stack(frames.get(request.thread_id), request.anchor)
+                if stack is None:
+                    stack = self._suspended_stack(request)
+                if stack:
+                    self.stacks[";".join(stack)] += 1
+                    self.samples += 1
+
+    @staticmethod
+    def _running_stack(frame, anchor) -> Optional[list]:
+        names = []
+        while frame is not None:
+            if frame is anchor:
+                return names[::-1]
+            names.append(frame_name(frame))
+            frame = frame.f_back
+        return None
+
+    @staticmethod
+    def _suspended_stack(request: ProfiledRequest) -> list:
+        # Запрос не на процессоре: идём по цепочке await от корня задачи до точки ожидания
+        awaitable = request.task.get_coro() if request.task is not None else None
+        names = []
+        recording = False
+        while awaitable is not None:
+            frame = getattr(awaitable, "cr_frame", None) or getattr(awaitable, "gi_frame", None)
+            if frame is None:
+                if recording:
+                    names.append(f"[await {type(awaitable).__name__}]")
+                break
+            if recording:
+                names.append(frame_name(frame))
+            recording = recording or frame is request.anchor
+            awaitable = getattr(awaitable, "cr_await", None) or getattr(awaitable, "gi_yieldfrom", None)
+        return names
+
+    def collapsed(self) -> str:
+        return "".join(f"{stack} {count}\n" for stack, count in self.stacks.most_common())
+
+    def pstats(self) -> bytes:
+        running = bool(self.active)
+        self.profile.create_stats()
+        if running:
+            self.profile.enable()
+        return marshal.dumps(self.profile.stats)
+
+    def status(self) -> dict:
+        return {"pattern": self.pattern, "mode": self.mode, "remaining": self.remaining,
+                "sample_rate": self.sample_rate, "profiled": self.profiled, "in_flight": len(self.active),
+                "samples": self.samples, "finished": self.finished, "started_at": self.started_at}
+
+class Profiler:
+    def __init__(self):
+        self.session: Optional[ProfileSession] = None
+
+    def start(self, pattern: str, requests: Optional[int], sample_rate: float, mode: str,
+              interval: float) -> ProfileSession:
+        self.stop()
+        self.session = ProfileSession(pattern, requests, sample_rate, mode, interval)
+        return self.session
+
+    def stop(self) -> Optional[ProfileSession]:
+        session = self.session
+        if session is not None:
+            session.stop()
+        return session
+
+    def clear(self):
+        self.stop()
+        self.session = None
+
+profiler = Profiler()
+
+class ProfilerMiddleware:
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        session = profiler.session
+        # Выключенный профилировщик стоит одной проверки на запрос
+        if session is None or scope["type"] != "http" or not session.wants(scope["path"]):
+            await self.app(scope, receive, send)
+            return
+        key = session.begin(sys._getframe())
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            session.end(key)
@@ -1,118 +1,112 @@
 from typing import Optional, List
 
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, Depends, HTTPException, Header
 from pydantic import BaseModel
+from sqlalchemy import select, func
+from sqlalchemy.ext.asyncio import AsyncSession
 
-from database import SessionLocal
-from jwt_token import get_current_user
-from models import User
+from cache import response_cache
+from database import get_session, get_read_session
+from jwt_token import Principal, get_current_principal
 from models.achievment_model import Achievment, UserAchievAssociation
+from routes.useful_funk import achievment_index
 
 a_router = APIRouter() #achievment_router
 
 class AchievmentRegister(BaseModel):
     a_name: str
     target: int
-    genre_id: Optional[int] = None
+    genre_id: Optional[str] = None
 
 @a_router.post("/create_achievment")
-async def make_achievment(data: AchievmentRegister, current_user: str = Depends(get_current_user)) -> dict:
-    session = SessionLocal()
+async def make_achievment(data: AchievmentRegister, current_user: Principal = Depends(get_current_principal),
+                          session: AsyncSession = Depends(get_session)) -> dict:
     try:
-        current_user_info = session.query(User).filter(User.login == current_user).first()
-        if not current_user_info.is_admin:
+        if not current_user.is_admin:
             raise HTTPException(status_code=400, detail="У вас нет доступа к этой функции!")
-        new_achievment = Achievment(a_name = data.a_name, target = data.target, genre_id = data.genre)
+        new_achievment = Achievment(a_name = data.a_name, target = data.target, genre_id = data.genre_id)
         session.add(new_achievment)
-        session.commit()
-        session.refresh(new_achievment)
+        await session.commit()
+        achievment_index.invalidate()
+        response_cache.invalidate("achievments")
         return {"detail": "Новое достижение успешно добавлено!"}
     except Exception as e:
         print(f"Ошибка: {e}")
         raise HTTPException(status_code=500, detail="Произошла ошибка на сервере")
-    finally:
-        session.close()
 
 class InfoAboutAchievment(AchievmentRegister):
     peoples: int
 
 @a_router.get("/achievments/{achievment_id}", response_model = InfoAboutAchievment)
-async def get_achivment(achievment_id: str):
-    session = SessionLocal()
+async def get_achivment(achievment_id: str, session: AsyncSession = Depends(get_read_session)):
     try:
-        current_achievment = session.query(Achievment).filter(Achievment.id == achievment_id).first()
+        current_achievment = await session.get(Achievment, achievment_id)
         if not current_achievment:
             raise HTTPException(status_code=404, detail="Достижние не найдено")
-        peoples_that_get_achievment = session.query(UserAchievAssociation).filter\
-            (UserAchievAssociation.achievment_id == current_achievment.id).count()
+        peoples_that_get_achievment = await session.scalar(select(func.count()).select_from(UserAchievAssociation).where(
+            UserAchievAssociation.achievment_id == current_achievment.id))
         info_about_achievment = InfoAboutAchievment(a_name = current_achievment.a_name, target = current_achievment.target,
                                                     genre_id = current_achievment.genre_id, peoples = peoples_that_get_achievment)
         return info_about_achievment
     except Exception as e:
         print(f"Ошибка: {e}")
         raise HTTPException(status_code=500, detail="Произошла ошибка на сервере")
-    finally:
-        session.close()
 
 @a_router.get("/achievments", response_model=List[AchievmentRegister])
-async def get_all_achivments() -> List[AchievmentRegister]:
-    session = SessionLocal()
+async def get_all_achivments(if_none_match: Optional[str] = Header(default=None),
+                             session: AsyncSession = Depends(get_read_session)) -> List[AchievmentRegister]:
+    cached = response_cache.lookup("achievments", {"achievments"}, if_none_match=if_none_match)
+    if cached.response is not None:
+        return cached.response
     try:
         info_about_achievment = []
-        achievments = session.query(Achievment).all()
+        achievments = (await session.scalars(select(Achievment))).all()
         for achievment in achievments:
-            info_about_achievment.append(Achievment(a_name = achievment.a_name, target = achievment.target,
-                                                    genre_id = achievment.genre_id))
-        return achievments
+            info_about_achievment.append(AchievmentRegister(a_name = achievment.a_name, target = achievment.target,
+                                                            genre_id = achievment.genre_id))
+        return cached.store(info_about_achievment)
     except Exception as e:
         print(f"Ошибка: {e}")
         raise HTTPException(status_code=500, detail="Произошла ошибка на сервере")
-    finally:
-        session.close()
 
 
 @a_router.delete("/achievments/{achievment_id}")
-async def delete_achievment(achievment_id: str, current_user: str = Depends(get_current_user)) -> dict:
-    session = SessionLocal()
+async def delete_achievment(achievment_id: str, current_user: Principal = Depends(get_current_principal),
+                            session: AsyncSession = Depends(get_session)) -> dict:
     try:
-        current_user_info = session.query(User).filter(User.login == current_user).first()
-        if not current_user_info.is_admin:
+        if not current_user.is_admin:
             raise HTTPException(status_code=400, detail="У вас нет доступа к этой функции!")
-        current_achievment = session.query(Achievment).filter(Achievment.id == achievment_id).first()
-        session.delete(current_achievment)
-        session.commit()
+        current_achievment = await session.get(Achievment, achievment_id)
+        await session.delete(current_achievment)
+        await session.commit()
+        achievment_index.invalidate()
+        response_cache.invalidate("achievments")
         return {"detail": "Достижение успешно удалено!"}
     except Exception as e:
         print(f"Ошибка: {e}")
         raise HTTPException(status_code=500, detail="Произошла ошибка на сервере")
-    finally:
-        session.close()
 
 @a_router.patch("/achievments/{achievment_id}")
 async def edit_achievment(data: AchievmentRegister, achievment_id: str,
-                          current_user: str = Depends(get_current_user)) -> AchievmentRegister:
-    session = SessionLocal()
+                          current_user: Principal = Depends(get_current_principal),
+                          session: AsyncSession = Depends(get_session)) -> AchievmentRegister:
     try:
-        current_user_info = session.query(User).filter(User.login == current_user).first()
-        if not current_user_info:
-            raise HTTPException(status_code=400, detail="Пользователь не найден")
-        if not current_user_info.is_admin:
+        if not current_user.is_admin:
             raise HTTPException(status_code=400, detail="У вас нет доступа к этой функции!")
-        current_achievment = session.query(Achievment).filter(Achievment.id == achievment_id).first()
+        current_achievment = await session.get(Achievment, achievment_id)
         if not current_achievment:
             raise HTTPException(status_code=400, detail="Достижение не найдено")
         if data.a_name:
             current_achievment.a_name = data.a_name
         if data.target:
             current_achievment.target = data.target
-        session.commit()
-        session.refresh(current_achievment)
+        await session.commit()
+        achievment_index.invalidate()
+        response_cache.invalidate("achievments")
         return current_achievment
     except Exception as e:
         print(f"Ошибка: {e}")
         raise HTTPException(status_code=500, detail="Произошла ошибка на сервере")
-    finally:
-        session.close()
 
 
 
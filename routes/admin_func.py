@@ -1,61 +1,104 @@
-from typing import Optional, Union
+from typing import Literal, Optional
 
-from fastapi import APIRouter, HTTPException, Depends, Body
+from fastapi import APIRouter, HTTPException, Depends, Body, Query
+from fastapi.responses import PlainTextResponse, Response
+from pydantic import BaseModel, Field
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
 
-from database import SessionLocal
+from cache import response_cache
+from database import get_session
 from models import User
-from jwt_token import get_current_user
+from jwt_token import Principal, get_current_principal, forget_principal
+from profiler import profiler
 
 admin_router = APIRouter()
 
-async def check_admin(current_user_login: str) -> Union[bool, dict[str, str]]:
-    session = SessionLocal()
-    try:
-        user = session.query(User).filter(User.login == current_user_login).first()
-        if user and user.is_admin:
-            return True
-        else:
-            raise HTTPException(status_code=403, detail="У вас нет прав для выполнения этого действия.")
-    except Exception as e:
-        print(f"Ошибка: {e}")
-        raise HTTPException(status_code=500, detail="Произошла ошибка на сервере")
-    finally:
-        session.close()
+async def check_admin(current_user: Principal) -> bool:
+    if current_user.is_admin:
+        return True
+    raise HTTPException(status_code=403, detail="У вас нет прав для выполнения этого действия.")
 
 @admin_router.post('/add_admin')
-async def add_admin(login: str = Body(), current_user: str = Depends(get_current_user)) -> dict:
+async def add_admin(login: str = Body(), current_user: Principal = Depends(get_current_principal),
+                    session: AsyncSession = Depends(get_session)) -> dict:
     await check_admin(current_user)
-    session = SessionLocal()
     try:
-        user_to_promote = session.query(User).filter(User.login == login).first()
+        user_to_promote = await session.scalar(select(User).where(User.login == login))
         if user_to_promote is None:
             raise HTTPException(status_code=404, detail="Пользователь не найден.")
         if user_to_promote.is_admin:
             return {"detail": "Пользователь уже является администратором!"}
         user_to_promote.is_admin = True
-        session.commit()
+        await session.commit()
+        forget_principal(user_to_promote.login)
         return {"detail": "Пользователю даны права администратора!"}
     except Exception as e:
         print(f"Ошибка: {e}")
         raise HTTPException(status_code=500, detail="Произошла ошибка на сервере")
-    finally:
-        session.close()
 
 @admin_router.post('/add_author')
-async def add_author(login: str = Body(), current_user: str = Depends(get_current_user)) -> dict:
+async def add_author(login: str = Body(), current_user: Principal = Depends(get_current_principal),
+                     session: AsyncSession = Depends(get_session)) -> dict:
     await check_admin(current_user)
-    session = SessionLocal()
     try:
-        user_to_promote = session.query(User).filter(User.login == login).first()
+        user_to_promote = await session.scalar(select(User).where(User.login == login))
         if user_to_promote is None:
             raise HTTPException(status_code=404, detail="Пользователь не найден.")
         if user_to_promote.is_author:
             return {"detail": "Пользователь уже является администратором!"}
         user_to_promote.is_author = True
-        session.commit()
+        await session.commit()
+        forget_principal(user_to_promote.login)
         return {"detail": "Пользователю даны права администратора!"}
     except Exception as e:
         print(f"Ошибка: {e}")
         raise HTTPException(status_code=500, detail="Произошла ошибка на сервере")
-    finally:
-        session.close()
+
+@admin_router.get('/cache_stats')
+async def cache_stats(current_user: Principal = Depends(get_current_principal)) -> dict:
+    await check_admin(current_user)
+    return response_cache.stats()
+
+class ProfilerStart(BaseModel):
+    route: str = "*"
+    requests: Optional[int] = Field(default=10, ge=1)
+    sample_rate: float = Field(default=1.0, gt=0, le=1)
+    mode: Literal["sampling", "cprofile"] = "sampling"
+    interval_ms: float = Field(default=1.0, ge=0.1, le=1000)
+
+def current_profile():
+    if profiler.session is None:
+        raise HTTPException(status_code=404, detail="Профилирование не запущено")
+    return profiler.session
+
+@admin_router.post('/profiler')
+async def start_profiler(data: ProfilerStart, current_user: Principal = Depends(get_current_principal)) -> dict:
+    await check_admin(current_user)
+    return profiler.start(data.route, data.requests, data.sample_rate, data.mode, data.interval_ms / 1000).status()
+
+@admin_router.get('/profiler')
+async def profiler_status(current_user: Principal = Depends(get_current_principal)) -> dict:
+    await check_admin(current_user)
+    return current_profile().status()
+
+@admin_router.get('/profiler/result')
+async def profiler_result(result_format: Literal["collapsed", "pstats"] = Query(default="collapsed", alias="format"),
+                          current_user: Principal = Depends(get_current_principal)) -> Response:
+    await check_admin(current_user)
+    session = current_profile()
+    if result_format == "collapsed":
+        if session.mode != "sampling":
+            raise HTTPException(status_code=400, detail="Свёрнутые стеки есть только в режиме sampling")
+        return PlainTextResponse(session.collapsed())
+    if session.mode != "cprofile":
+        raise HTTPException(status_code=400, detail="Дамп pstats есть только в режиме cprofile")
+    return Response(session.pstats(), media_type="application/octet-stream",
+                    headers={"Content-Disposition": "attachment; filename=profile.pstats"})
+
+@admin_router.delete('/profiler')
+async def stop_profiler(current_user: Principal = Depends(get_current_principal)) -> dict:
+    await check_admin(current_user)
+    session = current_profile()
+    profiler.clear()
+    return session.status()
@@ -1,12 +1,15 @@
-from typing import List, Optional
+from typing import Optional
 
-from fastapi import APIRouter, HTTPException, Depends
+from fastapi import APIRouter, HTTPException, Depends, Query, Header
 from pydantic import BaseModel
-from sqlalchemy import and_, func
+from sqlalchemy import and_, select
+from sqlalchemy.ext.asyncio import AsyncSession
 
-from database import SessionLocal
-from jwt_token import get_current_user
-from models import Author, Book
+from cache import response_cache
+from database import get_session, get_read_session
+from jwt_token import Principal, get_current_principal
+from models import Author
+from pagination import Page, DEFAULT_LIMIT, MAX_LIMIT, decode_cursor, keyset, split_page
 from routes.admin_func import check_admin
 
 author_router = APIRouter()
@@ -25,13 +28,13 @@ class AfterAuthorRegister(BaseModel):
     patronymic: Optional[str] = None
 
 @author_router.post("/register_author", response_model=AfterAuthorRegister)
-async def author_register(author: AuthorRegister, current_user: str = Depends(get_current_user)):
+async def author_register(author: AuthorRegister, current_user: Principal = Depends(get_current_principal),
+                          session: AsyncSession = Depends(get_session)):
     await check_admin(current_user)
-    session = SessionLocal()
     try:
-        old_author = session.query(Author).filter(and_(Author.name == author.name,
-                                                   Author.surname == author.surname,
-                                                   Author.patronymic == author.patronymic)).first()
+        old_author = await session.scalar(select(Author).where(and_(Author.name == author.name,
+                                                                     Author.surname == author.surname,
+                                                                     Author.patronymic == author.patronymic)))
         if old_author:
             raise HTTPException(status_code=400, detail="Такой автор уже добавлен!")
         new_author = Author(name = author.name,
@@ -40,14 +43,12 @@ async def author_register(author: AuthorRegister, current_user: str = Depends(ge
                             country = author.country,
                             profile_picture = author.profile_picture)
         session.add(new_author)
-        session.commit()
-        session.refresh(new_author)
-        return author
+        await session.commit()
+        response_cache.invalidate("authors")
+        return new_author
     except Exception as e:
         print(f"Ошибка: {e}")
         raise HTTPException(status_code=500, detail="Произошла ошибка на сервере")
-    finally:
-        session.close()
 
 class GetAllAuthors(BaseModel):
     name: str
@@ -55,21 +56,25 @@ class GetAllAuthors(BaseModel):
     patronymic: Optional[str] = None
     profile_picture: str
 
-@author_router.get("/authors", response_model=List[GetAllAuthors])
-async def get_all_authors() -> List[GetAllAuthors]:
-    session = SessionLocal()
+@author_router.get("/authors", response_model=Page[GetAllAuthors])
+async def get_all_authors(cursor: Optional[str] = None, limit: int = Query(default=DEFAULT_LIMIT, ge=1, le=MAX_LIMIT),
+                          if_none_match: Optional[str] = Header(default=None),
+                          session: AsyncSession = Depends(get_read_session)) -> Page[GetAllAuthors]:
+    after = decode_cursor(cursor, 2)
+    cached = response_cache.lookup("authors", {"authors"}, cursor, limit, if_none_match=if_none_match)
+    if cached.response is not None:
+        return cached.response
     try:
-        authors = session.query(Author).order_by(Author.surname).all()
+        authors = (await session.scalars(keyset(select(Author), [Author.surname, Author.id], after, limit))).all()
+        authors, next_cursor = split_page(authors, limit, lambda author: [author.surname, author.id])
         authors_list = []
         for author in authors:
             authors_list.append(GetAllAuthors(id = author.id, name=author.name, surname=author.surname, patronymic=author.patronymic,
                                               profile_picture=author.profile_picture))
-        return authors_list
+        return cached.store(Page(items=authors_list, next_cursor=next_cursor))
     except Exception as e:
         print(f"Ошибка: {e}")
         raise HTTPException(status_code=500, detail="Произошла ошибка на сервере")
-    finally:
-        session.close()
 
 class GetAuthor(BaseModel):
     name: str
@@ -78,53 +83,46 @@ class GetAuthor(BaseModel):
     country: Optional[str] = None
     profile_picture: str
     average_rating: float
+    books_count: int
+    readers_count: int
 
     class Config:
         from_attributes = True
 
 @author_router.get("/authors/{author_id}", response_model=GetAuthor)
-async def get_author(author_id: str):
-    session = SessionLocal()
+async def get_author(author_id: str, if_none_match: Optional[str] = Header(default=None),
+                     session: AsyncSession = Depends(get_read_session)):
+    cached = response_cache.lookup("author", {f"author:{author_id}"}, author_id, if_none_match=if_none_match)
+    if cached.response is not None:
+        return cached.response
     try:
-        author = session.query(Author).filter(Author.id == author_id).first()
+        author = await session.get(Author, author_id)
         if not author:
             raise HTTPException(status_code=400, detail="Автора с такой фамилией не существует!")
-        average_rating = session.query(func.avg(Book.average_rating)).filter(Book.author_id == author.id).scalar()
-        if average_rating:
-            average_rating = float(f"{average_rating:.2f}")
-            author.average_rating = average_rating
-        else:
-            average_rating = 0.00
-            author.average_rating = average_rating
-        session.commit()
-        session.refresh(author)
-        return author
+        return cached.store(GetAuthor.model_validate(author))
     except Exception as e:
         print(f"Ошибка: {e}")
         raise HTTPException(status_code=500, detail="Произошла ошибка на сервере")
-    finally:
-        session.close()
 
 @author_router.delete("/authors/{author_id}")
-async def delete_author(author_id: str, current_user: str = Depends(get_current_user)) -> dict:
+async def delete_author(author_id: str, current_user: Principal = Depends(get_current_principal),
+                        session: AsyncSession = Depends(get_session)) -> dict:
     await check_admin(current_user)
-    session = SessionLocal()
     try:
-        author = session.query(Author).filter(Author.id == author_id).first()
+        author = await session.get(Author, author_id)
         if not author:
             raise HTTPException(status_code=400, detail="Автора с такой фамилией не существует!")
         if author.patronymic:
             author_name = author.surname + " " + author.name + " " + author.patronymic
         else:
             author_name = author.surname + " " + author.name
-        session.delete(author)
-        session.commit()
+        await session.delete(author)
+        await session.commit()
+        response_cache.invalidate("authors", f"author:{author_id}")
         return {"detail": f"{author_name} успешно удалён из списка авторов!"}
     except Exception as e:
         print(f"Ошибка: {e}")
         raise HTTPException(status_code=500, detail="Произошла ошибка на сервере")
-    finally:
-        session.close()
 
 class EditAuthor(BaseModel):
     name: Optional[str] = None
@@ -134,11 +132,11 @@ class EditAuthor(BaseModel):
     profile_picture: Optional[str] = None
 
 @author_router.patch("/authors/{author_id}", response_model=EditAuthor)
-async def edit_author(author_id: str, data: EditAuthor, current_user: str = Depends(get_current_user)):
+async def edit_author(author_id: str, data: EditAuthor, current_user: Principal = Depends(get_current_principal),
+                      session: AsyncSession = Depends(get_session)):
     await check_admin(current_user)
-    session = SessionLocal()
     try:
-        author = session.query(Author).filter(Author.id == author_id).first()
+        author = await session.get(Author, author_id)
         if not author:
             raise HTTPException(status_code=400, detail="Автора с такой фамилией не существует!")
         if data.name:
@@ -151,12 +149,10 @@ async def edit_author(author_id: str, data: EditAuthor, current_user: str = Depe
             author.country = data.country
         if data.profile_picture:
             author.profile_picture = data.profile_picture
-        session.commit()
-        session.refresh(author)
+        await session.commit()
+        response_cache.invalidate("authors", f"author:{author_id}")
         return author
     except Exception as e:
         print(f"Ошибка: {e}")
         raise HTTPException(status_code=500, detail="Произошла ошибка на сервере")
-    finally:
-        session.close()
 
@@ -1,16 +1,23 @@
 from typing import List, Optional
 
-from fastapi import APIRouter, HTTPException, Depends, Body
+from fastapi import APIRouter, HTTPException, Depends, Body, Query, Header
 from pydantic import BaseModel
-from sqlalchemy import and_, func
-
-from database import SessionLocal
-from jwt_token import get_current_user
-from models import Book, User, Author
+from sqlalchemy import and_, select, delete
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import selectinload
+from starlette.convertors import Convertor, register_url_convertor
+
+from aggregates import change_book_counters, change_author_counters, move_book_counters
+from cache import response_cache
+from database import get_session, get_read_session
+from jwt_token import Principal, get_current_principal
+from models import Book, Author
 from models.book_model import UserBook
 from models.genre_model import BookGenreAssociation, Genre
+from pagination import Page, DEFAULT_LIMIT, MAX_LIMIT, decode_cursor, keyset, split_page
 from routes.admin_func import check_admin
-from routes.useful_funk import check_and_award_achievment
+from routes.useful_funk import check_and_award_achievment, change_genre_readers
+from write_queue import Writer, get_writer
 
 book_router = APIRouter()
 
@@ -19,8 +26,8 @@ class BookRegister(BaseModel):
     year: int
     pages: int
     profile_picture: str
-    author_id: int
-    genres: list[int]
+    author_id: str
+    genres: list[str]
 
 class AfterBookRegister(BaseModel):
     title: str
@@ -28,56 +35,77 @@ class AfterBookRegister(BaseModel):
     country: str
 
 @book_router.post("/register_book", response_model=AfterBookRegister)
-async def book_register(book: BookRegister, current_user = Depends(get_current_user)):
+async def book_register(book: BookRegister, current_user: Principal = Depends(get_current_principal),
+                        session: AsyncSession = Depends(get_session)):
     await check_admin(current_user)
-    session = SessionLocal()
     try:
-        old_book = session.query(Book).filter(and_(Book.title == book.title,
-                                                   Book.author_id == book.author_id)).first()
+        old_book = await session.scalar(select(Book).where(and_(Book.title == book.title,
+                                                                Book.author_id == book.author_id)))
         if old_book:
             raise HTTPException(status_code=400, detail="Такая книга уже есть!")
-        author_country = session.query(Author).filter(Author.id == book.author_id).first()
+        author_country = await session.get(Author, book.author_id)
         new_book = Book(title = book.title,
                         year = book.year,
                         pages = book.pages,
                         profile_picture = book.profile_picture,
                         country = author_country.country,
-                        author_id = book.author_id,
-                        genres = book.genres)
+                        author_id = book.author_id)
         session.add(new_book)
-        session.commit()
-        session.refresh(new_book)
+        await session.flush()
+        await change_author_counters(session, new_book.author_id, books=1)
         for genre_id in book.genres:
             session.add(BookGenreAssociation(book_id = new_book.id, genre_id = genre_id))
-        session.commit()
+        await session.commit()
+        response_cache.invalidate("books", f"author:{new_book.author_id}")
         return new_book
     except Exception as e:
         print(f"Ошибка: {e}")
         raise HTTPException(status_code=500, detail="Произошла ошибка на сервере")
-    finally:
-        session.close()
 
-@book_router.get("/books/{sort_type}", response_model=List[BookRegister])
-async def get_all_books(sort_type: Optional[str] = None):
-    session = SessionLocal()
+BOOK_SORT_COLUMNS = {
+    "rating": Book.average_rating,
+    "pages": Book.pages,
+    "year": Book.year,
+    "country": Book.country,
+}
+
+class SortTypeConvertor(Convertor):
+    regex = "|".join(BOOK_SORT_COLUMNS)
+
+    def convert(self, value: str) -> str:
+        return value
+
+    def to_string(self, value: str) -> str:
+        return value
+
+register_url_convertor("book_sort", SortTypeConvertor())
+
+@book_router.get("/books/{sort_type:book_sort}", response_model=Page[BookRegister])
+async def get_all_books(sort_type: str, cursor: Optional[str] = None,
+                        limit: int = Query(default=DEFAULT_LIMIT, ge=1, le=MAX_LIMIT),
+                        if_none_match: Optional[str] = Header(default=None),
+                        session: AsyncSession = Depends(get_read_session)):
+    # Конвертер пути пропускает только известные сортировки
+    sort_column = BOOK_SORT_COLUMNS[sort_type]
+    after = decode_cursor(cursor, 2)
+    tags = {"books", "genres", "ratings"} if sort_type == "rating" else {"books", "genres"}
+    cached = response_cache.lookup("books", tags, sort_type, cursor, limit, if_none_match=if_none_match)
+    if cached.response is not None:
+        return cached.response
     try:
-        query = session.query(Book)
-        if sort_type is None or sort_type == "rating":
-            books = query.order_by(Book.average_rating).all()
-        elif sort_type == "pages":
-            books = query.order_by(Book.pages).all()
-        elif sort_type == "year":
-            books = query.order_by(Book.year).all()
-        elif sort_type == "country":
-            books = query.order_by(Book.country).all()
-        else:
-            raise HTTPException(status_code=400, detail="Недопустимый тип сортировки")
-        return books
+        query = keyset(select(Book, sort_column).options(selectinload(Book.genres)),
+                       [sort_column, Book.id], after, limit)
+        rows, next_cursor = split_page((await session.execute(query)).all(), limit,
+                                       lambda row: [row[1], row[0].id])
+        books_info = []
+        for book, _ in rows:
+            books_info.append(BookRegister(title=book.title, year=book.year, pages=book.pages,
+                                           profile_picture=book.profile_picture, author_id=book.author_id,
+                                           genres=[genre.genre_name for genre in book.genres]))
+        return cached.store(Page(items=books_info, next_cursor=next_cursor))
     except Exception as e:
         print(f"Ошибка: {e}")
         raise HTTPException(status_code=500, detail="Произошла ошибка на сервере")
-    finally:
-        session.close()
 
 class BookInfo(BookRegister):
     readers: int
@@ -86,80 +114,66 @@ class BookInfoAverage(BookInfo):
     average_rating: float
 
 @book_router.get("/books/{book_id}", response_model=BookInfoAverage)
-async def get_book(book_id: str):
-    session = SessionLocal()
+async def get_book(book_id: str, if_none_match: Optional[str] = Header(default=None),
+                   session: AsyncSession = Depends(get_read_session)):
+    cached = response_cache.lookup("book", {f"book:{book_id}", "genres"}, book_id, if_none_match=if_none_match)
+    if cached.response is not None:
+        return cached.response
     try:
-        book = session.query(Book).filter(Book.id == book_id).first()
+        book = await session.get(Book, book_id, options=[selectinload(Book.genres)])
         if not book:
             raise HTTPException(status_code=400, detail="Книги с таким названием нет!")
-        readers_count = session.query(UserBook).filter(UserBook.book_id == book.id).count()
-        if readers_count > 0:
-            average_rating = session.query(func.avg(UserBook.rating)).filter(UserBook.book_id == book.id, UserBook.rating > 0).scalar()
-            average_rating = float(f"{average_rating:.2f}")
-        else:
-            average_rating = 0.00
-        book.average_rating = average_rating
-        session.commit()
-        book_genres_assoc = session.query(BookGenreAssociation).filter(BookGenreAssociation.book_id == book.id).all()
-        genre_ids = []
-        for ids in book_genres_assoc:
-            genre_ids.append(ids.genre_id)
-        genre_titles = []
-        genres = session.query(Genre).filter(Genre.id.in_(genre_ids)).all()
-        for genre in genres:
-            genre_titles.append(genre.genre_name)
         book_info = BookInfoAverage(
             title=book.title,
             year=book.year,
             pages=book.pages,
             profile_picture=book.profile_picture,
             author_id=book.author_id,
-            genres=genre_titles,
-            readers=readers_count,
-            average_rating=average_rating
+            genres=[genre.genre_name for genre in book.genres],
+            readers=book.readers_count,
+            average_rating=book.average_rating or 0.0
         )
-        return book_info
+        return cached.store(book_info)
     except Exception as e:
         print(f"Ошибка: {e}")
         raise HTTPException(status_code=500, detail="Произошла ошибка на сервере")
-    finally:
-        session.close()
 
 @book_router.delete("/books/{book_id}")
-async def delete_book(book_id: str, current_user = Depends(get_current_user)) -> dict:
+async def delete_book(book_id: str, current_user: Principal = Depends(get_current_principal),
+                      session: AsyncSession = Depends(get_session)) -> dict:
     await check_admin(current_user)
-    session = SessionLocal()
     try:
-        book = session.query(Book).filter(Book.id == book_id).first()
+        book = await session.get(Book, book_id)
         if not book:
             raise HTTPException(status_code=400, detail="Книги с таким названием нет!")
         book_title = book.title
-        session.delete(book)
-        session.commit()
+        author_id = book.author_id
+        await move_book_counters(session, book, -1)
+        await session.delete(book)
+        await session.commit()
+        response_cache.invalidate("books", f"book:{book_id}", f"author:{author_id}")
         return {"detail": f"Книга {book_title} успешно удалена"}
     except Exception as e:
         print(f"Ошибка: {e}")
         raise HTTPException(status_code=500, detail="Произошла ошибка на сервере")
-    finally:
-        session.close()
 
 class BookUpdate(BaseModel):
     title: str
     year: Optional[int] = None
     pages: Optional[int] = None
     profile_picture: str
-    author_id: int
-    genres: List[int]
+    author_id: str
+    genres: List[str]
 
 @book_router.patch("/books/{book_id}")
-async def edit_book(book_id: str, data: BookUpdate, current_user: str = Depends(get_current_user)) -> BookUpdate:
-    session = SessionLocal()
+async def edit_book(book_id: str, data: BookUpdate, current_user: Principal = Depends(get_current_principal),
+                    session: AsyncSession = Depends(get_session)) -> BookUpdate:
     try:
-        current_user_info = session.query(User).filter(User.login == current_user).first()
-        if current_user_info.is_author or check_admin(current_user_info.login):
-            current_book = session.query(Book).filter(Book.id == book_id).first()
+        if current_user.is_author or await check_admin(current_user):
+            current_book = await session.get(Book, book_id)
             if not current_book:
                 raise HTTPException(status_code=400, detail="Книга не найдена")
+            old_author_id = current_book.author_id
             if data.title:
                 current_book.title = data.title
             if data.year:
@@ -168,67 +182,67 @@ async def edit_book(book_id: str, data: BookUpdate, current_user: str = Depends(
                 current_book.pages = data.pages
             if data.profile_picture:
                 current_book.profile_picture = data.profile_picture
-            if data.author_id:
+            if data.author_id and data.author_id != current_book.author_id:
+                await move_book_counters(session, current_book, -1)
                 current_book.author_id = data.author_id
+                await move_book_counters(session, current_book, 1)
             if data.genres:
-                current_genres = session.query(BookGenreAssociation).filter(BookGenreAssociation.book_id == current_book.id).all()
-                for association in current_genres:
-                    session.delete(association)
-                current_book.genres = data.genres
-                for genre_id in data.genres:
-                    if session.query(Genre).filter(Genre.id == genre_id).first() is not None:
-                        new_book_genre_association = BookGenreAssociation(book_id = current_book.id, genre_id = genre_id)
-                        session.add(new_book_genre_association)
-            session.commit()
-            session.refresh(current_book)
-            return current_book
+                old_genres = set((await session.scalars(select(BookGenreAssociation.genre_id).where(
+                    BookGenreAssociation.book_id == current_book.id))).all())
+                await session.execute(delete(BookGenreAssociation).where(
+                    BookGenreAssociation.book_id == current_book.id))
+                new_genres = set((await session.scalars(select(Genre.id).where(Genre.id.in_(data.genres)))).all())
+                for genre_id in new_genres:
+                    session.add(BookGenreAssociation(book_id = current_book.id, genre_id = genre_id))
+                await change_genre_readers(session, current_book.id, old_genres - new_genres, -1)
+                await change_genre_readers(session, current_book.id, new_genres - old_genres, 1)
+            await session.commit()
+            response_cache.invalidate("books", f"book:{book_id}", f"author:{old_author_id}",
+                                      f"author:{current_book.author_id}")
+            return data
         raise HTTPException(status_code=400, detail="У вас нет прав для редактирования книги!")
     except Exception as e:
         print(f"Ошибка: {e}")
         raise HTTPException(status_code=500, detail="Произошла ошибка на сервере")
-    finally:
-        session.close()
 
 @book_router.post("/books/{book_id}")
-async def add_book_to_user(book_id: str, current_user: str = Depends(get_current_user)) -> dict:
-    session = SessionLocal()
-    try:
-        current_book = session.query(Book).filter(Book.id == book_id).first()
+async def add_book_to_user(book_id: str, current_user: Principal = Depends(get_current_principal),
+                           writer: Writer = Depends(get_writer)) -> dict:
+    async def add_to_shelf(session: AsyncSession) -> tuple[str, str]:
+        current_book = await session.get(Book, book_id)
         if not current_book:
             raise HTTPException(status_code=404, detail="Книга не найдена")
-        current_user_info = session.query(User).filter(User.login == current_user).first()
-        if not current_user_info:
-            raise HTTPException(status_code=404, detail="Пользователь не найден")
-        user_book_entry = UserBook(user_id = current_user_info.id, book_id = current_book.id)
+        user_book_entry = UserBook(user_id = current_user.id, book_id = current_book.id)
         session.add(user_book_entry)
-        session.commit()
-        await check_and_award_achievment(current_user_info.id)
-        return {"success": True, "response": f"{current_book.title} успешно добавлена пользователю "
-                                             f"{current_user_info.login}"}
+        await change_book_counters(session, current_book.id, readers=1)
+        await check_and_award_achievment(current_user.id, current_book.id, session)
+        return current_book.title, current_book.author_id
+
+    try:
+        title, author_id = await writer.run(add_to_shelf)
+        response_cache.invalidate("readers", f"book:{book_id}", f"author:{author_id}")
+        return {"success": True, "response": f"{title} успешно добавлена пользователю {current_user.login}"}
     except Exception as e:
         print(f"Ошибка: {e}")
         raise HTTPException(status_code=500, detail="Произошла ошибка на сервере")
-    finally:
-        session.close()
 
 @book_router.put("/books/{book_id}/rate")
 async def rate_book(book_id: str, rating: int = Body(le=10, ge=1),
-                    current_user: str = Depends(get_current_user)) -> dict:
-    session = SessionLocal()
-    try:
-        current_user_info = session.query(User).filter(User.login == current_user).first()
-        if not current_user_info:
-            raise HTTPException(status_code=404, detail="Пользователь не найден")
-        user_book_assoc = session.query(UserBook).filter(UserBook.book_id == book_id,
-                                                              UserBook.user_id == current_user_info.id).first()
+                    current_user: Principal = Depends(get_current_principal),
+                    writer: Writer = Depends(get_writer)) -> dict:
+    async def set_rating(session: AsyncSession) -> str:
+        user_book_assoc = await session.get(UserBook, (current_user.id, book_id))
         if not user_book_assoc:
             raise HTTPException(status_code=400, detail="Пользователь не прочитал такую книгу")
+        author_id = await change_book_counters(session, book_id, rating_sum=rating - (user_book_assoc.rating or 0),
+                                               rating_count=0 if user_book_assoc.rating else 1)
         user_book_assoc.rating = rating
-        session.commit()
+        return author_id
+
+    try:
+        author_id = await writer.run(set_rating)
+        response_cache.invalidate("ratings", f"book:{book_id}", f"author:{author_id}")
         return {"detail": "Оценка успешно добавлена!"}
     except Exception as e:
         print(f"Ошибка: {e}")
         raise HTTPException(status_code=500, detail="Произошла ошибка на сервере")
-    finally:
-        session.close()
-
@@ -0,0 +1,54 @@
+from typing import Literal, Optional
+
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, Header
+from fastapi.responses import StreamingResponse
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from catalog_export import EXPORT_CHUNK_SIZE, export_books, export_user_books, gzip_stream
+from catalog_import import IMPORT_BATCH_SIZE, import_catalog, iter_lines
+from database import get_session, get_read_session
+from jwt_token import Principal, get_current_principal
+from routes.admin_func import check_admin
+
+catalog_router = APIRouter()
+
+@catalog_router.post("/import_catalog")
+async def import_catalog_file(request: Request, file_format: Literal["ndjson", "csv"] = Query(default="ndjson",
+                                                                                             alias="format"),
+                              batch_size: int = Query(default=IMPORT_BATCH_SIZE, ge=1, le=100000),
+                              current_user: Principal = Depends(get_current_principal),
+                              session: AsyncSession = Depends(get_session)) -> dict:
+    await check_admin(current_user)
+    try:
+        importer = await import_catalog(session, iter_lines(request.stream()), file_format, batch_size)
+        return importer.report()
+    except Exception as e:
+        print(f"Ошибка: {e}")
+        raise HTTPException(status_code=500, detail="Произошла ошибка на сервере")
+
+def ndjson_response(chunks, accept_encoding: Optional[str]) -> StreamingResponse:
+    if accept_encoding and "gzip" in accept_encoding:
+        return StreamingResponse(gzip_stream(chunks), media_type="application/x-ndjson",
+                                 headers={"Content-Encoding": "gzip", "Vary": "Accept-Encoding"})
+    return StreamingResponse(chunks, media_type="application/x-ndjson", headers={"Vary": "Accept-Encoding"})
+
+@catalog_router.get("/export/books")
+async def export_books_file(after: Optional[str] = None,
+                            chunk_size: int = Query(default=EXPORT_CHUNK_SIZE, ge=1, le=100000),
+                            accept_encoding: Optional[str] = Header(default=None),
+                            current_user: Principal = Depends(get_current_principal),
+                            session: AsyncSession = Depends(get_read_session)) -> StreamingResponse:
+    await check_admin(current_user)
+    return ndjson_response(export_books(session, after, chunk_size), accept_encoding)
+
+@catalog_router.get("/export/user_books")
+async def export_user_books_file(after_user_id: Optional[str] = None, after_book_id: Optional[str] = None,
+                                 chunk_size: int = Query(default=EXPORT_CHUNK_SIZE, ge=1, le=100000),
+                                 accept_encoding: Optional[str] = Header(default=None),
+                                 current_user: Principal = Depends(get_current_principal),
+                                 session: AsyncSession = Depends(get_read_session)) -> StreamingResponse:
+    await check_admin(current_user)
+    if (after_user_id is None) != (after_book_id is None):
+        raise HTTPException(status_code=400, detail="Для продолжения нужны after_user_id и after_book_id")
+    after = (after_user_id, after_book_id) if after_user_id is not None else None
+    return ndjson_response(export_user_books(session, after, chunk_size), accept_encoding)
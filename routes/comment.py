@@ -2,16 +2,16 @@ from typing import Optional
 
 from fastapi import APIRouter, Depends, HTTPException
 from pydantic import BaseModel
+from sqlalchemy.ext.asyncio import AsyncSession
 
-from database import SessionLocal
-from jwt_token import get_current_user
-from models import User
+from database import get_session
+from jwt_token import Principal, get_current_principal
 from models import Comment
+from write_queue import Writer, get_writer
 
 comment_router = APIRouter()
 
 class CreateComment(BaseModel):
-    current_user: str = Depends(get_current_user)
     target_user_id: Optional[str] = None
     author_id: Optional[str] = None
     genre_id: Optional[str] = None
@@ -19,64 +19,50 @@ class CreateComment(BaseModel):
     content: str
 
 @comment_router.post("/add_comment")
-async def create_comment(data: CreateComment) -> dict:
-    session = SessionLocal()
-    try:
-        from_user = session.query(User).filter(User.login == data.current_user).first()
-        if not from_user:
-            raise HTTPException(status_code=404, detail="Пользователь не найден")
-        new_comment = Comment(user_id = from_user.id, target_user_id = data.target_user_id,
+async def create_comment(data: CreateComment, current_user: Principal = Depends(get_current_principal),
+                         writer: Writer = Depends(get_writer)) -> dict:
+    async def add_comment(session: AsyncSession):
+        new_comment = Comment(user_id = current_user.id, target_user_id = data.target_user_id,
                               book_id = data.book_id, author_id = data.author_id,
                               genre_id = data.genre_id, content = data.content)
         session.add(new_comment)
-        session.commit()
-        session.refresh(new_comment)
+
+    try:
+        await writer.run(add_comment)
         return {"detail": "комментарий успешно отправлен"}
     except Exception as e:
         print(f"Ошибка: {e}")
         raise HTTPException(status_code=500, detail="Произошла ошибка на сервере")
-    finally:
-        session.close()
 @comment_router.patch("/comments/{comment_id}")
-async def edit_comment(comment_id: str, content: str, current_user: str = Depends(get_current_user)) -> dict:
-    session = SessionLocal()
+async def edit_comment(comment_id: str, content: str, current_user: Principal = Depends(get_current_principal),
+                       session: AsyncSession = Depends(get_session)) -> dict:
     try:
-        comment = session.query(Comment).filter(Comment.id == comment_id).first()
+        comment = await session.get(Comment, comment_id)
         if not comment:
             raise HTTPException(status_code=404, detail="Комментарий не найден")
-        current_user_info = session.query(User).filter(User.login == current_user).first()
-        if not current_user_info:
-            raise HTTPException(status_code=404, detail="Пользователь не найден")
         if not content.strip():
             raise HTTPException(status_code=400, detail="Комментарий не может быть пустым")
-        if current_user_info.id == comment.user_id:
+        if current_user.id == comment.user_id:
             comment.content = content
-            session.commit()
+            await session.commit()
             return {"detail": "Комментарий обновлён"}
     except Exception as e:
         print(f"Ошибка: {e}")
         raise HTTPException(status_code=500, detail="Произошла ошибка на сервере")
-    finally:
-        session.close()
 
 @comment_router.delete("/comments/{comment_id}")
-async def delete_comment(comment_id: str, current_user: str = Depends(get_current_user)) -> dict:
-    session = SessionLocal()
+async def delete_comment(comment_id: str, current_user: Principal = Depends(get_current_principal),
+                         session: AsyncSession = Depends(get_session)) -> dict:
     try:
-        comment = session.query(Comment).filter(Comment.id == comment_id).first()
+        comment = await session.get(Comment, comment_id)
         if not comment:
             raise HTTPException(status_code=404, detail="Комментарий не найден")
-        current_user_info = session.query(User).filter(User.login == current_user).first()
-        if not current_user_info:
-            raise HTTPException(status_code=404, detail="Пользователь не найден")
-        if current_user_info.id == comment.user_id or current_user_info.is_admin:
-            session.delete(comment)
-            session.commit()
+        if current_user.id == comment.user_id or current_user.is_admin:
+            await session.delete(comment)
+            await session.commit()
             return {"detail": f"Комментарий успешно удалён"}
         raise HTTPException(status_code=403, detail="У вас нет прав для удаления этого комментария")
     except Exception as e:
         print(f"Ошибка: {e}")
         raise HTTPException(status_code=500, detail="Произошла ошибка на сервере")
-    finally:
-        session.close()
 
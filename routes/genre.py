@@ -1,96 +1,121 @@
-from typing import List, Dict
+from typing import Dict, Literal, Optional
 
-from fastapi import APIRouter, Depends, HTTPException, Body
+from fastapi import APIRouter, Depends, HTTPException, Body, Query, Header
+from sqlalchemy import func, select
+from sqlalchemy.ext.asyncio import AsyncSession
 
-from database import SessionLocal
-from jwt_token import get_current_user
+from cache import response_cache
+from database import get_session, get_read_session
+from jwt_token import Principal, get_current_principal
 from models import Genre, Book
 from models.genre_model import BookGenreAssociation
+from pagination import Page, DEFAULT_LIMIT, MAX_LIMIT, decode_cursor, keyset, split_page
 from routes.admin_func import check_admin
 from routes.book import AfterBookRegister
 
 genre_router = APIRouter()
 
 @genre_router.post("/genre_register")
-async def genre_register(genre_name: str = Body(), current_user: str = Depends(get_current_user)) -> dict:
+async def genre_register(genre_name: str = Body(), current_user: Principal = Depends(get_current_principal),
+                         session: AsyncSession = Depends(get_session)) -> dict:
     await check_admin(current_user)
-    session = SessionLocal()
     try:
-        old_genre = session.query(Genre).filter(Genre.genre_name == genre_name).first()
+        old_genre = await session.scalar(select(Genre).where(Genre.genre_name == genre_name))
         if old_genre:
             raise HTTPException(status_code=400, detail="Такой жанр уже есть!")
         new_genre = Genre(genre_name = genre_name)
         session.add(new_genre)
-        session.commit()
-        session.refresh(new_genre)
+        await session.commit()
+        response_cache.invalidate("genres")
         return {"detail": f"Жанр {new_genre.genre_name} успешно добавлен!"}
     except Exception as e:
         print(f"Ошибка: {e}")
         raise HTTPException(status_code=500, detail="Произошла ошибка на сервере")
-    finally:
-        session.close()
 
 @genre_router.get("/genres")
-async def get_all_genres() -> List[str]:
-    session = SessionLocal()
+async def get_all_genres(cursor: Optional[str] = None, limit: int = Query(default=DEFAULT_LIMIT, ge=1, le=MAX_LIMIT),
+                         if_none_match: Optional[str] = Header(default=None),
+                         session: AsyncSession = Depends(get_read_session)) -> Page[str]:
+    after = decode_cursor(cursor, 1)
+    cached = response_cache.lookup("genres", {"genres"}, cursor, limit, if_none_match=if_none_match)
+    if cached.response is not None:
+        return cached.response
     try:
-        all_genres = session.query(Genre).order_by(Genre.genre_name).all()
-        list_all_genres = []
-        for genre in all_genres:
-            list_all_genres.append(genre.genre_name)
-        return list_all_genres
+        all_genres = (await session.scalars(keyset(select(Genre.genre_name), [Genre.genre_name], after, limit))).all()
+        list_all_genres, next_cursor = split_page(list(all_genres), limit, lambda genre_name: [genre_name])
+        return cached.store(Page(items=list_all_genres, next_cursor=next_cursor))
     except Exception as e:
         print(f"Ошибка: {e}")
         raise HTTPException(status_code=500, detail="Произошла ошибка на сервере")
-    finally:
-        session.close()
 
-@genre_router.get("/genres/{genre_id}/books", response_model=List[AfterBookRegister])
-async def get_genre_books(genre_id: str) -> List[AfterBookRegister]:
-    session = SessionLocal()
+GENRE_SORT_COLUMNS = {
+    "rating": Book.average_rating,
+    "year": Book.year,
+    "readers": Book.readers_count,
+}
+
+class GenreBooksPage(Page[AfterBookRegister]):
+    total: int
+
+@genre_router.get("/genres/{genre_id}/books", response_model=GenreBooksPage)
+async def get_genre_books(genre_id: str, sort: Literal["id", "rating", "year", "readers"] = "id",
+                          cursor: Optional[str] = None,
+                          limit: int = Query(default=DEFAULT_LIMIT, ge=1, le=MAX_LIMIT),
+                          if_none_match: Optional[str] = Header(default=None),
+                          session: AsyncSession = Depends(get_read_session)) -> GenreBooksPage:
+    sort_columns = [BookGenreAssociation.book_id]
+    if sort in GENRE_SORT_COLUMNS:
+        sort_columns.insert(0, GENRE_SORT_COLUMNS[sort])
+    after = decode_cursor(cursor, len(sort_columns))
+    tags = {"books", f"genre:{genre_id}"}
+    if sort == "rating":
+        tags.add("ratings")
+    elif sort == "readers":
+        tags.add("readers")
+    cached = response_cache.lookup("genre_books", tags, genre_id, sort, cursor, limit, if_none_match=if_none_match)
+    if cached.response is not None:
+        return cached.response
     try:
-        current_genre = session.query(Genre).filter(Genre.id == genre_id).first()
-        if not current_genre:
+        # Счётчик читается только из покрывающего индекса (genre_id, book_id), без обращения к books
+        total = await session.scalar(select(func.count()).select_from(BookGenreAssociation).where(
+            BookGenreAssociation.genre_id == genre_id))
+        if not total and not await session.get(Genre, genre_id):
             raise HTTPException(status_code=400, detail="Такого жанра нет!")
-        genre_books_assoc = session.query(BookGenreAssociation).filter(BookGenreAssociation.genre_id == current_genre.id).all()
-        book_ids = []
-        for books_id in genre_books_assoc:
-            book_ids.append(books_id.book_id)
-        genre_books = session.query(Book).filter(Book.id.in_(book_ids)).all()
-        info_about_book = []
-        for book in genre_books:
-            info_about_book.append(AfterBookRegister(title = book.title, profile_picture = book.profile_picture))
-        return info_about_book
+        query = select(Book.title, Book.profile_picture, Book.country, *sort_columns).join(
+            BookGenreAssociation, BookGenreAssociation.book_id == Book.id).where(
+            BookGenreAssociation.genre_id == genre_id)
+        rows = (await session.execute(keyset(query, sort_columns, after, limit))).all()
+        rows, next_cursor = split_page(rows, limit, lambda row: list(row[3:]))
+        books = [AfterBookRegister(title=row.title, profile_picture=row.profile_picture, country=row.country)
+                 for row in rows]
+        return cached.store(GenreBooksPage(items=books, next_cursor=next_cursor, total=total))
     except Exception as e:
         print(f"Ошибка: {e}")
         raise HTTPException(status_code=500, detail="Произошла ошибка на сервере")
-    finally:
-        session.close()
 
 @genre_router.delete("/genres/{genre_id}")
-async def delete_genre(genre_id: str, current_user: str = Depends(get_current_user)) -> dict:
+async def delete_genre(genre_id: str, current_user: Principal = Depends(get_current_principal),
+                       session: AsyncSession = Depends(get_session)) -> dict:
     await check_admin(current_user)
-    session = SessionLocal()
     try:
-        genre = session.query(Genre).filter(Genre.id == genre_id).first()
+        genre = await session.get(Genre, genre_id)
         if not genre:
             raise HTTPException(status_code=400, detail="Такого жанра нет!")
         name = genre.genre_name
-        session.delete(genre)
-        session.commit()
+        await session.delete(genre)
+        await session.commit()
+        response_cache.invalidate("genres", f"genre:{genre_id}")
         return {"detail": f"Жанр {name} успешно удалён"}
     except Exception as e:
         print(f"Ошибка: {e}")
         raise HTTPException(status_code=500, detail="Произошла ошибка на сервере")
-    finally:
-        session.close()
 
-@genre_router.patch("genres/{genre_id}")
-async def edit_genre(genre_id: str, data: Dict[str, str], current_user: str = Depends(get_current_user)) -> dict:
+@genre_router.patch("/genres/{genre_id}")
+async def edit_genre(genre_id: str, data: Dict[str, str], current_user: Principal = Depends(get_current_principal),
+                     session: AsyncSession = Depends(get_session)) -> dict:
     await check_admin(current_user)
-    session = SessionLocal()
     try:
-        current_genre = session.query(Genre).filter(Genre.id == genre_id).first()
+        current_genre = await session.get(Genre, genre_id)
         if not current_genre:
             raise HTTPException(status_code=404, detail="Жанр не найден")
 
@@ -98,11 +123,9 @@ async def edit_genre(genre_id: str, data: Dict[str, str], current_user: str = De
             new_genre_name = data.get("genre_name")
             current_genre.genre_name = new_genre_name
 
-        session.commit()
-        session.refresh(current_genre)
+        await session.commit()
+        response_cache.invalidate("genres", f"genre:{genre_id}")
         return {"detail": current_genre}
     except Exception as e:
         print(f"Ошибка: {e}")
         raise HTTPException(status_code=500, detail="На сервере произошла ошибка")
-    finally:
-        session.close()
@@ -0,0 +1,35 @@
+from typing import Literal, Optional
+
+from fastapi import APIRouter, Depends, HTTPException, Query
+from pydantic import BaseModel
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from database import get_read_session
+from pagination import Page, DEFAULT_LIMIT, MAX_LIMIT, decode_cursor, split_page
+from search import match_query, search_query
+
+search_router = APIRouter()
+
+class SearchHit(BaseModel):
+    kind: str
+    id: str
+    text: str
+    score: float
+
+@search_router.get("/search", response_model=Page[SearchHit])
+async def search(q: str = Query(min_length=1, max_length=200),
+                 scope: Literal["books", "authors", "comments"] = "books", cursor: Optional[str] = None,
+                 limit: int = Query(default=DEFAULT_LIMIT, ge=1, le=MAX_LIMIT),
+                 session: AsyncSession = Depends(get_read_session)):
+    match = match_query(q)
+    if match is None:
+        raise HTTPException(status_code=400, detail="Пустой поисковый запрос")
+    after = decode_cursor(cursor, 2)
+    try:
+        rows, next_cursor = split_page((await session.execute(search_query(scope, match, after, limit))).all(),
+                                       limit, lambda row: [row.score, row.rowid])
+        return Page(items=[SearchHit(kind=scope, id=row.id, text=row.text, score=row.score) for row in rows],
+                    next_cursor=next_cursor)
+    except Exception as e:
+        print(f"Ошибка: {e}")
+        raise HTTPException(status_code=500, detail="Произошла ошибка на сервере")
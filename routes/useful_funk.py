@@ -1,10 +1,19 @@
+import bisect
+import time
+from collections import defaultdict
+
 from fastapi import APIRouter, Depends, HTTPException
+from fastapi.responses import PlainTextResponse
+from sqlalchemy import select, delete, literal, true, tuple_
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.ext.asyncio import AsyncSession
 
-from database import SessionLocal
-from jwt_token import get_current_user
-from models import User, Achievment, Genre
-from models.achievment_model import UserAchievAssociation
-from models.book_model import UserBook, Book
+from jwt_token import Principal, get_current_principal
+from metrics import registry
+from models import Achievment, Genre
+from models.achievment_model import UserAchievAssociation, UserReadCounter, ALL_GENRES
+from models.book_model import UserBook
+from models.genre_model import BookGenreAssociation
 
 useful_router = APIRouter()
 
@@ -13,20 +22,20 @@ async def healthcheck() -> dict:
     response = {"success": True}
     return response
 
+@useful_router.get("/metrics")
+async def get_metrics() -> PlainTextResponse:
+    return PlainTextResponse(registry.render(), media_type="text/plain; version=0.0.4; charset=utf-8")
+
 @useful_router.get("/get_key")
-async def get_key(current_user: str = Depends(get_current_user)) -> dict:
-    session = SessionLocal()
+async def get_key(current_user: Principal = Depends(get_current_principal)) -> dict:
     try:
-        current_user_info = session.query(User).filter(User.login == current_user).first()
-        if not current_user_info.is_admin:
+        if not current_user.is_admin:
             raise HTTPException(status_code=400, detail="У вас нет доступа к этой функции!")
         key = "9540fe21-d0fb-4298-bffc-368d703e508c"
         return {"key": key}
     except Exception as e:
         print(f"Ошибка: {e}")
         raise HTTPException(status_code=500, detail="Произошла ошибка на сервере")
-    finally:
-        session.close()
 
 @useful_router.head("/get_maks")
 async def print_max_loh():
@@ -36,62 +45,97 @@ async def print_max_loh():
 async def print_max_gay():
     return "Макс гей"
 
-async def check_and_award_achievment(user_id: str):
-    session = SessionLocal()
+class AchievmentIndex:
+    def __init__(self, ttl: float = 30.0):
+        self.ttl = ttl
+        self._targets = None
+        self._loaded_at = 0.0
+
+    def invalidate(self):
+        self._targets = None
+
+    async def crossed(self, session: AsyncSession, genre_id: str, read_count: int) -> list[str]:
+        if self._targets is None or time.monotonic() - self._loaded_at > self.ttl:
+            await self._load(session)
+        targets, ids = self._targets.get(genre_id, ((), ()))
+        start = bisect.bisect_left(targets, read_count)
+        end = bisect.bisect_right(targets, read_count)
+        return list(ids[start:end])
+
+    async def _load(self, session: AsyncSession):
+        grouped = defaultdict(list)
+        for achievment in (await session.execute(select(Achievment.id, Achievment.genre_id, Achievment.target))).all():
+            grouped[achievment.genre_id or ALL_GENRES].append((achievment.target, achievment.id))
+        self._targets = {}
+        for genre_id, items in grouped.items():
+            items.sort()
+            self._targets[genre_id] = (tuple(target for target, _ in items), tuple(a_id for _, a_id in items))
+        self._loaded_at = time.monotonic()
+
+achievment_index = AchievmentIndex()
+
+async def change_read_counters(session: AsyncSession, user_id: str, book_id: str, delta: int) -> dict[str, int]:
+    genre_ids = (await session.scalars(select(BookGenreAssociation.genre_id).where(
+        BookGenreAssociation.book_id == book_id))).all()
+    counters = {}
+    for genre_id in [ALL_GENRES, *genre_ids]:
+        statement = sqlite_insert(UserReadCounter).values(user_id=user_id, genre_id=genre_id, read_count=max(delta, 0))
+        statement = statement.on_conflict_do_update(
+            index_elements=[UserReadCounter.user_id, UserReadCounter.genre_id],
+            set_={"read_count": UserReadCounter.read_count + delta},
+        ).returning(UserReadCounter.read_count)
+        counters[genre_id] = await session.scalar(statement)
+    return counters
+
+async def change_genre_readers(session: AsyncSession, book_id: str, genre_ids: set, delta: int):
+    if not genre_ids:
+        return
+    readers = select(UserBook.user_id, Genre.id, literal(max(delta, 0))).select_from(UserBook).join(
+        Genre, true()).where(UserBook.book_id == book_id, Genre.id.in_(genre_ids))
+    statement = sqlite_insert(UserReadCounter).from_select(
+        [UserReadCounter.user_id, UserReadCounter.genre_id, UserReadCounter.read_count], readers)
+    counters = (await session.execute(statement.on_conflict_do_update(
+        index_elements=[UserReadCounter.user_id, UserReadCounter.genre_id],
+        set_={"read_count": UserReadCounter.read_count + delta},
+    ).returning(UserReadCounter.user_id, UserReadCounter.genre_id, UserReadCounter.read_count))).all()
+    # Достижения всех читателей книги выдаются и снимаются одним запросом, а не по запросу на читателя
+    pairs = []
+    for user_id, genre_id, read_count in counters:
+        threshold = read_count if delta > 0 else read_count + 1
+        for achievment_id in await achievment_index.crossed(session, genre_id, threshold):
+            pairs.append((user_id, achievment_id))
+    if not pairs:
+        return
+    if delta > 0:
+        await session.execute(sqlite_insert(UserAchievAssociation).values(
+            [{"user_id": user_id, "achievment_id": achievment_id} for user_id, achievment_id in pairs]
+        ).on_conflict_do_nothing())
+    else:
+        await session.execute(delete(UserAchievAssociation).where(
+            tuple_(UserAchievAssociation.user_id, UserAchievAssociation.achievment_id).in_(pairs)))
+
+async def check_and_award_achievment(user_id: str, book_id: str, session: AsyncSession):
     try:
-        achievments = session.query(Achievment).all()
-        for achievment in achievments:
-            if achievment.genre_id is None:
-                user_books_count = session.query(UserBook).filter(UserBook.user_id == user_id).count()
-            else:
-                user_books_count = session.query(UserBook).join(Book.genres).filter(
-                    UserBook.user_id == user_id,
-                    Genre.id == achievment.genre_id
-                ).count()
-            if achievment.target == user_books_count:
-                existing_achievment = session.query(UserAchievAssociation).filter(
-                    UserAchievAssociation.user_id == user_id,
-                    UserAchievAssociation.achievment_id == achievment.id
-                ).first()
-                if existing_achievment is None:
-                    user_achiev_assoc = UserAchievAssociation(achievment_id = achievment.id, user_id = user_id)
-                    session.add(user_achiev_assoc)
-                    session.commit()
-                    session.refresh(user_achiev_assoc)
-        return {"detail:" f"Пользователю {User.user_id} выдано достижение"}
+        counters = await change_read_counters(session, user_id, book_id, 1)
+        for genre_id, read_count in counters.items():
+            for achievment_id in await achievment_index.crossed(session, genre_id, read_count):
+                await session.execute(sqlite_insert(UserAchievAssociation).values(
+                    user_id=user_id, achievment_id=achievment_id).on_conflict_do_nothing())
+        return {"detail": f"Пользователю {user_id} выдано достижение"}
     except Exception as e:
         print(f"Ошибка: {e}")
         raise HTTPException(status_code=500, detail="Произошла ошибка на сервере")
-    finally:
-        session.close()
 
-async def check_and_remove_achievment(user_id: str):
-    session = SessionLocal()
+async def check_and_remove_achievment(user_id: str, book_id: str, session: AsyncSession):
     try:
-        achievments = session.query(Achievment).all()
-        for achievment in achievments:
-            if achievment.genre_id is None:
-                user_books_count = session.query(UserBook).filter(UserBook.user_id == user_id).count()
-            else:
-                user_books_count = session.query(UserBook).join(Book.genres).filter(
-                    UserBook.user_id == user_id,
-                    Genre.id == achievment.genre_id
-                ).count()
-            if achievment.target > user_books_count:
-                achievment = session.query(UserAchievAssociation).filter(
+        counters = await change_read_counters(session, user_id, book_id, -1)
+        for genre_id, read_count in counters.items():
+            lost = await achievment_index.crossed(session, genre_id, read_count + 1)
+            if lost:
+                await session.execute(delete(UserAchievAssociation).where(
                     UserAchievAssociation.user_id == user_id,
-                    UserAchievAssociation.achievment_id == achievment.id
-                ).first()
-                if achievment:
-                    session.delete(achievment)
-                    session.commit()
-        return {"detail:" f"достижение было удалено у пользователя {User.user_id}"}
+                    UserAchievAssociation.achievment_id.in_(lost)))
+        return {"detail": f"достижение было удалено у пользователя {user_id}"}
     except Exception as e:
         print(f"Ошибка: {e}")
         raise HTTPException(status_code=500, detail="Произошла ошибка на сервере")
-    finally:
-        session.close()
-
-    
-
-
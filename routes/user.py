@@ -1,27 +1,32 @@
 from datetime import date
 from typing import List, Optional, Union, Annotated
 
-import bcrypt
-from fastapi import APIRouter, HTTPException, Depends, status
+from fastapi import APIRouter, HTTPException, Depends, Query, status
+from fastapi.security import OAuth2PasswordRequestForm
 import jwt
 from pydantic import BaseModel, Field, EmailStr
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import selectinload
 
-from database import SessionLocal
+from aggregates import change_book_counters
+from cache import response_cache
+from database import get_session, get_read_session
 from models import User, Book
-from jwt_token import create_access_token, get_current_user, create_refresh_token, ALGORITHM, SECRET_KEY
+from jwt_token import (create_access_token, create_refresh_token, ALGORITHM, SECRET_KEY, Principal,
+                       get_current_principal, forget_principal, forget_tokens)
+from models.achievment_model import UserAchievAssociation
 from models.book_model import UserBook
+from pagination import Page, DEFAULT_LIMIT, MAX_LIMIT, decode_cursor, keyset, split_page
 from routes.achievment import AchievmentRegister
 from routes.admin_func import check_admin
 from routes.book import BookInfo
+from passwords import password_hasher
 from routes.useful_funk import check_and_remove_achievment
+from write_queue import Writer, get_writer
 
 user_router = APIRouter()
 
-def hashed_password(password: str):
-    salt = bcrypt.gensalt()
-    hashed = bcrypt.hashpw(password.encode('utf-8'), salt)
-    return hashed.decode('utf-8')
-
 class Register(BaseModel):
     login: str
     password: Annotated[str, Field(min_length=8)]
@@ -35,13 +40,15 @@ class Register(BaseModel):
     is_author: bool = False
 
 @user_router.post("/register")
-async def user_register(user: Register) -> dict:
-    session = SessionLocal()
-    try:
-        old_user = session.query(User).filter((User.login == user.login) | (User.email == user.email)).first()
+async def user_register(user: Register, writer: Writer = Depends(get_writer)) -> dict:
+    new_password = await password_hasher.hash(user.password)
+    access_token = create_access_token(data={"sub": user.login})
+    refresh_token = create_refresh_token(data={"sub": user.login})
+
+    async def add_user(session: AsyncSession) -> str:
+        old_user = await session.scalar(select(User).where((User.login == user.login) | (User.email == user.email)))
         if old_user:
             raise HTTPException(status_code=400, detail="Такой логин или email уже существует!")
-        new_password = hashed_password(user.password)
         new_user = User(login = user.login,
                         password = new_password,
                         name = user.name,
@@ -51,23 +58,21 @@ async def user_register(user: Register) -> dict:
                         sex = user.sex,
                         profile_picture = user.profile_picture,
                         is_admin = user.is_admin,
-                        is_author = user.is_author)
+                        is_author = user.is_author,
+                        refresh_token = refresh_token)
         session.add(new_user)
-        session.commit()
-        session.refresh(new_user)
-        access_token = create_access_token(data={"sub": user.login})
-        refresh_token = create_refresh_token(data={"sub": user.login})
-        new_user.refresh_token = refresh_token
-        session.commit()
-        return {"user_id": new_user.id, "user": user.login, "access_token": access_token, "refresh_token": refresh_token}
+        await session.flush()
+        return new_user.id
+
+    try:
+        user_id = await writer.run(add_user)
+        return {"user_id": user_id, "user": user.login, "access_token": access_token, "refresh_token": refresh_token}
     except Exception as e:
         print(f"Ошибка: {e}")
         raise HTTPException(status_code=500, detail="Произошла ошибка на сервере")
-    finally:
-        session.close()
 
 @user_router.post("/token/refresh")
-async def refresh_access_token(refresh_token: str):
+async def refresh_access_token(refresh_token: str, session: AsyncSession = Depends(get_session)):
     credentials_exception = HTTPException(
         status_code=status.HTTP_401_UNAUTHORIZED,
         detail="Неверный refresh токен",
@@ -81,42 +86,59 @@ async def refresh_access_token(refresh_token: str):
     except jwt.PyJWTError:
         raise credentials_exception
 
-    session = SessionLocal()
     try:
-        user = session.query(User).filter(User.login == login).first()
+        user = await session.scalar(select(User).where(User.login == login))
         if user is None or user.refresh_token != refresh_token:
             raise credentials_exception
 
+        # Отзыв до выдачи: новый access токен выпускается позже отметки и остаётся действительным
+        forget_tokens(user.login)
         new_access_token = create_access_token(data={"sub": user.login})
         new_refresh_token = create_refresh_token(data={"sub": user.login})
         user.refresh_token = new_refresh_token
-        session.commit()
+        await session.commit()
 
         return {"access_token": new_access_token, "refresh_token": new_refresh_token}
     except Exception as e:
         print(f"Ошибка: {e}")
         raise HTTPException(status_code=500, detail="Произошла ошибка на сервере")
-    finally:
-        session.close()
+
+@user_router.post("/token")
+async def login_for_access_token(form_data: OAuth2PasswordRequestForm = Depends(),
+                                 session: AsyncSession = Depends(get_session)) -> dict:
+    user = await session.scalar(select(User).where(User.login == form_data.username))
+    if user is None:
+        await password_hasher.hash(form_data.password)
+        password_is_valid = False
+    else:
+        password_is_valid = await password_hasher.verify(form_data.password, user.password)
+    if not password_is_valid:
+        raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Неверный логин или пароль",
+                            headers={"WWW-Authenticate": "Bearer"})
+    access_token = create_access_token(data={"sub": user.login})
+    refresh_token = create_refresh_token(data={"sub": user.login})
+    user.refresh_token = refresh_token
+    await session.commit()
+    return {"access_token": access_token, "token_type": "bearer", "refresh_token": refresh_token}
 
 class AllUsersInfo(BaseModel):
     login: str
     profile_picture: Optional[str] = None
 
-@user_router.get("/users", response_model=List[AllUsersInfo])
-async def get_all_users() -> List[AllUsersInfo]:
-    session = SessionLocal()
+@user_router.get("/users", response_model=Page[AllUsersInfo])
+async def get_all_users(cursor: Optional[str] = None, limit: int = Query(default=DEFAULT_LIMIT, ge=1, le=MAX_LIMIT),
+                        session: AsyncSession = Depends(get_read_session)) -> Page[AllUsersInfo]:
+    after = decode_cursor(cursor, 2)
     try:
-        users = session.query(User).order_by(User.login).all()
+        users = (await session.scalars(keyset(select(User), [User.login, User.id], after, limit))).all()
+        users, next_cursor = split_page(users, limit, lambda user: [user.login, user.id])
         info = []
         for user in users:
             info.append(AllUsersInfo(login=user.login, profile_picture=user.profile_picture))
-        return info
+        return Page(items=info, next_cursor=next_cursor)
     except Exception as e:
         print(f"Ошибка: {e}")
         raise HTTPException(status_code=500, detail="Произошла ошибка на сервере")
-    finally:
-        session.close()
 
 class UserInfo(BaseModel):
     login: str
@@ -139,96 +161,75 @@ class UserInfoAdmin(BaseModel):
     birthday: Optional[date] = None
     sex: Optional[str] = None
     profile_picture: Optional[str] = None
-    refresh_token: str
+    refresh_token: Optional[str] = None
     is_admin: bool
     is_author: bool
     readed_books: List[BookInfo]
     achievments: List[AchievmentRegister]
 
+async def load_profile(session: AsyncSession, user_id: str) -> Optional[User]:
+    # Число запросов не зависит от размера полки: пользователь, полка с книгами, жанры книг, достижения
+    return await session.scalar(select(User).where(User.id == user_id).options(
+        selectinload(User.readed_books).joinedload(UserBook.book, innerjoin=True).selectinload(Book.genres),
+        selectinload(User.achievments).joinedload(UserAchievAssociation.achievment, innerjoin=True)))
+
+def shelf_book_info(book: Book) -> BookInfo:
+    return BookInfo(title=book.title, year=book.year, pages=book.pages, profile_picture=book.profile_picture,
+                    author_id=book.author_id, genres=[genre.genre_name for genre in book.genres],
+                    readers=book.readers_count)
+
 @user_router.get("/users/{user_id}")
-async def get_user(user_id: str, current_user: str = Depends(get_current_user)) -> Union[UserInfo, UserInfoAdmin]:
-    session = SessionLocal()
+async def get_user(user_id: str, current_user: Principal = Depends(get_current_principal),
+                   session: AsyncSession = Depends(get_read_session)) -> Union[UserInfo, UserInfoAdmin]:
     try:
-        find_user = session.query(User).filter(User.id == user_id).first()
-        current_user_info = session.query(User).filter(User.login == current_user).first()
+        find_user = await load_profile(session, user_id)
         if not find_user:
             raise HTTPException(status_code=400, detail="Пользователя с таким логином не существует!")
-        if current_user_info.is_admin:
-            readed_books_info = []
-            for read_book in find_user.readed_books:
-                readed_books_info.append(read_book.book)
-            achievments_info = []
-            for association in find_user.achievments:
-                achievement = association.achievment
-                achievments_info.append(AchievmentRegister(
-                    a_name=achievement.a_name,
-                    target=achievement.target,
-                    genre_id=achievement.genre_id
-                ))
-            user_info = UserInfoAdmin(
+        profile = dict(
+            login=find_user.login,
+            name=find_user.name,
+            surname=find_user.surname,
+            birthday=find_user.birthday,
+            sex=find_user.sex,
+            profile_picture=find_user.profile_picture,
+            is_author=find_user.is_author,
+            readed_books=[shelf_book_info(read_book.book) for read_book in find_user.readed_books],
+            achievments=[AchievmentRegister(a_name=association.achievment.a_name,
+                                            target=association.achievment.target,
+                                            genre_id=association.achievment.genre_id)
+                         for association in find_user.achievments]
+        )
+        if current_user.is_admin:
+            return UserInfoAdmin(
                 id=find_user.id,
-                login=find_user.login,
                 password=find_user.password,
-                name=find_user.name,
-                surname=find_user.surname,
                 email=find_user.email,
-                birthday=find_user.birthday,
-                sex=find_user.sex,
-                profile_picture=find_user.profile_picture,
                 refresh_token=find_user.refresh_token,
                 is_admin=find_user.is_admin,
-                is_author=find_user.is_author,
-                readed_books=readed_books_info,
-                achievments=achievments_info
-            )
-            return user_info
-        else:
-            readed_books_info = []
-            for read_book in find_user.readed_books:
-                readed_books_info.append(read_book.book)
-            achievments_info = []
-            for association in find_user.achievments:
-                achievement = association.achievment
-                achievments_info.append(AchievmentRegister(
-                    a_name=achievement.a_name,
-                    target=achievement.target,
-                    genre_id=achievement.genre_id
-                ))
-            user_info = UserInfo(
-                login=find_user.login,
-                name=find_user.name,
-                surname=find_user.surname,
-                birthday=find_user.birthday,
-                sex=find_user.sex,
-                profile_picture=find_user.profile_picture,
-                is_author=find_user.is_author,
-                readed_books=readed_books_info,
-                achievments=achievments_info
+                **profile
             )
-            return user_info
+        return UserInfo(**profile)
     except Exception as e:
         print(f"Ошибка: {e}")
         raise HTTPException(status_code=500, detail="Произошла ошибка на сервере")
-    finally:
-        session.close()
 
 @user_router.delete("/users/{user_id}")
-async def delete_user(user_id: str, current_user: str = Depends(get_current_user)) -> dict:
-    session = SessionLocal()
+async def delete_user(user_id: str, current_user: Principal = Depends(get_current_principal),
+                      session: AsyncSession = Depends(get_session)) -> dict:
     try:
-        find_user = session.query(User).filter(User.id == user_id).first()
+        find_user = await session.get(User, user_id)
         if not find_user:
             raise HTTPException(status_code=400, detail="Пользователя с таким логином не существует")
-        if find_user.login == current_user or check_admin(current_user):
-            session.delete(find_user)
-            session.commit()
+        if find_user.login == current_user.login or await check_admin(current_user):
+            await session.delete(find_user)
+            await session.commit()
+            forget_principal(find_user.login)
+            forget_tokens(find_user.login)
             return {"detail": f"Пользователь {find_user.login} успешно удалён!"}
         raise HTTPException(status_code=403, detail="У вас нет прав для удаления данного пользователя!")
     except Exception as e:
         print(f"Ошибка: {e}")
         raise HTTPException(status_code=500, detail="Произошла ошибка на сервере")
-    finally:
-        session.close()
 
 class UserUpdate(BaseModel):
     password: Optional[str] = Field(min_length = 8)
@@ -239,16 +240,15 @@ class UserUpdate(BaseModel):
     profile_picture: Optional[str] = None
 
 @user_router.patch("/users/{user_id}", response_model=UserUpdate)
-async def edit_user(user_id: str, data: UserUpdate, current_user: str = Depends(get_current_user)):
-    session = SessionLocal()
+async def edit_user(user_id: str, data: UserUpdate, current_user: Principal = Depends(get_current_principal),
+                    session: AsyncSession = Depends(get_session)):
     try:
-        find_user = session.query(User).filter(User.id == user_id).first()
+        find_user = await session.get(User, user_id)
         if not find_user:
             raise HTTPException(status_code=400, detail="Пользователя с таким id не существует")
-        if find_user.login == current_user or check_admin(current_user):
+        if find_user.login == current_user.login or await check_admin(current_user):
             if data.password:
-                password = data.password
-                find_user.password = hashed_password(password)
+                find_user.password = await password_hasher.hash(data.password)
             if data.name:
                 find_user.name = data.name
             if data.surname:
@@ -259,40 +259,41 @@ async def edit_user(user_id: str, data: UserUpdate, current_user: str = Depends(
                 find_user.sex = data.sex
             if data.profile_picture:
                 find_user.profile_picture = data.profile_picture
-            session.commit()
-            session.refresh(find_user)
+            await session.commit()
+            forget_principal(find_user.login)
             return find_user
         raise HTTPException(status_code=400, detail="У вас нет прав для редактирования пользователя!")
+    except HTTPException:
+        # 429 от пула bcrypt должен дойти до клиента, а не превратиться в ошибку сервера
+        raise
     except Exception as e:
         print(f"Ошибка: {e}")
         raise HTTPException(status_code=500, detail="Произошла ошибка на сервере")
-    finally:
-        session.close()
 
 @user_router.delete("/users/{user_id}/user_books/{book_id}")
-async def delete_book_from_user(user_id: str, book_id: str, current_user: str = Depends(get_current_user)) -> dict:
-    session = SessionLocal()
+async def delete_book_from_user(user_id: str, book_id: str, current_user: Principal = Depends(get_current_principal),
+                                session: AsyncSession = Depends(get_session)) -> dict:
     try:
-        find_user = session.query(User).filter(User.id == user_id).first()
+        find_user = await session.get(User, user_id)
         if not find_user:
             raise HTTPException(status_code=404, detail="Пользователя с таким логином не существует")
-        book = session.query(Book).filter(Book.id == book_id).first()
+        book = await session.get(Book, book_id)
         if not book:
             raise HTTPException(status_code=404, detail="Такой книги не существует")
-        if find_user.login == current_user:
-            book_to_delete = session.query(UserBook).filter(UserBook.book_id == book.id,
-                                                            UserBook.user_id == find_user.id).first()
+        if find_user.login == current_user.login:
+            book_to_delete = await session.get(UserBook, (find_user.id, book.id))
             if not book_to_delete:
                 raise HTTPException(status_code=404, detail="Книга не найдена у пользователя")
-            session.delete(book_to_delete)
-            session.commit()
-        await check_and_remove_achievment(find_user.id)
+            await session.delete(book_to_delete)
+            await change_book_counters(session, book.id, readers=-1, rating_sum=-(book_to_delete.rating or 0),
+                                       rating_count=-1 if book_to_delete.rating else 0)
+            await check_and_remove_achievment(find_user.id, book.id, session)
+        await session.commit()
+        response_cache.invalidate("ratings", "readers", f"book:{book.id}", f"author:{book.author_id}")
         return {"detail": "Книга успешно удалена у пользователя"}
     except Exception as e:
         print(f"Ошибка: {e}")
         raise HTTPException(status_code=500, detail="Произошла ошибка на сервере")
-    finally:
-        session.close()
 
 
 
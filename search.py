@@ -0,0 +1,80 @@
+import re
+from typing import Optional
+
+from sqlalchemy import event, func, literal_column, select, text
+
+from database import Base
+from models import Author, Book, Comment
+from pagination import keyset
+
+FTS_OPTIONS = "prefix='2 3', tokenize='unicode61 remove_diacritics 2'"
+
+# Внешнее содержимое: индекс хранит только токены, строки берутся из исходной таблицы по rowid
+SEARCH_INDEXES = {
+    "books": ("books_fts", ["title"]),
+    "authors": ("authors_fts", ["name", "surname", "patronymic"]),
+    "comments": ("comments_fts", ["content"]),
+}
+
+def search_ddl(table: str, fts_table: str, columns: list[str]) -> list[str]:
+    names = ", ".join(columns)
+    new_values = ", ".join(f"new.{column}" for column in columns)
+    old_values = ", ".join(f"old.{column}" for column in columns)
+    insert = f"INSERT INTO {fts_table}(rowid, {names}) VALUES (new.rowid, {new_values});"
+    delete = f"INSERT INTO {fts_table}({fts_table}, rowid, {names}) VALUES ('delete', old.rowid, {old_values});"
+    return [
+        f"CREATE VIRTUAL TABLE IF NOT EXISTS {fts_table} USING fts5({names}, content='{table}', "
+        f"content_rowid='rowid', {FTS_OPTIONS})",
+        f"CREATE TRIGGER IF NOT EXISTS {fts_table}_ai AFTER INSERT ON {table} BEGIN {insert} END",
+        f"CREATE TRIGGER IF NOT EXISTS {fts_table}_ad AFTER DELETE ON {table} BEGIN {delete} END",
+        f"CREATE TRIGGER IF NOT EXISTS {fts_table}_au AFTER UPDATE OF {names} ON {table} BEGIN {delete} {insert} END",
+    ]
+
+def create_search_indexes(target, connection, **kw):
+    if connection.dialect.name != "sqlite":
+        return
+    for table, (fts_table, columns) in SEARCH_INDEXES.items():
+        exists = connection.execute(text("SELECT 1 FROM sqlite_master WHERE name = :name"),
+                                    {"name": fts_table}).first()
+        for statement in search_ddl(table, fts_table, columns):
+            connection.execute(text(statement))
+        if not exists:
+            connection.execute(text(f"INSERT INTO {fts_table}({fts_table}) VALUES ('rebuild')"))
+
+event.listen(Base.metadata, "after_create", create_search_indexes)
+
+def drop_search_triggers(connection):
+    # Для массовой загрузки: построчные триггеры медленнее, чем один rebuild после неё
+    for fts_table, _ in SEARCH_INDEXES.values():
+        for suffix in ["ai", "ad", "au"]:
+            connection.execute(text(f"DROP TRIGGER IF EXISTS {fts_table}_{suffix}"))
+
+def rebuild_search_indexes(connection):
+    if connection.dialect.name != "sqlite":
+        return
+    # VACUUM может перенумеровать неявные rowid, после него индекс нужно перестроить
+    for fts_table, _ in SEARCH_INDEXES.values():
+        connection.execute(text(f"INSERT INTO {fts_table}({fts_table}) VALUES ('rebuild')"))
+
+def match_query(query: str) -> Optional[str]:
+    tokens = re.findall(r"\w+", query)
+    if not tokens:
+        return None
+    return " ".join(f'"{token}"*' for token in tokens)
+
+SEARCH_SCOPES = {
+    "books": (Book, Book.title),
+    "authors": (Author, func.trim(Author.surname + " " + Author.name + " " + func.coalesce(Author.patronymic, ""))),
+    "comments": (Comment, Comment.content),
+}
+
+def search_query(scope: str, match: str, after: Optional[list], limit: int):
+    model, text_column = SEARCH_SCOPES[scope]
+    fts_table, _ = SEARCH_INDEXES[model.__tablename__]
+    fts = literal_column(fts_table)
+    # bm25 отрицателен: чем меньше значение, тем выше релевантность
+    hits = select(literal_column("rowid").label("rowid"), func.bm25(fts).label("score")).select_from(
+        text(fts_table)).where(fts.op("MATCH")(match)).subquery("hits")
+    query = select(model.id, text_column.label("text"), hits.c.score, hits.c.rowid).join_from(
+        model, hits, literal_column(f"{model.__tablename__}.rowid") == hits.c.rowid)
+    return keyset(query, [hits.c.score, hits.c.rowid], after, limit)
@@ -0,0 +1,183 @@
+import argparse
+import os
+import random
+import time
+import uuid
+
+import bcrypt
+from dotenv import load_dotenv
+from sqlalchemy import func, insert, select
+
+from aggregates import reconcile
+from database import Base, DATABASE_URL, SQLITE_PRAGMAS, make_engine
+from models import Achievment, Author, Book, Comment, Genre, User
+from models.achievment_model import ALL_GENRES, UserAchievAssociation, UserReadCounter
+from models.book_model import UserBook
+from models.genre_model import BookGenreAssociation
+from passwords import BCRYPT_ROUNDS
+from search import create_search_indexes, drop_search_triggers
+
+load_dotenv()
+
+SEED_BATCH_SIZE = int(os.getenv("SEED_BATCH_SIZE", "20000"))
+# Один пароль на всех: сгенерированные пользователи могут войти через /token
+SEED_PASSWORD = "password1"
+COUNTRIES = ["RU", "FR", "GB", "US", "DE", "JP", "IT", "ES"]
+SYLLABLES = ["ан", "ва", "ро", "ми", "ка", "ле", "то", "су", "ни", "да", "ре", "по", "ло", "ша", "ти", "ве"]
+ACHIEVMENT_TARGETS = [1, 10, 50, 100, 500]
+GENRE_ACHIEVMENT_TARGETS = [5, 25, 100]
+# Сгенерированную базу всегда можно пересоздать, поэтому fsync при заполнении не нужен
+SEED_PRAGMAS = {**SQLITE_PRAGMAS, "synchronous": "OFF", "cache_size": -262144}
+
+class Generator:
+    def __init__(self, seed: int):
+        self.random = random.Random(seed)
+
+    def uuid(self) -> str:
+        return str(uuid.UUID(int=self.random.getrandbits(128), version=4))
+
+    def word(self, low: int = 2, high: int = 4) -> str:
+        return "".join(self.random.choices(SYLLABLES, k=self.random.randint(low, high)))
+
+    def power_law(self, size: int, exponent: float) -> list:
+        # Накопленные веса распределения Ципфа: первые элементы намного популярнее хвоста
+        total = 0.0
+        weights = []
+        for rank in range(1, size + 1):
+            total += 1 / rank ** exponent
+            weights.append(total)
+        return weights
+
+    def shelf_sizes(self, users: int, entries: int, books: int, exponent: float) -> list[int]:
+        weights = [1 / rank ** exponent for rank in range(1, users + 1)]
+        scale = entries / sum(weights)
+        # Самые активные читатели упираются в половину каталога, остаток добирают остальные
+        cap = max(1, books // 2)
+        sizes = [min(cap, max(1, round(weight * scale))) for weight in weights]
+        for rank in range(users - 1, -1, -1):
+            missing = entries - sum(sizes)
+            if missing <= 0:
+                break
+            sizes[rank] = min(cap, sizes[rank] + missing)
+        self.random.shuffle(sizes)
+        return sizes
+
+def insert_batches(connection, table, rows, batch_size: int) -> int:
+    batch = []
+    count = 0
+    for row in rows:
+        batch.append(row)
+        if len(batch) >= batch_size:
+            connection.execute(insert(table), batch)
+            count += len(batch)
+            batch = []
+    if batch:
+        connection.execute(insert(table), batch)
+        count += len(batch)
+    return count
+
+def seed_database(bind, users: int = 1000, authors: int = 200, books: int = 5000, genres: int = 20,
+                  shelf_entries: int = 50000, comments: int = 5000, seed: int = 42, exponent: float = 1.1,
+                  batch_size: int = SEED_BATCH_SIZE) -> dict:
+    generator = Generator(seed)
+    rng = generator.random
+    # Ключи вставляются по возрастанию: B-дерево первичного ключа растёт с конца, а не случайными разрывами
+    user_ids = sorted(generator.uuid() for _ in range(users))
+    author_ids = sorted(generator.uuid() for _ in range(authors))
+    book_ids = sorted(generator.uuid() for _ in range(books))
+    genre_ids = sorted(generator.uuid() for _ in range(genres))
+    author_countries = [rng.choice(COUNTRIES) for _ in range(authors)]
+    password = bcrypt.hashpw(SEED_PASSWORD.encode("utf-8"), bcrypt.gensalt(BCRYPT_ROUNDS)).decode("utf-8")
+    counts = {}
+    with bind.begin() as connection:
+        drop_search_triggers(connection)
+        counts["users"] = insert_batches(connection, User.__table__, (
+            {"id": user_id, "login": f"user{number}", "password": password,
+             "email": f"user{number}@example.com", "name": generator.word().title(),
+             "surname": generator.word(3, 5).title(), "is_admin": False, "is_author": False}
+            for number, user_id in enumerate(user_ids)), batch_size)
+        counts["genres"] = insert_batches(connection, Genre.__table__, (
+            {"id": genre_id, "genre_name": f"Жанр {number}"} for number, genre_id in enumerate(genre_ids)),
+                                          batch_size)
+        counts["authors"] = insert_batches(connection, Author.__table__, (
+            {"id": author_id, "name": generator.word().title(), "surname": generator.word(3, 5).title(),
+             "country": author_countries[number], "profile_picture": f"authors/{number}.jpg"}
+            for number, author_id in enumerate(author_ids)), batch_size)
+        book_authors = [rng.randrange(authors) for _ in range(books)]
+        counts["books"] = insert_batches(connection, Book.__table__, (
+            {"id": book_id, "title": f"{generator.word(2, 5).title()} {generator.word()} {number}",
+             "year": rng.randint(1800, 2024), "pages": rng.randint(50, 1500),
+             "profile_picture": f"books/{number}.jpg", "country": author_countries[book_authors[number]],
+             "author_id": author_ids[book_authors[number]]}
+            for number, book_id in enumerate(book_ids)), batch_size)
+        genre_weights = generator.power_law(genres, exponent)
+        insert_batches(connection, BookGenreAssociation.__table__, (
+            {"book_id": book_id, "genre_id": genre_ids[genre]} for book_id in book_ids
+            for genre in set(rng.choices(range(genres), cum_weights=genre_weights, k=rng.randint(1, 3)))),
+                       batch_size)
+
+        book_weights = generator.power_law(books, exponent)
+        sizes = generator.shelf_sizes(users, shelf_entries, books, exponent)
+
+        def shelf_rows():
+            for user_id, size in zip(user_ids, sizes):
+                shelf = set(rng.choices(range(books), cum_weights=book_weights, k=size))
+                # Повторы популярных книг добираются равномерно, иначе длинный хвост собирается очень долго
+                while len(shelf) < size:
+                    shelf.update(rng.sample(range(books), size - len(shelf)))
+                for book in sorted(shelf):
+                    rated = rng.random() < 0.6
+                    yield {"user_id": user_id, "book_id": book_ids[book],
+                           "rating": min(10, max(1, round(rng.gauss(7, 2)))) if rated else None}
+
+        counts["user_books"] = insert_batches(connection, UserBook.__table__, shelf_rows(), batch_size)
+        counts["comments"] = insert_batches(connection, Comment.__table__, (
+            {"id": generator.uuid(), "user_id": rng.choice(user_ids),
+             "book_id": book_ids[rng.choices(range(books), cum_weights=book_weights)[0]],
+             "content": " ".join(generator.word() for _ in range(rng.randint(3, 12)))}
+            for _ in range(comments)), batch_size)
+        achievments = [{"id": generator.uuid(), "a_name": f"Прочитано книг: {target}", "target": target,
+                        "genre_id": None} for target in ACHIEVMENT_TARGETS]
+        achievments += [{"id": generator.uuid(), "a_name": f"Жанр {number}: {target}", "target": target,
+                         "genre_id": genre_id} for number, genre_id in enumerate(genre_ids)
+                        for target in GENRE_ACHIEVMENT_TARGETS]
+        counts["achievments"] = insert_batches(connection, Achievment.__table__, achievments, batch_size)
+        create_search_indexes(Base.metadata, connection)
+    # Пересчёт счётчиков заодно перестраивает поисковые индексы по загруженным строкам
+    reconcile(bind)
+    with bind.begin() as connection:
+        earned = select(UserReadCounter.user_id, Achievment.id).join(Achievment, (
+            UserReadCounter.genre_id == func.coalesce(Achievment.genre_id, ALL_GENRES))
+            & (UserReadCounter.read_count >= Achievment.target))
+        counts["user_achievments"] = connection.execute(insert(UserAchievAssociation).from_select(
+            [UserAchievAssociation.user_id, UserAchievAssociation.achievment_id], earned)).rowcount
+    return counts
+
+def main():
+    parser = argparse.ArgumentParser(description="Заполнение базы воспроизводимым синтетическим каталогом")
+    parser.add_argument("--url", default=DATABASE_URL)
+    parser.add_argument("--users", type=int, default=1000)
+    parser.add_argument("--authors", type=int, default=200)
+    parser.add_argument("--books", type=int, default=5000)
+    parser.add_argument("--genres", type=int, default=20)
+    parser.add_argument("--shelf-entries", type=int, default=50000)
+    parser.add_argument("--comments", type=int, default=5000)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--exponent", type=float, default=1.1)
+    parser.add_argument("--batch-size", type=int, default=SEED_BATCH_SIZE)
+    args = parser.parse_args()
+    engine = make_engine(args.url, SEED_PRAGMAS)
+    Base.metadata.create_all(bind=engine)
+    with engine.connect() as connection:
+        if connection.scalar(select(func.count()).select_from(User)):
+            parser.error("База уже содержит пользователей: укажите пустую базу через --url")
+    start = time.perf_counter()
+    counts = seed_database(engine, args.users, args.authors, args.books, args.genres, args.shelf_entries,
+                           args.comments, args.seed, args.exponent, args.batch_size)
+    for table, count in counts.items():
+        print(f"{table:>18} {count:>10}")
+    print(f"Готово за {time.perf_counter() - start:.1f} с")
+    engine.dispose()
+
+if __name__ == "__main__":
+    main()
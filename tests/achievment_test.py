@@ -0,0 +1,70 @@
+from aggregates import rebuild_read_counters
+from models import Achievment, Genre
+from models.achievment_model import UserAchievAssociation, UserReadCounter, ALL_GENRES
+from models.genre_model import BookGenreAssociation
+from .conftest import add_user, add_book
+
+def setup_catalog(db) -> tuple[list[str], str]:
+    book_ids = [add_book(db) for _ in range(3)]
+    session = db[0]()
+    genre = Genre(genre_name="Роман")
+    session.add(genre)
+    session.flush()
+    for book_id in book_ids[:2]:
+        session.add(BookGenreAssociation(book_id=book_id, genre_id=genre.id))
+    session.add_all([Achievment(a_name="Две книги", target=2),
+                     Achievment(a_name="Три книги", target=3),
+                     Achievment(a_name="Два романа", target=2, genre_id=genre.id)])
+    session.commit()
+    genre_id = genre.id
+    session.close()
+    return book_ids, genre_id
+
+def awarded(db, user_id: str) -> set[str]:
+    session = db[0]()
+    names = {association.achievment.a_name for association in
+             session.query(UserAchievAssociation).filter(UserAchievAssociation.user_id == user_id)}
+    session.close()
+    return names
+
+def test_thresholds_are_awarded_and_removed(db, client):
+    book_ids, genre_id = setup_catalog(db)
+    user = add_user(db, "reader")
+    client.post(f"/books/{book_ids[0]}", headers=user["headers"])
+    assert awarded(db, user["id"]) == set()
+    client.post(f"/books/{book_ids[1]}", headers=user["headers"])
+    assert awarded(db, user["id"]) == {"Две книги", "Два романа"}
+    client.post(f"/books/{book_ids[2]}", headers=user["headers"])
+    assert awarded(db, user["id"]) == {"Две книги", "Два романа", "Три книги"}
+    client.delete(f"/users/{user['id']}/user_books/{book_ids[0]}", headers=user["headers"])
+    assert awarded(db, user["id"]) == {"Две книги"}
+
+def test_rebuild_read_counters(db, client):
+    book_ids, genre_id = setup_catalog(db)
+    user = add_user(db, "reader")
+    for book_id in book_ids:
+        client.post(f"/books/{book_id}", headers=user["headers"])
+    session = db[0]()
+    live = {(row.genre_id, row.read_count) for row in session.query(UserReadCounter)}
+    rebuild_read_counters(session.connection())
+    session.commit()
+    rebuilt = {(row.genre_id, row.read_count) for row in session.query(UserReadCounter)}
+    assert live == rebuilt == {(ALL_GENRES, 3), (genre_id, 2)}
+    session.close()
+
+def test_genre_change_moves_achievments_of_readers(db, client):
+    book_ids, genre_id = setup_catalog(db)
+    admin = add_user(db, "admin", is_admin=True)
+    readers = [add_user(db, f"reader{number}") for number in range(2)]
+    for reader in readers:
+        client.post(f"/books/{book_ids[0]}", headers=reader["headers"])
+        client.post(f"/books/{book_ids[2]}", headers=reader["headers"])
+        assert awarded(db, reader["id"]) == {"Две книги"}
+    book = {"title": "Война и мир", "profile_picture": "", "author_id": "", "genres": [genre_id]}
+    assert client.patch(f"/books/{book_ids[2]}", json=book, headers=admin["headers"]).status_code == 200
+    for reader in readers:
+        assert awarded(db, reader["id"]) == {"Две книги", "Два романа"}
+    book["genres"] = ["нет такого жанра"]
+    assert client.patch(f"/books/{book_ids[2]}", json=book, headers=admin["headers"]).status_code == 200
+    for reader in readers:
+        assert awarded(db, reader["id"]) == {"Две книги"}
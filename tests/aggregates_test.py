@@ -0,0 +1,58 @@
+from aggregates import rebuild_book_counters, rebuild_author_counters
+from models import Author, Book
+from models.book_model import UserBook
+from .conftest import add_user, add_book
+
+def test_counters_follow_shelf_and_ratings(db, client, counter):
+    book_id = add_book(db)
+    first = add_user(db, "first")
+    second = add_user(db, "second")
+    client.post(f"/books/{book_id}", headers=first["headers"])
+    client.post(f"/books/{book_id}", headers=second["headers"])
+    client.put(f"/books/{book_id}/rate", json=8, headers=first["headers"])
+    client.put(f"/books/{book_id}/rate", json=5, headers=second["headers"])
+    client.put(f"/books/{book_id}/rate", json=3, headers=second["headers"])
+    counter.reset()
+    book = client.get(f"/books/{book_id}").json()
+    assert counter.commits == 0
+    assert book["readers"] == 2
+    assert book["average_rating"] == 5.5
+    client.delete(f"/users/{first['id']}/user_books/{book_id}", headers=first["headers"])
+    book = client.get(f"/books/{book_id}").json()
+    assert book["readers"] == 1
+    assert book["average_rating"] == 3.0
+
+def test_rebuild_book_counters(db):
+    book_id = add_book(db)
+    reader = add_user(db, "reader")
+    session = db[0]()
+    session.add(UserBook(user_id=reader["id"], book_id=book_id, rating=9))
+    session.commit()
+    rebuild_book_counters(session.connection())
+    session.commit()
+    book = session.get(Book, book_id)
+    assert (book.readers_count, book.rating_sum, book.rating_count, book.average_rating) == (1, 9, 1, 9.0)
+    session.close()
+
+def test_author_aggregates_follow_book_changes(db, client, counter):
+    book_id = add_book(db)
+    session = db[0]()
+    author_id = session.get(Book, book_id).author_id
+    session.close()
+    first = add_user(db, "first")
+    second = add_user(db, "second")
+    client.post(f"/books/{book_id}", headers=first["headers"])
+    client.post(f"/books/{book_id}", headers=second["headers"])
+    client.put(f"/books/{book_id}/rate", json=10, headers=first["headers"])
+    client.put(f"/books/{book_id}/rate", json=7, headers=second["headers"])
+    counter.reset()
+    author = client.get(f"/authors/{author_id}").json()
+    assert counter.commits == 0
+    assert author["average_rating"] == 8.5
+    assert author["readers_count"] == 2
+    session = db[0]()
+    rebuild_author_counters(session.connection())
+    session.commit()
+    stored = session.get(Author, author_id)
+    assert (stored.books_count, stored.readers_count, stored.rating_sum, stored.rating_count) == (1, 2, 17, 2)
+    session.close()
@@ -0,0 +1,44 @@
+import json
+
+from .conftest import add_user
+
+def import_books(client, headers: dict, count: int):
+    body = "\n".join(json.dumps({"title": f"Книга {number}", "year": 1900, "pages": 100, "profile_picture": "p",
+                                 "author_name": "Лев", "author_surname": "Толстой", "country": "RU",
+                                 "genres": ["Роман", "Драма"] if number % 2 else []}, ensure_ascii=False)
+                     for number in range(count))
+    assert client.post("/import_catalog", content=body.encode("utf-8"), headers=headers).json()["error_count"] == 0
+
+def read_ndjson(response) -> list:
+    return [json.loads(line) for line in response.text.splitlines()]
+
+def test_books_export_streams_and_resumes(db, client):
+    admin = add_user(db, "admin", is_admin=True)
+    import_books(client, admin["headers"], 7)
+    response = client.get("/export/books", params={"chunk_size": 3}, headers=admin["headers"])
+    assert response.headers["content-type"] == "application/x-ndjson"
+    books = read_ndjson(response)
+    assert len(books) == 7
+    assert [book["id"] for book in books] == sorted(book["id"] for book in books)
+    assert sum(book["genres"] == ["Драма", "Роман"] for book in books) == 3
+    assert {book["author_surname"] for book in books} == {"Толстой"}
+    rest = read_ndjson(client.get("/export/books", params={"after": books[3]["id"]}, headers=admin["headers"]))
+    assert rest == books[4:]
+    compressed = client.get("/export/books", headers={**admin["headers"], "Accept-Encoding": "gzip"})
+    assert compressed.headers["content-encoding"] == "gzip"
+    assert read_ndjson(compressed) == books
+
+def test_shelf_export_resumes_from_pair(db, client):
+    admin = add_user(db, "admin", is_admin=True)
+    user = add_user(db, "reader")
+    import_books(client, admin["headers"], 3)
+    for book in read_ndjson(client.get("/export/books", headers=admin["headers"])):
+        client.post(f"/books/{book['id']}", headers=user["headers"])
+    shelf = read_ndjson(client.get("/export/user_books", params={"chunk_size": 2}, headers=admin["headers"]))
+    assert len(shelf) == 3 and {row["user_id"] for row in shelf} == {user["id"]}
+    rest = client.get("/export/user_books", params={"after_user_id": shelf[0]["user_id"],
+                                                    "after_book_id": shelf[0]["book_id"]}, headers=admin["headers"])
+    assert read_ndjson(rest) == shelf[1:]
+    assert client.get("/export/user_books", params={"after_user_id": user["id"]},
+                      headers=admin["headers"]).status_code == 400
+    assert client.get("/export/user_books", headers=user["headers"]).status_code == 403
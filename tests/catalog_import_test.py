@@ -0,0 +1,60 @@
+import json
+
+from models import Author, Book, Genre
+from models.genre_model import BookGenreAssociation
+from .conftest import add_user
+
+def test_ndjson_import_resolves_natural_keys(db, client):
+    admin = add_user(db, "admin", is_admin=True)
+    rows = [
+        {"kind": "genre", "genre_name": "Роман"},
+        {"kind": "author", "name": "Лев", "surname": "Толстой", "country": "RU", "profile_picture": "p"},
+        {"title": "Война и мир", "year": 1869, "pages": 1300, "profile_picture": "p", "author_name": "Лев",
+         "author_surname": "Толстой", "genres": ["Роман", "Эпопея"]},
+        {"title": "Анна Каренина", "year": 1877, "pages": 864, "profile_picture": "p", "author_name": "Лев",
+         "author_surname": "Толстой", "genres": ["Роман"]},
+        {"title": "Война и мир", "year": 1869, "pages": 1300, "profile_picture": "p", "author_name": "Лев",
+         "author_surname": "Толстой"},
+        {"title": "Без года", "pages": 10, "profile_picture": "p", "author_name": "Лев", "author_surname": "Толстой"},
+        {"title": "Без страны", "year": 1900, "pages": 10, "profile_picture": "p", "author_name": "Некто",
+         "author_surname": "Неизвестный"},
+    ]
+    body = "\n".join(json.dumps(row, ensure_ascii=False) for row in rows) + "\n{broken"
+    response = client.post("/import_catalog", params={"batch_size": 2}, content=body.encode("utf-8"),
+                           headers=admin["headers"])
+    assert response.status_code == 200
+    report = response.json()
+    assert report["imported"] == {"genres": 2, "authors": 1, "books": 2}
+    assert [error["line"] for error in report["errors"]] == [5, 6, 7, 8]
+    with db[0]() as session:
+        author = session.query(Author).filter(Author.surname == "Толстой").one()
+        assert author.books_count == 2
+        assert session.query(Book).filter(Book.country == "RU").count() == 2
+        assert session.query(BookGenreAssociation).count() == 3
+        assert session.query(Genre).count() == 2
+
+def test_csv_import_and_admin_only(db, client):
+    admin = add_user(db, "admin", is_admin=True)
+    user = add_user(db, "reader")
+    body = ("title,year,pages,profile_picture,author_name,author_surname,country,genres\n"
+            "Идиот,1869,640,p,Фёдор,Достоевский,RU,Роман|Драма\n"
+            "\"Бесы, том 1\",1872,700,p,Фёдор,Достоевский,RU,Роман\n")
+    assert client.post("/import_catalog", params={"format": "csv"}, content=body.encode("utf-8"),
+                       headers=user["headers"]).status_code == 403
+    response = client.post("/import_catalog", params={"format": "csv"}, content=body.encode("utf-8"),
+                           headers=admin["headers"])
+    assert response.json() == {"imported": {"genres": 2, "authors": 1, "books": 2}, "error_count": 0, "errors": []}
+    assert {book["title"] for book in client.get("/books/year").json()["items"]} == {"Идиот", "Бесы, том 1"}
+
+def test_csv_quoted_field_keeps_newline(db, client):
+    admin = add_user(db, "admin", is_admin=True)
+    body = ("title,year,pages,profile_picture,author_name,author_surname,country\n"
+            "\"Записки\nиз подполья\",1864,150,p,Фёдор,Достоевский,RU\n"
+            "Игрок,1866,200,p,Фёдор,Достоевский\n"
+            "\"Неточка\n")
+    response = client.post("/import_catalog", params={"format": "csv"}, content=body.encode("utf-8"),
+                           headers=admin["headers"])
+    report = response.json()
+    assert report["imported"]["books"] == 1
+    assert [error["line"] for error in report["errors"]] == [4, 5]
+    assert [book["title"] for book in client.get("/books/year").json()["items"]] == ["Записки\nиз подполья"]
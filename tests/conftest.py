@@ -0,0 +1,109 @@
+import pytest
+from fastapi.testclient import TestClient
+from sqlalchemy import event
+from sqlalchemy.ext.asyncio import async_sessionmaker
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import NullPool
+
+from cache import response_cache
+from database import (Base, get_session, get_read_session, make_engine, make_async_engine, make_read_engine,
+                      read_only_url)
+from diagnostics import query_diagnostics
+from jwt_token import create_access_token, principal_cache, token_cache, tokens_revoked_at
+from models import Author, Book, User
+from profiler import profiler
+from routes.useful_funk import achievment_index
+from write_queue import write_queue
+from ..my_app import app
+
+# Один и тот же SQL больше REPEATED_QUERY_LIMIT раз за запрос роняет тест, а не только пишется в лог
+query_diagnostics.repeat_limit = 5
+query_diagnostics.raise_on_repeat = True
+
+class ConnectionCounter:
+    def __init__(self, engine):
+        self.connections = 0
+        self.commits = 0
+        event.listen(engine.sync_engine, "connect", self._on_connect)
+        event.listen(engine.sync_engine, "commit", self._on_commit)
+
+    def _on_connect(self, dbapi_connection, connection_record):
+        self.connections += 1
+
+    def _on_commit(self, connection):
+        self.commits += 1
+
+    def reset(self):
+        self.connections = 0
+        self.commits = 0
+
+@pytest.fixture
+def db(tmp_path):
+    url = f"sqlite:///{tmp_path / 'test.db'}"
+    sync_engine = make_engine(url)
+    Base.metadata.create_all(bind=sync_engine)
+    async_engine = make_async_engine(url, poolclass=NullPool)
+    TestSessionLocal = async_sessionmaker(bind=async_engine, expire_on_commit=False)
+    read_engine = make_read_engine(read_only_url(url), poolclass=NullPool)
+    TestReadSessionLocal = async_sessionmaker(bind=read_engine, expire_on_commit=False)
+
+    async def override_get_session():
+        session = TestSessionLocal()
+        try:
+            yield session
+        except Exception:
+            await session.rollback()
+            raise
+        finally:
+            await session.close()
+
+    async def override_get_read_session():
+        session = TestReadSessionLocal()
+        try:
+            yield session
+        finally:
+            await session.close()
+
+    app.dependency_overrides[get_session] = override_get_session
+    app.dependency_overrides[get_read_session] = override_get_read_session
+    default_writer_sessions = write_queue.session_factory
+    write_queue.session_factory = TestSessionLocal
+    achievment_index.invalidate()
+    principal_cache.clear()
+    token_cache.clear()
+    tokens_revoked_at.clear()
+    response_cache.clear()
+    profiler.clear()
+    yield sessionmaker(bind=sync_engine), async_engine, read_engine
+    app.dependency_overrides.clear()
+    write_queue.session_factory = default_writer_sessions
+    sync_engine.dispose()
+
+@pytest.fixture
+def client(db):
+    return TestClient(app)
+
+@pytest.fixture
+def counter(db):
+    return ConnectionCounter(db[1])
+
+def add_user(db, login: str, is_admin: bool = False) -> dict:
+    session = db[0]()
+    user = User(login=login, password="x", email=f"{login}@example.com", is_admin=is_admin)
+    session.add(user)
+    session.commit()
+    user_id = user.id
+    session.close()
+    return {"id": user_id, "headers": {"Authorization": f"Bearer {create_access_token(data={'sub': login})}"}}
+
+def add_book(db) -> str:
+    session = db[0]()
+    author = Author(name="Лев", surname="Толстой", country="RU", profile_picture="p")
+    session.add(author)
+    session.flush()
+    book = Book(title="Война и мир", year=1869, pages=1300, profile_picture="p", country="RU", author_id=author.id)
+    session.add(book)
+    session.commit()
+    book_id = book.id
+    session.close()
+    return book_id
@@ -0,0 +1,60 @@
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+from sqlalchemy import select
+
+from diagnostics import RepeatedQueryError, query_diagnostics, statement_shape
+from metrics import MetricsMiddleware
+from models import Book, Genre
+from .conftest import add_user, add_book
+
+def test_repeated_statement_in_one_request_raises(db):
+    app = FastAPI()
+    app.add_middleware(MetricsMiddleware)
+
+    @app.get("/books_one_by_one")
+    async def books_one_by_one():
+        async with db[1].connect() as connection:
+            for number in range(query_diagnostics.repeat_limit + 1):
+                await connection.execute(select(Book.title).where(Book.year == number))
+        return {}
+
+    @app.get("/books_at_once")
+    async def books_at_once():
+        async with db[1].connect() as connection:
+            await connection.execute(select(Book.title).where(Book.year.in_(range(50))))
+        return {}
+
+    client = TestClient(app)
+    with pytest.raises(RepeatedQueryError, match="GET /books_one_by_one"):
+        client.get("/books_one_by_one")
+    assert client.get("/books_at_once").status_code == 200
+
+def test_slow_statement_is_logged_with_route_and_parameters(db, client, capsys, monkeypatch):
+    book_id = add_book(db)
+    monkeypatch.setattr(query_diagnostics, "slow_ms", 1e-6)
+    client.get(f"/books/{book_id}")
+    output = capsys.readouterr().out
+    assert "Медленный запрос" in output
+    assert "[GET /books/{book_id}]" in output and book_id in output
+
+def test_book_edit_checks_genres_in_one_query(db, client):
+    admin = add_user(db, "admin", is_admin=True)
+    book_id = add_book(db)
+    session = db[0]()
+    genres = [Genre(genre_name=f"Жанр {number}") for number in range(query_diagnostics.repeat_limit + 3)]
+    session.add_all(genres)
+    session.commit()
+    genre_ids = [genre.id for genre in genres]
+    author_id = session.get(Book, book_id).author_id
+    session.close()
+    for selected in [genre_ids, genre_ids[:2] + ["missing"]]:
+        response = client.patch(f"/books/{book_id}", json={"title": "Война и мир", "profile_picture": "p",
+                                                           "author_id": author_id, "genres": selected},
+                                headers=admin["headers"])
+        assert response.status_code == 200
+    with db[0]() as session:
+        assert sorted(genre.genre_name for genre in session.get(Book, book_id).genres) == ["Жанр 0", "Жанр 1"]
+
+def test_expanded_in_lists_share_a_shape():
+    assert statement_shape("SELECT 1 WHERE id IN (?, ?, ?)") == statement_shape("SELECT 1\n WHERE id IN (?)")
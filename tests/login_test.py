@@ -0,0 +1,34 @@
+import pytest
+
+from passwords import password_hasher
+from .conftest import add_user
+
+@pytest.fixture
+def fast_hasher(monkeypatch):
+    monkeypatch.setattr(password_hasher, "rounds", 4)
+    return password_hasher
+
+def register(client, login: str, password: str):
+    response = client.post("/register", json={"login": login, "password": password, "email": f"{login}@example.com"})
+    assert response.status_code == 200
+
+def test_token_login(db, client, fast_hasher):
+    register(client, "reader", "password1")
+    response = client.post("/token", data={"username": "reader", "password": "password1"})
+    assert response.status_code == 200
+    assert response.json()["token_type"] == "bearer"
+    assert client.post("/token", data={"username": "reader", "password": "password2"}).status_code == 401
+    assert client.post("/token", data={"username": "nobody", "password": "password1"}).status_code == 401
+
+def test_token_login_is_throttled(db, client, fast_hasher, monkeypatch):
+    register(client, "reader", "password1")
+    monkeypatch.setattr(password_hasher, "max_pending", 0)
+    response = client.post("/token", data={"username": "reader", "password": "password1"})
+    assert response.status_code == 429
+
+def test_password_change_is_throttled(db, client, fast_hasher, monkeypatch):
+    user = add_user(db, "reader")
+    monkeypatch.setattr(password_hasher, "max_pending", 0)
+    response = client.patch(f"/users/{user['id']}", json={"password": "password2"}, headers=user["headers"])
+    assert response.status_code == 429
+    assert response.headers["Retry-After"] == "1"
@@ -0,0 +1,52 @@
+import re
+
+from metrics import Histogram
+from .conftest import add_book
+
+def sample(text: str, name: str, **labels) -> float:
+    for line in text.splitlines():
+        match = re.match(r"^(\w+)(?:\{(.*)\})? (\S+)$", line)
+        if not match or match.group(1) != name:
+            continue
+        found = dict(re.findall(r'(\w+)="((?:[^"\\]|\\.)*)"', match.group(2) or ""))
+        if all(found.get(key) == str(value) for key, value in labels.items()):
+            return float(match.group(3))
+    return 0.0
+
+def test_metrics_count_routes_statuses_and_queries(db, client):
+    book_id = add_book(db)
+    before = client.get("/metrics").text
+    for _ in range(3):
+        assert client.get(f"/books/{book_id}").status_code == 200
+    client.get("/no_such_route")
+    response = client.get("/metrics")
+    assert response.headers["content-type"].startswith("text/plain; version=0.0.4")
+    after = response.text
+
+    route = {"method": "GET", "route": "/books/{book_id}"}
+    assert sample(after, "library_http_requests_total", status=200, **route) - \
+        sample(before, "library_http_requests_total", status=200, **route) == 3
+    assert sample(after, "library_http_requests_total", method="GET", route="unmatched", status=404) >= 1
+    assert sample(after, "library_http_request_duration_seconds_count", **route) - \
+        sample(before, "library_http_request_duration_seconds_count", **route) == 3
+    # Первый запрос читает книгу и жанры, остальные отдаются из кэша ответов без SQL
+    queries = sample(after, "library_db_queries_per_request_sum", **route) - \
+        sample(before, "library_db_queries_per_request_sum", **route)
+    assert queries == 2
+    assert sample(after, "library_db_time_per_request_seconds_sum", **route) > 0
+    # Сам запрос /metrics ещё обрабатывается в момент рендера
+    assert sample(after, "library_http_requests_in_flight") == 1
+    assert sample(after, "library_db_pool_checkout_seconds_count", engine="sqlite+aiosqlite:ro") > 0
+    assert sample(after, "library_db_statement_duration_seconds_count", engine="sqlite+pysqlite:rw") > 0
+
+def test_histogram_buckets_are_cumulative():
+    histogram = Histogram("latency_seconds", "Задержка", ("route",), buckets=(0.1, 1.0))
+    for value in [0.05, 0.5, 0.7, 3.0]:
+        histogram.observe(value, '/a"b')
+    assert histogram.samples() == [
+        'latency_seconds_bucket{route="/a\\"b",le="0.1"} 1',
+        'latency_seconds_bucket{route="/a\\"b",le="1.0"} 3',
+        'latency_seconds_bucket{route="/a\\"b",le="+Inf"} 4',
+        'latency_seconds_sum{route="/a\\"b"} 4.25',
+        'latency_seconds_count{route="/a\\"b"} 4',
+    ]
@@ -0,0 +1,75 @@
+from sqlalchemy import select
+
+from models import Author, Book, Genre
+from models.genre_model import BookGenreAssociation
+from pagination import encode_cursor
+
+def add_books(db, count: int):
+    session = db[0]()
+    author = Author(name="Лев", surname="Толстой", country="RU", profile_picture="p")
+    session.add(author)
+    session.flush()
+    for number in range(count):
+        session.add(Book(title=f"Книга {number}", year=1900 + number % 7, pages=100 + number, profile_picture="p",
+                         country="RU", author_id=author.id))
+    for name in ["Драма", "Поэзия", "Роман"]:
+        session.add(Genre(genre_name=name))
+    session.commit()
+    session.close()
+
+def walk(client, path: str, limit: int, **extra) -> list:
+    items = []
+    cursor = None
+    while True:
+        params = {"limit": limit, **extra}
+        if cursor:
+            params["cursor"] = cursor
+        response = client.get(path, params=params)
+        assert response.status_code == 200
+        page = response.json()
+        assert len(page["items"]) <= limit
+        items.extend(page["items"])
+        cursor = page["next_cursor"]
+        if cursor is None:
+            return items
+
+def test_books_keyset_pages_cover_table_in_order(db, client):
+    add_books(db, 23)
+    books = walk(client, "/books/year", 5)
+    assert len(books) == 23
+    assert len({book["title"] for book in books}) == 23
+    assert [book["year"] for book in books] == sorted(book["year"] for book in books)
+
+def test_genres_page(db, client):
+    add_books(db, 1)
+    assert walk(client, "/genres", 2) == ["Драма", "Поэзия", "Роман"]
+
+def test_invalid_cursor_is_rejected(db, client):
+    response = client.get("/users", params={"cursor": "не-курсор"})
+    assert response.status_code == 400
+    nested = encode_cursor([[1, 2], {"id": "x"}])
+    assert client.get("/users", params={"cursor": nested}).status_code == 400
+
+def test_genre_books_sorted_pages_and_total(db, client):
+    add_books(db, 13)
+    session = db[0]()
+    genre = session.scalar(select(Genre).where(Genre.genre_name == "Роман"))
+    books = session.scalars(select(Book)).all()
+    for number, book in enumerate(books):
+        book.readers_count = number % 4
+        book.average_rating = (number * 7) % 10
+        if number != 0:
+            session.add(BookGenreAssociation(book_id=book.id, genre_id=genre.id))
+    session.commit()
+    genre_id = genre.id
+    expected = {book.title: book for book in books[1:]}
+    session.close()
+
+    path = f"/genres/{genre_id}/books"
+    assert client.get(path).json()["total"] == 12
+    for sort, key in [("id", lambda book: book.id), ("rating", lambda book: (book.average_rating, book.id)),
+                      ("year", lambda book: (book.year, book.id)),
+                      ("readers", lambda book: (book.readers_count, book.id))]:
+        titles = [book["title"] for book in walk(client, path, 5, sort=sort)]
+        assert titles == [book.title for book in sorted(expected.values(), key=key)]
+    assert client.get(path, params={"sort": "pages"}).status_code == 422
@@ -0,0 +1,39 @@
+from sqlalchemy import event
+
+from jwt_token import principal_cache, token_cache
+from .conftest import add_user
+
+def count_statements(engine):
+    statements = []
+    event.listen(engine.sync_engine, "before_cursor_execute",
+                 lambda conn, cursor, statement, *args: statements.append(statement))
+    return statements
+
+def test_principal_is_cached_and_invalidated(db, client):
+    admin = add_user(db, "admin", is_admin=True)
+    user = add_user(db, "reader")
+    statements = count_statements(db[2])
+    client.get("/get_key", headers=admin["headers"])
+    client.get("/get_key", headers=admin["headers"])
+    assert sum("FROM users" in statement for statement in statements) == 1
+    assert client.post("/genre_register", json="Роман", headers=user["headers"]).status_code == 403
+    assert client.post("/add_admin", json="reader", headers=admin["headers"]).status_code == 200
+    assert principal_cache.get("reader") is None
+    assert client.post("/genre_register", json="Поэзия", headers=user["headers"]).status_code == 200
+
+def test_token_claims_are_cached_and_revoked_on_refresh(db, client):
+    response = client.post("/register", json={"login": "reader", "password": "password1",
+                                              "email": "reader@example.com"})
+    tokens = response.json()
+    headers = {"Authorization": f"Bearer {tokens['access_token']}"}
+    token_cache.clear()
+    hits, misses = token_cache.hits, token_cache.misses
+    client.get("/get_key", headers=headers)
+    client.get("/get_key", headers=headers)
+    assert (token_cache.hits - hits, token_cache.misses - misses) == (1, 1)
+    response = client.post("/token/refresh", params={"refresh_token": tokens["refresh_token"]})
+    assert response.status_code == 200
+    assert client.get("/get_key", headers=headers).status_code == 401
+    new_headers = {"Authorization": f"Bearer {response.json()['access_token']}"}
+    assert client.get("/get_key", headers=new_headers).status_code != 401
+    assert client.get("/get_key", headers={"Authorization": "Bearer broken"}).status_code == 401
@@ -0,0 +1,49 @@
+from models import Achievment, Author, Book, Genre
+from models.achievment_model import UserAchievAssociation
+from models.book_model import UserBook
+from .conftest import add_user
+from .principal_test import count_statements
+
+def fill_shelf(db, user_id: str, count: int):
+    session = db[0]()
+    author = Author(name="Лев", surname="Толстой", country="RU", profile_picture="p")
+    genre = Genre(genre_name=f"Роман {count}")
+    session.add_all([author, genre])
+    session.flush()
+    for number in range(count):
+        book = Book(title=f"Книга {count}-{number}", year=1900, pages=100, profile_picture="p", country="RU",
+                    author_id=author.id, readers_count=1, genres=[genre])
+        session.add(book)
+        session.flush()
+        session.add(UserBook(user_id=user_id, book_id=book.id))
+        achievment = Achievment(a_name=f"Достижение {count}-{number}", target=number + 1, genre_id=genre.id)
+        session.add(achievment)
+        session.flush()
+        session.add(UserAchievAssociation(user_id=user_id, achievment_id=achievment.id))
+    session.commit()
+    session.close()
+
+def test_profile_query_count_does_not_grow_with_shelf(db, client):
+    admin = add_user(db, "admin", is_admin=True)
+    small = add_user(db, "small")
+    large = add_user(db, "large")
+    fill_shelf(db, small["id"], 1)
+    fill_shelf(db, large["id"], 40)
+    client.get(f"/users/{small['id']}", headers=admin["headers"])
+    statements = count_statements(db[2])
+
+    counts = []
+    for user in [small, large]:
+        statements.clear()
+        response = client.get(f"/users/{user['id']}", headers=admin["headers"])
+        assert response.status_code == 200
+        counts.append(len(statements))
+    profile = response.json()
+    assert counts[0] == counts[1] <= 4
+    assert len(profile["readed_books"]) == 40 and len(profile["achievments"]) == 40
+    assert profile["readed_books"][0]["genres"] == ["Роман 40"]
+    assert profile["readed_books"][0]["readers"] == 1
+    assert profile["refresh_token"] is None
+
+    response = client.get(f"/users/{large['id']}", headers=small["headers"])
+    assert response.status_code == 200 and "password" not in response.json()
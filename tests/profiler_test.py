@@ -0,0 +1,49 @@
+import pstats
+
+from profiler import profiler
+from .conftest import add_user, add_book
+
+def test_profiler_is_admin_only(db, client):
+    user = add_user(db, "reader")
+    assert client.post("/profiler", json={}, headers=user["headers"]).status_code == 403
+    assert client.get("/profiler/result", headers=user["headers"]).status_code == 403
+    assert profiler.session is None
+
+def test_sampling_profiles_next_matching_requests(db, client):
+    admin = add_user(db, "admin", is_admin=True)
+    book_id = add_book(db)
+    status = client.post("/profiler", json={"route": "/register", "requests": 1, "interval_ms": 0.5},
+                         headers=admin["headers"]).json()
+    assert status["remaining"] == 1 and status["mode"] == "sampling"
+    client.get(f"/books/{book_id}")
+    assert client.post("/register", json={"login": "reader", "password": "password1",
+                                          "email": "reader@example.com"}).status_code == 200
+    client.post("/register", json={"login": "other", "password": "password1", "email": "other@example.com"})
+    status = client.get("/profiler", headers=admin["headers"]).json()
+    assert (status["profiled"], status["finished"]) == (1, True) and status["samples"] > 0
+
+    collapsed = client.get("/profiler/result", headers=admin["headers"]).text
+    stacks = {line.rsplit(" ", 1)[0]: int(line.rsplit(" ", 1)[1]) for line in collapsed.splitlines()}
+    assert all("get_book" not in stack for stack in stacks)
+    # bcrypt считается в пуле потоков: обработчик виден ожидающим этот вызов
+    hashing = [stack for stack in stacks if "user_register" in stack and "hash (passwords.py" in stack]
+    assert hashing and sum(stacks[stack] for stack in hashing) >= status["samples"] // 2
+    assert client.get("/profiler/result", params={"format": "pstats"}, headers=admin["headers"]).status_code == 400
+
+    assert client.delete("/profiler", headers=admin["headers"]).status_code == 200
+    assert client.get("/profiler", headers=admin["headers"]).status_code == 404
+
+def test_cprofile_mode_returns_pstats_dump(db, client, tmp_path):
+    admin = add_user(db, "admin", is_admin=True)
+    book_id = add_book(db)
+    client.post("/profiler", json={"route": "/books/*", "mode": "cprofile", "requests": 2}, headers=admin["headers"])
+    client.get(f"/books/{book_id}")
+    client.get("/genres")
+    client.get(f"/books/{book_id}")
+    response = client.get("/profiler/result", params={"format": "pstats"}, headers=admin["headers"])
+    assert response.headers["content-type"] == "application/octet-stream"
+    dump = tmp_path / "profile.pstats"
+    dump.write_bytes(response.content)
+    functions = {name for _, _, name in pstats.Stats(str(dump)).stats}
+    assert "get_book" in functions and "get_all_genres" not in functions
+    client.delete("/profiler", headers=admin["headers"])
@@ -0,0 +1,122 @@
+import re
+
+from sqlalchemy import create_engine, event, inspect
+
+from database import Base, upgrade_db
+from models import Achievment, Genre
+from models.genre_model import BookGenreAssociation
+from .conftest import add_user, add_book
+
+FULL_SCAN = re.compile(r"^SCAN (\w+)$")
+USED_INDEX = re.compile(r"USING (?:COVERING )?INDEX (\w+)")
+# Эти таблицы читаются целиком намеренно: список достижений и индекс порогов достижений
+WHOLE_TABLE_READS = {"achievments"}
+# Индекс по genre_id достижений объявлен впрок: запросы роутов пока по нему не фильтруют
+NOT_USED_BY_ROUTES = {"ix_achievments_genre_id"}
+
+def capture_statements(db) -> list:
+    statements = []
+
+    def on_execute(conn, cursor, statement, parameters, context, executemany):
+        if statement.lstrip().upper().startswith(("SELECT", "UPDATE", "DELETE", "INSERT")) and not executemany:
+            statements.append((statement, parameters))
+
+    for engine in db[1:]:
+        event.listen(engine.sync_engine, "before_cursor_execute", on_execute)
+    return statements
+
+def explain(db, statements: list) -> tuple[list, set]:
+    scans = []
+    indexes = set()
+    with db[0]() as session:
+        connection = session.connection()
+        for statement, parameters in statements:
+            plan = connection.exec_driver_sql(f"EXPLAIN QUERY PLAN {statement}", tuple(parameters)).all()
+            for row in plan:
+                match = FULL_SCAN.match(row[-1])
+                if match and match.group(1) not in WHOLE_TABLE_READS:
+                    scans.append((row[-1], statement))
+                indexes.update(USED_INDEX.findall(row[-1]))
+    return scans, indexes
+
+def setup_catalog(db) -> tuple[str, str, str]:
+    book_id = add_book(db)
+    other_book_id = add_book(db)
+    session = db[0]()
+    genre = Genre(genre_name="Роман")
+    session.add(genre)
+    session.flush()
+    session.add(BookGenreAssociation(book_id=book_id, genre_id=genre.id))
+    session.add(BookGenreAssociation(book_id=other_book_id, genre_id=genre.id))
+    achievment = Achievment(a_name="Первая книга", target=1, genre_id=genre.id)
+    session.add(achievment)
+    session.commit()
+    genre_id, achievment_id = genre.id, achievment.id
+    session.close()
+    return book_id, genre_id, achievment_id
+
+def test_route_queries_use_indexes(db, client):
+    book_id, genre_id, achievment_id = setup_catalog(db)
+    admin = add_user(db, "admin", is_admin=True)
+    user = add_user(db, "reader")
+    statements = capture_statements(db)
+
+    for sort_type in ["rating", "pages", "year", "country"]:
+        page = client.get(f"/books/{sort_type}", params={"limit": 1}).json()
+        assert client.get(f"/books/{sort_type}", params={"limit": 1, "cursor": page["next_cursor"]}).status_code == 200
+    client.get(f"/books/{book_id}")
+    client.get("/genres")
+    for sort in ["id", "rating", "year", "readers"]:
+        page = client.get(f"/genres/{genre_id}/books", params={"sort": sort, "limit": 1}).json()
+        assert client.get(f"/genres/{genre_id}/books", params={"sort": sort, "limit": 1,
+                                                                "cursor": page["next_cursor"]}).status_code == 200
+    client.get("/authors")
+    client.get("/users")
+    client.post(f"/books/{book_id}", headers=user["headers"])
+    client.put(f"/books/{book_id}/rate", json=7, headers=user["headers"])
+    client.get(f"/users/{user['id']}")
+    client.get(f"/achievments/{achievment_id}")
+    client.post("/add_comment", json={"book_id": book_id, "genre_id": genre_id, "content": "Хорошо"},
+                headers=user["headers"])
+    client.post("/register_book", json={"title": "Анна Каренина", "year": 1877, "pages": 864,
+                                        "profile_picture": "p", "author_id": client.get("/books/rating").json()[
+                                            "items"][0]["author_id"], "genres": [genre_id]},
+                headers=admin["headers"])
+    client.delete(f"/users/{user['id']}/user_books/{book_id}", headers=user["headers"])
+    client.delete(f"/books/{book_id}", headers=admin["headers"])
+    author = client.post("/register_author", json={"name": "Фёдор", "surname": "Достоевский", "country": "RU",
+                                                   "profile_picture": "p"}, headers=admin["headers"]).json()
+    client.delete(f"/authors/{author['id']}", headers=admin["headers"])
+    client.delete(f"/genres/{genre_id}", headers=admin["headers"])
+    client.delete(f"/users/{admin['id']}", headers=admin["headers"])
+
+    scans, indexes = explain(db, statements)
+    assert scans == []
+    declared = {index.name for table in Base.metadata.sorted_tables for index in table.indexes}
+    assert declared - NOT_USED_BY_ROUTES - indexes == set()
+
+def test_upgrade_adds_missing_indexes(tmp_path):
+    engine = create_engine(f"sqlite+pysqlite:///{tmp_path / 'old.db'}")
+    Base.metadata.create_all(bind=engine)
+    with engine.begin() as connection:
+        connection.exec_driver_sql("DROP INDEX ix_books_year_id")
+        connection.exec_driver_sql("DROP INDEX ix_user_books_book_id")
+    assert sorted(upgrade_db(engine)) == ["ix_books_year_id", "ix_user_books_book_id"]
+    assert "ix_books_year_id" in {index["name"] for index in inspect(engine).get_indexes("books")}
+    assert upgrade_db(engine) == []
+    engine.dispose()
+
+def test_upgrade_fills_null_ratings(tmp_path):
+    engine = create_engine(f"sqlite+pysqlite:///{tmp_path / 'old.db'}")
+    Base.metadata.create_all(bind=engine)
+    with engine.begin() as connection:
+        # Таблица книг из старой схемы, где средний рейтинг мог быть NULL
+        connection.exec_driver_sql("ALTER TABLE books RENAME TO new_books")
+        connection.exec_driver_sql("CREATE TABLE books AS SELECT * FROM new_books WHERE 0")
+        connection.exec_driver_sql("DROP TABLE new_books")
+        connection.exec_driver_sql("INSERT INTO books (id, title, year, pages, profile_picture, country, "
+                                   "average_rating) VALUES ('b', 'Книга', 1900, 1, 'p', 'RU', NULL)")
+    upgrade_db(engine)
+    with engine.connect() as connection:
+        assert connection.exec_driver_sql("SELECT average_rating FROM books").scalar() == 0
+    engine.dispose()
@@ -0,0 +1,72 @@
+from sqlalchemy import event
+
+from cache import ResponseCache, SqliteBackend, response_cache
+from .conftest import add_user, add_book
+
+def count_queries(engine) -> list:
+    statements = []
+    event.listen(engine.sync_engine, "before_cursor_execute",
+                 lambda conn, cursor, statement, *args: statements.append(statement))
+    return statements
+
+def test_catalog_lists_are_cached_until_write(db, client):
+    admin = add_user(db, "admin", is_admin=True)
+    statements = count_queries(db[2])
+    assert client.post("/genre_register", json="Роман", headers=admin["headers"]).status_code == 200
+    assert client.get("/genres").json()["items"] == ["Роман"]
+    queries = len(statements)
+    hits = response_cache.hits
+    assert client.get("/genres").json()["items"] == ["Роман"]
+    assert len(statements) == queries
+    assert response_cache.hits == hits + 1
+    stale = client.get("/cache_stats", headers=admin["headers"]).json()["stale"]
+    assert client.post("/genre_register", json="Поэзия", headers=admin["headers"]).status_code == 200
+    assert client.get("/genres").json()["items"] == ["Поэзия", "Роман"]
+    assert client.get("/cache_stats", headers=admin["headers"]).json()["stale"] == stale + 1
+
+def test_rating_only_invalidates_rating_order(db, client):
+    user = add_user(db, "reader")
+    book_id = add_book(db)
+    client.get("/books/rating")
+    client.get("/books/year")
+    client.post(f"/books/{book_id}", headers=user["headers"])
+    client.put(f"/books/{book_id}/rate", json=8, headers=user["headers"])
+    hits, stale = response_cache.hits, response_cache.stale
+    client.get("/books/year")
+    client.get("/books/rating")
+    assert (response_cache.hits - hits, response_cache.stale - stale) == (1, 1)
+
+def test_sqlite_backend_is_shared_between_workers(tmp_path):
+    first = ResponseCache(SqliteBackend(str(tmp_path / "cache.db"), maxsize=2, ttl=60))
+    second = ResponseCache(SqliteBackend(str(tmp_path / "cache.db"), maxsize=2, ttl=60))
+    first.lookup("genres", {"genres"}).store({"items": ["Роман"]})
+    assert second.lookup("genres", {"genres"}).response.body == first.lookup("genres", {"genres"}).response.body
+    second.invalidate("genres")
+    assert first.lookup("genres", {"genres"}).response is None
+    for page in range(3):
+        first.lookup("authors", {"authors"}, page).store([])
+    assert first.backend.evictions == 2
+
+def test_conditional_get_follows_entity_version(db, client):
+    user = add_user(db, "reader")
+    book_id = add_book(db)
+    author_id = client.get(f"/books/{book_id}").json()["author_id"]
+    book_etag = client.get(f"/books/{book_id}").headers["ETag"]
+    author_etag = client.get(f"/authors/{author_id}").headers["ETag"]
+    list_etag = client.get("/books/year").headers["ETag"]
+    statements = count_queries(db[2])
+    response = client.get(f"/books/{book_id}", headers={"If-None-Match": book_etag})
+    assert response.status_code == 304 and response.content == b""
+    assert client.get(f"/authors/{author_id}", headers={"If-None-Match": f'W/{author_etag}'}).status_code == 304
+    assert statements == []
+    client.post(f"/books/{book_id}", headers=user["headers"])
+    response = client.get(f"/books/{book_id}", headers={"If-None-Match": book_etag})
+    assert response.status_code == 200 and response.json()["readers"] == 1
+    assert client.get(f"/authors/{author_id}", headers={"If-None-Match": author_etag}).json()["readers_count"] == 1
+    assert client.get("/books/year", headers={"If-None-Match": list_etag}).status_code == 304
+
+def test_wildcard_etag_needs_existing_entity(db, client):
+    book_id = add_book(db)
+    assert client.get("/books/missing", headers={"If-None-Match": "*"}).status_code != 304
+    assert client.get(f"/books/{book_id}", headers={"If-None-Match": "*"}).status_code == 200
+    assert client.get(f"/books/{book_id}", headers={"If-None-Match": "*"}).status_code == 304
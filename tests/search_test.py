@@ -0,0 +1,67 @@
+from sqlalchemy import create_engine, text
+
+from database import Base
+from models import Author, Book
+from .conftest import add_user, add_book
+
+def search(client, q: str, **params) -> dict:
+    response = client.get("/search", params={"q": q, **params})
+    assert response.status_code == 200
+    return response.json()
+
+def test_index_follows_inserts_updates_and_deletes(db, client):
+    book_id = add_book(db)
+    admin = add_user(db, "admin", is_admin=True)
+    assert [hit["id"] for hit in search(client, "война")["items"]] == [book_id]
+    assert search(client, "толст", scope="authors")["items"][0]["text"] == "Толстой Лев"
+
+    author_id = client.get(f"/books/{book_id}").json()["author_id"]
+    client.patch(f"/books/{book_id}", json={"title": "Анна Каренина", "profile_picture": "p",
+                                            "author_id": author_id, "genres": []}, headers=admin["headers"])
+    assert search(client, "война")["items"] == []
+    assert [hit["text"] for hit in search(client, "карен")["items"]] == ["Анна Каренина"]
+
+    client.post("/add_comment", json={"book_id": book_id, "content": "Прекрасный роман о семье"},
+                headers=admin["headers"])
+    assert search(client, "роман семь", scope="comments")["items"][0]["kind"] == "comments"
+
+    client.delete(f"/books/{book_id}", headers=admin["headers"])
+    assert search(client, "карен")["items"] == []
+
+def test_ranking_and_pagination(db, client):
+    session = db[0]()
+    author = Author(name="Антон", surname="Чехов", country="RU", profile_picture="p")
+    session.add(author)
+    session.flush()
+    titles = ["Сад", "Вишнёвый сад", "Сад сад сад", "Дама с собачкой", "Сады и парки"]
+    session.add_all(Book(title=title, year=1900, pages=100, profile_picture="p", country="RU", author_id=author.id)
+                    for title in titles)
+    session.commit()
+    session.close()
+
+    # Регистр не мешает поиску, а полное совпадение короткого названия выше длинного
+    hits = search(client, "САД")["items"]
+    assert {hit["text"] for hit in hits} == {"Сад", "Вишнёвый сад", "Сад сад сад", "Сады и парки"}
+    assert hits[-1]["text"] == "Сады и парки"
+    assert [hit["score"] for hit in hits] == sorted(hit["score"] for hit in hits)
+    assert search(client, "ВИШН")["items"][0]["text"] == "Вишнёвый сад"
+
+    pages = [search(client, "сад", limit=3)]
+    pages.append(search(client, "сад", limit=3, cursor=pages[0]["next_cursor"]))
+    assert pages[1]["next_cursor"] is None
+    assert [hit["id"] for page in pages for hit in page["items"]] == [hit["id"] for hit in hits]
+
+    assert client.get("/search", params={"q": "!!!"}).status_code == 400
+    assert client.get("/search", params={"q": "сад", "scope": "users"}).status_code == 422
+
+def test_existing_database_is_indexed(tmp_path):
+    engine = create_engine(f"sqlite+pysqlite:///{tmp_path / 'old.db'}")
+    Base.metadata.create_all(bind=engine)
+    with engine.begin() as connection:
+        connection.exec_driver_sql("DROP TABLE books_fts")
+        connection.exec_driver_sql("INSERT INTO authors (id, name, surname, profile_picture) "
+                                   "VALUES ('a', 'Иван', 'Тургенев', 'p')")
+    Base.metadata.create_all(bind=engine)
+    with engine.connect() as connection:
+        assert connection.execute(text("SELECT rowid FROM authors_fts WHERE authors_fts MATCH 'тург*'")).all()
+    engine.dispose()
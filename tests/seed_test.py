@@ -0,0 +1,46 @@
+from sqlalchemy import create_engine, func, select, text
+
+from database import Base
+from models import Book, User
+from models.achievment_model import UserAchievAssociation
+from models.book_model import UserBook
+from seed import seed_database
+
+def seeded(tmp_path, name: str, seed: int):
+    engine = create_engine(f"sqlite+pysqlite:///{tmp_path / name}")
+    Base.metadata.create_all(bind=engine)
+    counts = seed_database(engine, users=30, authors=5, books=60, genres=4, shelf_entries=400, comments=50,
+                           seed=seed)
+    return engine, counts
+
+def snapshot(engine) -> tuple:
+    with engine.connect() as connection:
+        books = connection.execute(select(Book.id, Book.title).order_by(Book.id)).all()
+        shelf = connection.execute(select(UserBook.user_id, UserBook.book_id, UserBook.rating).order_by(
+            UserBook.user_id, UserBook.book_id)).all()
+    return books, shelf
+
+def test_seed_is_reproducible_and_consistent(tmp_path):
+    engine, counts = seeded(tmp_path, "first.db", 7)
+    assert counts["user_books"] == 400 and counts["books"] == 60
+    again, _ = seeded(tmp_path, "second.db", 7)
+    other, _ = seeded(tmp_path, "third.db", 8)
+    assert snapshot(engine) == snapshot(again)
+    assert snapshot(engine) != snapshot(other)
+
+    with engine.connect() as connection:
+        readers = dict(connection.execute(select(UserBook.book_id, func.count()).group_by(UserBook.book_id)).all())
+        counters = dict(connection.execute(select(Book.id, Book.readers_count)).all())
+        assert {book_id: count for book_id, count in counters.items() if count} == readers
+        # Распределение степенное: самый активный читатель намного активнее медианного
+        shelves = sorted(connection.execute(select(func.count()).select_from(UserBook).group_by(
+            UserBook.user_id)).scalars().all())
+        assert shelves[-1] >= 3 * shelves[len(shelves) // 2]
+        assert connection.scalar(select(func.count()).select_from(UserAchievAssociation)) == \
+            counts["user_achievments"] > 0
+        assert connection.scalar(select(func.count()).select_from(User)) == 30
+        title = connection.scalar(select(Book.title).limit(1))
+        assert connection.execute(text("SELECT rowid FROM books_fts WHERE books_fts MATCH :q"),
+                                  {"q": f'"{title.split()[0]}"'}).first()
+    for bind in [engine, again, other]:
+        bind.dispose()
@@ -0,0 +1,71 @@
+import asyncio
+
+import pytest
+from sqlalchemy import text
+from sqlalchemy.exc import OperationalError
+
+from database import SQLITE_PRAGMAS, database_url, make_engine
+from models import Achievment
+from models.achievment_model import UserAchievAssociation
+from models.book_model import UserBook
+from .conftest import add_user, add_book
+
+def test_add_book_to_user_uses_one_connection(db, client, counter):
+    user = add_user(db, "reader")
+    book_id = add_book(db)
+    session = db[0]()
+    session.add(Achievment(a_name="Первая книга", target=1))
+    session.commit()
+    session.close()
+    counter.reset()
+    response = client.post(f"/books/{book_id}", headers=user["headers"])
+    assert response.status_code == 200
+    assert counter.connections == 1
+    assert counter.commits == 1
+    session = db[0]()
+    assert session.get(UserBook, (user["id"], book_id)) is not None
+    assert session.query(UserAchievAssociation).filter(UserAchievAssociation.user_id == user["id"]).count() == 1
+    session.close()
+
+def test_admin_route_shares_request_session(db, client, counter):
+    admin = add_user(db, "admin", is_admin=True)
+    counter.reset()
+    response = client.post("/genre_register", json="Роман", headers=admin["headers"])
+    assert response.status_code == 200
+    assert counter.connections == 1
+    assert counter.commits == 1
+
+def test_engine_profile_applies_pragmas(db):
+    async def read_pragmas():
+        async with db[1].connect() as connection:
+            return [(await connection.execute(text(f"PRAGMA {name}"))).scalar() for name in
+                    ["journal_mode", "synchronous", "busy_timeout"]]
+
+    assert asyncio.run(read_pragmas()) == ["wal", 1, SQLITE_PRAGMAS["busy_timeout"]]
+    with db[0]() as session:
+        assert session.execute(text("PRAGMA mmap_size")).scalar() == SQLITE_PRAGMAS["mmap_size"]
+
+def test_engine_factory_accepts_other_urls(tmp_path):
+    assert database_url("sqlite:///library.db", "aiosqlite") == "sqlite+aiosqlite:///library.db"
+    assert database_url("postgresql+asyncpg://user:secret@db/library", "aiosqlite") == \
+        "postgresql+asyncpg://user:secret@db/library"
+    plain = make_engine(f"sqlite:///{tmp_path / 'plain.db'}", pragmas={})
+    with plain.connect() as connection:
+        assert connection.execute(text("PRAGMA journal_mode")).scalar() == "delete"
+    plain.dispose()
+
+def test_read_routes_stay_off_the_writer(db, client, counter):
+    user = add_user(db, "reader")
+    book_id = add_book(db)
+    counter.reset()
+    assert client.get("/books/rating").status_code == 200
+    assert client.get(f"/books/{book_id}").status_code == 200
+    assert client.get("/users", headers=user["headers"]).status_code == 200
+    assert counter.connections == 0
+
+    async def write_on_reader():
+        async with db[2].connect() as connection:
+            await connection.execute(text("DELETE FROM books"))
+
+    with pytest.raises(OperationalError):
+        asyncio.run(write_on_reader())
@@ -0,0 +1,46 @@
+import asyncio
+
+import httpx
+
+from models import Book
+from models.book_model import UserBook
+from write_queue import write_queue
+from .conftest import add_user, add_book
+from ..my_app import app
+
+def test_queued_writes_share_commits(db, monkeypatch):
+    monkeypatch.setattr(write_queue, "enabled", True)
+    book_id = add_book(db)
+    users = [add_user(db, f"reader{number}") for number in range(20)]
+
+    async def burst():
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+            shelved = await asyncio.gather(*(client.post(f"/books/{book_id}", headers=user["headers"])
+                                             for user in users + users[:1]))
+            rated = await asyncio.gather(*(client.put(f"/books/{book_id}/rate", json=number % 10 + 1,
+                                                      headers=user["headers"])
+                                           for number, user in enumerate(users)))
+            return shelved, rated
+
+    batches, operations = write_queue.batches, write_queue.operations
+    shelved, rated = asyncio.run(burst())
+    assert sorted(response.status_code for response in shelved) == [200] * 20 + [500]
+    assert all(response.status_code == 200 for response in rated)
+    assert write_queue.operations - operations == 41
+    assert write_queue.batches - batches < 10
+    with db[0]() as session:
+        book = session.get(Book, book_id)
+        assert (book.readers_count, book.rating_count) == (20, 20)
+        assert book.rating_sum == sum(number % 10 + 1 for number in range(20))
+        assert session.query(UserBook).filter(UserBook.rating.isnot(None)).count() == 20
+
+def test_register_through_queue(db, client, monkeypatch):
+    monkeypatch.setattr(write_queue, "enabled", True)
+    monkeypatch.setattr("passwords.password_hasher.rounds", 4)
+    body = {"login": "reader", "password": "password1", "email": "reader@example.com"}
+    response = client.post("/register", json=body)
+    assert response.status_code == 200
+    headers = {"Authorization": f"Bearer {response.json()['access_token']}"}
+    assert client.post("/register", json=body).status_code == 500
+    assert client.post("/add_comment", json={"content": "Привет"}, headers=headers).status_code == 200
@@ -0,0 +1,91 @@
+import asyncio
+import contextvars
+import os
+from collections import deque
+from typing import Any, Awaitable, Callable
+
+from dotenv import load_dotenv
+from fastapi import Depends
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from database import AsyncSessionLocal, get_session
+
+load_dotenv()
+
+WRITE_QUEUE = os.getenv("WRITE_QUEUE", "0") == "1"
+WRITE_BATCH_SIZE = int(os.getenv("WRITE_BATCH_SIZE", "64"))
+WRITE_BATCH_DELAY_MS = float(os.getenv("WRITE_BATCH_DELAY_MS", "5"))
+
+Operation = Callable[[AsyncSession], Awaitable[Any]]
+
+class WriteQueue:
+    def __init__(self, session_factory, enabled: bool, batch_size: int, delay: float):
+        self.session_factory = session_factory
+        self.enabled = enabled
+        self.batch_size = batch_size
+        self.delay = delay
+        self.batches = 0
+        self.operations = 0
+        self._pending: deque = deque()
+        self._task = None
+
+    async def submit(self, operation: Operation) -> Any:
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        self._pending.append((operation, future))
+        if self._task is None or self._task.done() or self._task.get_loop() is not loop:
+            # Пустой контекст: пакет пишет за много запросов, его SQL не относится к первому из них
+            self._task = loop.create_task(self._drain(), context=contextvars.Context())
+        return await future
+
+    async def _drain(self):
+        while self._pending:
+            if len(self._pending) < self.batch_size:
+                await asyncio.sleep(self.delay)
+            batch = [self._pending.popleft() for _ in range(min(self.batch_size, len(self._pending)))]
+            await self._commit(batch)
+
+    async def _commit(self, batch: list):
+        outcomes = []
+        async with self.session_factory() as session:
+            try:
+                if (await session.connection()).dialect.name == "sqlite":
+                    # Явный BEGIN: иначе RELEASE первой точки сохранения в pysqlite сам завершает транзакцию
+                    await session.execute(text("BEGIN IMMEDIATE"))
+                for operation, future in batch:
+                    try:
+                        async with session.begin_nested():
+                            outcomes.append((future, await operation(session), None))
+                    except Exception as e:
+                        outcomes.append((future, None, e))
+                await session.commit()
+            except Exception as e:
+                await session.rollback()
+                outcomes = [(future, None, e) for future, _, _ in outcomes]
+                outcomes += [(future, None, e) for _, future in batch[len(outcomes):]]
+        self.batches += 1
+        self.operations += len(batch)
+        for future, result, error in outcomes:
+            if future.done():
+                continue
+            if error is None:
+                future.set_result(result)
+            else:
+                future.set_exception(error)
+
+write_queue = WriteQueue(AsyncSessionLocal, WRITE_QUEUE, WRITE_BATCH_SIZE, WRITE_BATCH_DELAY_MS / 1000)
+
+class Writer:
+    def __init__(self, session: AsyncSession):
+        self.session = session
+
+    async def run(self, operation: Operation) -> Any:
+        if write_queue.enabled:
+            return await write_queue.submit(operation)
+        result = await operation(self.session)
+        await self.session.commit()
+        return result
+
+async def get_writer(session: AsyncSession = Depends(get_session)) -> Writer:
+    return Writer(session)